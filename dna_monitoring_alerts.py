@@ -0,0 +1,299 @@
+"""
+Headless alerting daemon: spec-rule alerts as runs land in Run_Log_Archive.
+
+Runs without Streamlit or a browser. An asyncio loop polls the Tool file the way the
+dashboard watcher does (size/mtime, debounce, complete-zip check). When a save
+settles, Run_Log_Archive is brought up to date through the incremental ingest store,
+with the same COLUMN_MAPPING normalisation the dashboards use. The daemon keeps its
+own store, so it never races a sync running in another process. Only the runs added
+since the last pass are checked against the status rules (defaults,
+dna_monitoring_specs.json, the Specification sheet). With the default 1 s poll and
+2 s debounce an archived run alerts a few seconds after Excel finishes saving.
+
+Every finding is recorded in the `alerts` table with a unique key (LHI ID,
+completion time, rule, level), so restarts, re-saves and edited histories never
+alert twice. The first pass records the existing history as 'baseline' without
+sending anything. Each instrument gets at most RATE_LIMIT delivered alerts per
+RATE_WINDOW seconds; the rest are stored as 'rate-limited'. Alerts whose delivery
+failed (or was cut short by a restart) are sent again on the next check, so a
+webhook outage delays them rather than dropping them. Delivered alerts go to
+every sink at once: the log (stderr or --log file) and optionally a --webhook URL
+that receives the alert as JSON.
+
+Usage:
+    python3 dna_monitoring_alerts.py [--excel path/to/Tool.xlsm] [--db path/to/db]
+        [--log alerts.log] [--webhook https://hooks.example/...] [--level yellow]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict, deque
+
+import pandas as pd
+
+from dna_monitoring_cache import DEFAULT_CACHE_DIR
+from dna_monitoring_db import DB_PATH, DATETIME_FORMAT, get_state, init_db, set_state
+from dna_monitoring_excel import load_specifications
+from dna_monitoring_fetch import TIMEOUT, get_session
+from dna_monitoring_ingest import ingest_run_log, ingest_status, store_dir_for
+from dna_monitoring_status import RED, STATUS_LEVELS, YELLOW, band_text, compute_statuses, load_rules
+from dna_monitoring_sync import EXCEL_PATH
+from dna_monitoring_watch import SettledFile
+
+POLL_INTERVAL = 1.0
+DEBOUNCE = 2.0
+
+# Per instrument: at most RATE_LIMIT delivered alerts in any RATE_WINDOW seconds
+RATE_LIMIT = 5
+RATE_WINDOW = 600
+
+ALERT_STORE_ROOT = os.path.join(DEFAULT_CACHE_DIR, 'alerts')
+
+ALERT_COLUMNS = ['alert_key', 'raised_at', 'lhi_id', 'instrument', 'lhi_completion_datetime',
+                 'rule', 'level', 'value', 'message', 'outcome']
+
+logger = logging.getLogger(__name__)
+
+
+def evaluate_runs(runs, rules, min_level=RED):
+    """
+    Alert records for the runs in `runs` whose status is min_level or worse.
+
+    One record per (run, rule), with every ALERT_COLUMNS field except outcome.
+    Metrics that are missing are skipped: they are gaps, not out-of-spec readings.
+    """
+    statuses = compute_statuses(runs, rules)
+    levels = STATUS_LEVELS[STATUS_LEVELS.index(min_level):]
+    rules_by_status = {rule['status']: rule for rule in rules}
+    raised_at = pd.Timestamp.now().strftime(DATETIME_FORMAT)
+    completion = pd.to_datetime(runs['lhi_completion_datetime'], errors='coerce')
+
+    alerts = []
+    for status in statuses.columns:
+        rule = rules_by_status[status]
+        values = pd.to_numeric(runs[rule['column']], errors='coerce')
+        hits = statuses[status].isin(levels) & values.notna()
+        for idx in statuses.index[hits.to_numpy()]:
+            level = statuses.at[idx, status]
+            lhi_id = None if pd.isna(runs.at[idx, 'lhi_id']) else str(runs.at[idx, 'lhi_id'])
+            instrument = None if pd.isna(runs.at[idx, 'instrument']) else str(runs.at[idx, 'instrument'])
+            completed = None if pd.isna(completion[idx]) else completion[idx].strftime(DATETIME_FORMAT)
+            shown = 'no completion time' if completed is None else completion[idx].strftime('%Y-%m-%d %H:%M')
+            value = float(values[idx])
+            alerts.append({
+                'alert_key': f"{lhi_id}|{completed}|{status}|{level}",
+                'raised_at': raised_at,
+                'lhi_id': lhi_id,
+                'instrument': instrument,
+                'lhi_completion_datetime': completed,
+                'rule': status,
+                'level': level,
+                'value': value,
+                'message': f"{level} {lhi_id} on {instrument} ({shown}): {rule['label']} {value:g}, "
+                           f"spec {band_text(rule['green'], rule.get('closed'))}",
+            })
+    return alerts
+
+
+class RateLimiter:
+    """Sliding-window limit of deliveries per key"""
+
+    def __init__(self, limit=RATE_LIMIT, window=RATE_WINDOW):
+        self.limit = limit
+        self.window = window
+        self._sent = defaultdict(deque)
+
+    def allow(self, key, now=None):
+        """True (and counted) if `key` is still under its limit"""
+        now = time.monotonic() if now is None else now
+        sent = self._sent[key]
+        while sent and now - sent[0] >= self.window:
+            sent.popleft()
+        if len(sent) >= self.limit:
+            return False
+        sent.append(now)
+        return True
+
+
+class LogSink:
+    """Writes each alert as one log line"""
+
+    name = 'log'
+
+    def __init__(self, log_path=None):
+        self.logger = logging.getLogger(f'{__name__}.sink')
+        if log_path:
+            handler = logging.FileHandler(log_path, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.logger.addHandler(handler)
+
+    async def send(self, alert):
+        self.logger.warning(alert['message'])
+
+
+class WebhookSink:
+    """POSTs each alert as JSON; the blocking request runs in a worker thread"""
+
+    name = 'webhook'
+
+    def __init__(self, url, timeout=TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def _post(self, alert):
+        response = get_session().post(self.url, json=alert, timeout=self.timeout)
+        response.raise_for_status()
+
+    async def send(self, alert):
+        await asyncio.to_thread(self._post, alert)
+
+
+class AlertDaemon:
+    """Watches one workbook and raises alerts into one database and a set of sinks"""
+
+    def __init__(self, excel_path, db_path, sinks, min_level=RED, poll_interval=POLL_INTERVAL,
+                 debounce=DEBOUNCE, limiter=None, store_dir=None):
+        self.excel_path = excel_path
+        self.db_path = db_path
+        self.sinks = sinks
+        self.min_level = min_level
+        self.poll_interval = poll_interval
+        self.file = SettledFile(excel_path, debounce)
+        self.limiter = limiter or RateLimiter()
+        self.store_dir = store_dir or store_dir_for(excel_path, ALERT_STORE_ROOT)
+
+    def check(self):
+        """
+        Ingest the workbook and record alerts for runs not checked yet (blocking).
+
+        Returns the alerts to deliver: those whose last delivery failed or never
+        finished, then the newly recorded ones. A new ingest generation (history
+        edited) re-checks every run; the unique alert_key keeps findings that were
+        already recorded from firing again.
+        """
+        runs_df = ingest_run_log(self.excel_path, self.store_dir)
+        generation = ingest_status(self.store_dir)['generation']
+        rules = load_rules(specifications=load_specifications(self.excel_path))
+
+        conn = init_db(self.db_path)
+        try:
+            first_pass = get_state(conn, 'alerts_generation') is None
+            checked = int(get_state(conn, 'alerts_rows', 0))
+            if get_state(conn, 'alerts_generation') != generation or checked > len(runs_df):
+                checked = 0
+            alerts = evaluate_runs(runs_df.iloc[checked:], rules, self.min_level)
+
+            outcome = 'baseline' if first_pass else 'pending'
+            placeholders = ', '.join('?' * len(ALERT_COLUMNS))
+            # Left 'pending' only if the daemon stopped before recording the outcome
+            retry = pd.read_sql_query(
+                f"SELECT {', '.join(ALERT_COLUMNS)} FROM alerts WHERE outcome IN ('failed', 'pending') "
+                f"ORDER BY raised_at", conn)
+            fresh = retry.astype(object).where(retry.notna(), None).to_dict('records')
+            if fresh:
+                logger.info("Retrying %d alerts that were not delivered", len(fresh))
+            with conn:
+                for alert in alerts:
+                    alert['outcome'] = outcome
+                    cursor = conn.execute(
+                        f"INSERT OR IGNORE INTO alerts ({', '.join(ALERT_COLUMNS)}) VALUES ({placeholders})",
+                        [alert[col] for col in ALERT_COLUMNS])
+                    if cursor.rowcount and not first_pass:
+                        fresh.append(alert)
+                set_state(conn, 'alerts_generation', generation)
+                set_state(conn, 'alerts_rows', str(len(runs_df)))
+        finally:
+            conn.close()
+
+        if first_pass:
+            logger.info("Baseline: %d runs checked, %d existing findings recorded without alerting",
+                        len(runs_df), len(alerts))
+        return fresh
+
+    async def _deliver(self, alert):
+        """Send one alert to every sink concurrently; returns its outcome"""
+        instrument = alert['instrument'] or 'Unknown'
+        if not self.limiter.allow(instrument):
+            logger.info("Rate limit reached for %s, not sending %s", instrument, alert['alert_key'])
+            return 'rate-limited'
+        results = await asyncio.gather(*(sink.send(alert) for sink in self.sinks), return_exceptions=True)
+        failed = [(sink.name, error) for sink, error in zip(self.sinks, results) if isinstance(error, Exception)]
+        for name, error in failed:
+            logger.warning("Alert sink %s failed for %s: %s", name, alert['alert_key'], error)
+        return 'failed' if failed else 'sent'
+
+    def _record_outcomes(self, outcomes):
+        conn = init_db(self.db_path)
+        try:
+            with conn:
+                conn.executemany('UPDATE alerts SET outcome = ? WHERE alert_key = ?', outcomes)
+        finally:
+            conn.close()
+
+    async def deliver(self, alerts):
+        """Deliver alerts (different instruments in parallel) and store their outcomes"""
+        outcomes = await asyncio.gather(*(self._deliver(alert) for alert in alerts))
+        if alerts:
+            await asyncio.to_thread(self._record_outcomes,
+                                    [(outcome, alert['alert_key']) for outcome, alert in zip(outcomes, alerts)])
+        return outcomes
+
+    async def step(self):
+        """One polling step; returns the outcomes of any alerts it delivered"""
+        signature = await asyncio.to_thread(self.file.poll)
+        if signature is None:
+            return []
+        try:
+            alerts = await asyncio.to_thread(self.check)
+        except Exception as e:
+            # Retried on the next settled change (or the next save)
+            logger.warning("Checking %s failed: %s", self.excel_path, e)
+            return []
+        self.file.seen = signature
+        return await self.deliver(alerts)
+
+    async def run(self):
+        """Check once up front, then poll until cancelled"""
+        self.file.seen = self.file.signature()
+        try:
+            await self.deliver(await asyncio.to_thread(self.check))
+        except Exception as e:
+            self.file.seen = None
+            logger.warning("Initial check of %s failed, retrying once the file is reachable: %s",
+                           self.excel_path, e)
+        while True:
+            await self.step()
+            await asyncio.sleep(self.poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raise spec-rule alerts as runs are archived, without the dashboard")
+    parser.add_argument('--excel', default=EXCEL_PATH, help="Tool-000011 .xlsm to watch")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database holding the alerts table")
+    parser.add_argument('--log', help="Append alerts to this file (default: stderr only)")
+    parser.add_argument('--webhook', help="POST each alert as JSON to this URL")
+    parser.add_argument('--level', choices=['yellow', 'red'], default='red',
+                        help="Lowest status that raises an alert")
+    parser.add_argument('--rate-limit', type=int, default=RATE_LIMIT,
+                        help="Alerts per instrument per --rate-window seconds")
+    parser.add_argument('--rate-window', type=float, default=RATE_WINDOW)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    sinks = [LogSink(args.log)]
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook))
+    daemon = AlertDaemon(args.excel, args.db, sinks, min_level=YELLOW if args.level == 'yellow' else RED,
+                         limiter=RateLimiter(args.rate_limit, args.rate_window))
+    print(f"🚨 Alerting on {args.excel} ({', '.join(sink.name for sink in sinks)})")
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+"""
+Benchmarks for the dashboard data pipeline.
+
+Run from the repo root:
+    python dna_monitoring_bench.py                      # all benchmarks, bundled workbook
+    python dna_monitoring_bench.py --only reader        # one benchmark
+    python dna_monitoring_bench.py --only charts --rows 1000 100000
+    python dna_monitoring_bench.py --only curves --rows 1000 10000 100000
+    python dna_monitoring_bench.py --only spc --rows 10000 100000
+    python dna_monitoring_bench.py --only service --rows 100000
+    python dna_monitoring_bench.py --only pipeline --repeat 3   # synthetic 1k/10k/100k workbooks
+    python dna_monitoring_bench.py --workbook X:\\...\\Tool-000011_...xlsm
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import plotly.express as px
+
+from dna_monitoring_cache import read_snapshot, write_snapshot
+from dna_monitoring_charts import box_chart, trend_chart, violin_chart
+from dna_monitoring_curves import STANDARD_CONCENTRATIONS, fit_4pl, fit_linear
+from dna_monitoring_excel import COLUMN_MAPPING, RUN_LOG_SHEET, load_run_log_archive, normalize_runs, read_sheet
+from dna_monitoring_ingest import ingest_run_log
+from dna_monitoring_perf import PerfRecorder, peak_rss_mb, rss_mb
+from dna_monitoring_qplates import QPLATE_SHEET, RAW_DATA_SHEET, STD_CURVE_SHEET, load_qplates
+from dna_monitoring_service import DataService, RunsIndex
+from dna_monitoring_spc import SPCSeries, compute_spc
+from dna_monitoring_status import compute_statuses
+
+DEFAULT_WORKBOOK = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data',
+    'Tool-000011_DNA_Concentration_with_SpectraMax_Nonso_Version_Macro.xlsm')
+
+
+def measure(fn, repeat=5, trace=True):
+    """
+    Run fn `repeat` times; return (best seconds, median seconds, peak traced MB).
+
+    tracemalloc slows pure-Python code several-fold; pass trace=False where the
+    timing matters more than the memory peak (peak is then reported as 0).
+    """
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        if trace:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return min(timings), statistics.median(timings), peak / 1e6
+
+
+def report(title, rows):
+    """Print one benchmark's results as an aligned table"""
+    print(f"\n== {title} ==")
+    print(f"{'case':<48} {'best ms':>10} {'median ms':>10} {'peak MB':>9}")
+    for name, (best, median, peak_mb) in rows:
+        print(f"{name:<48} {best * 1000:>10.1f} {median * 1000:>10.1f} {peak_mb:>9.2f}")
+
+
+def bench_reader(workbook, repeat):
+    """Cold load of Run_Log_Archive: pd.read_excel (openpyxl) vs the streaming reader"""
+    rows = [
+        ('pd.read_excel + normalize_runs',
+         measure(lambda: normalize_runs(pd.read_excel(workbook, sheet_name=RUN_LOG_SHEET)), repeat)),
+        ('load_run_log_archive (streaming)',
+         measure(lambda: load_run_log_archive(workbook), repeat)),
+    ]
+    report(f"Run_Log_Archive load ({os.path.getsize(workbook) / 1e6:.2f} MB workbook)", rows)
+
+
+def bench_cache(workbook, repeat):
+    """Snapshot store: workbook parse vs writing a snapshot vs reloading it (mmap)"""
+    cache_dir = tempfile.mkdtemp(prefix='dna-bench-cache-')
+    snapshot_dir = os.path.join(cache_dir, 'snapshot')
+    try:
+        df = load_run_log_archive(workbook)
+
+        def write():
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            write_snapshot(df, snapshot_dir)
+
+        rows = [('load_run_log_archive (parse)', measure(lambda: load_run_log_archive(workbook), repeat)),
+                ('write_snapshot', measure(write, repeat)),
+                ('read_snapshot (mmap)', measure(lambda: read_snapshot(snapshot_dir), repeat))]
+        report("Run_Log_Archive snapshot store", rows)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def bench_ingest(workbook, repeat):
+    """Incremental ingestion: full rebuild vs re-verifying an unchanged archive"""
+    store_dir = tempfile.mkdtemp(prefix='dna-bench-ingest-')
+    try:
+        def rebuild():
+            shutil.rmtree(store_dir, ignore_errors=True)
+            ingest_run_log(workbook, store_dir=store_dir)
+
+        rows = [('ingest_run_log, rebuild', measure(rebuild, repeat))]
+        rows.append(('ingest_run_log, no new rows (prefix hash only)',
+                     measure(lambda: ingest_run_log(workbook, store_dir=store_dir), repeat)))
+        report("Run_Log_Archive incremental ingestion", rows)
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+
+def bench_qplates(workbook, repeat):
+    """Q-Plate sheets: pd.read_excel as object frames vs the streaming long-format parser"""
+    sheets = [RAW_DATA_SHEET, QPLATE_SHEET, STD_CURVE_SHEET]
+    rows = [
+        ('pd.read_excel, 3 sheets (object dtype)',
+         measure(lambda: pd.read_excel(workbook, sheet_name=sheets, header=None), repeat)),
+        ('load_qplates (streaming + back-calculation)',
+         measure(lambda: load_qplates(workbook), repeat)),
+    ]
+    report("Q-Plate load", rows)
+    frames = pd.read_excel(workbook, sheet_name=sheets, header=None)
+    wells = load_qplates(workbook)[0]
+    print(f"resident size: {sum(f.memory_usage(deep=True).sum() for f in frames.values()) / 1e6:.2f} MB "
+          f"as sheets vs {wells.memory_usage(deep=True).sum() / 1e6:.3f} MB as {len(wells)} wells")
+
+
+def synthetic_runs(n_rows, seed=0):
+    """n_rows runs shaped like Run_Log_Archive (two per hour, drifting S/N, ~2% outliers)"""
+    rng = np.random.default_rng(seed)
+    sn = 3.2 + 0.3 * np.sin(np.arange(n_rows) / 500) + rng.normal(0, 0.15, n_rows)
+    outliers = rng.random(n_rows) < 0.02
+    sn[outliers] = rng.uniform(1.5, 2.5, outliers.sum())
+    completion = pd.date_range('2020-01-01', periods=n_rows, freq='30min')
+    blank = rng.normal(3.4e5, 1e4, n_rows)
+    return pd.DataFrame({
+        'lhi_completion_datetime': completion,
+        'lhi_id': [f'LHI-{i:06d}' for i in range(n_rows)],
+        'instrument': rng.choice(['LHI - 01', 'LHI - 02', 'LHI - 03'], n_rows),
+        'std_read_datetime': completion + pd.Timedelta(minutes=12),
+        'std_delta_time_min': rng.uniform(8, 20, n_rows).round(1),
+        'std_01_rfu': rng.normal(41e6, 6e5, n_rows),
+        'std_07_rfu': sn * blank,
+        'blank_rfu': blank,
+        'sn_std7_blank': sn,
+    })
+
+
+def write_synthetic_workbook(n_rows, directory=None):
+    """
+    An .xlsx with a Run_Log_Archive sheet of synthetic_runs(n_rows) under the Tool's headers.
+
+    Written once per size (openpyxl write-only mode takes ~15 s at 100k runs) and
+    reused from the temp directory afterwards.
+    """
+    path = os.path.join(directory or tempfile.gettempdir(), f'dna_monitoring_bench_{n_rows}.xlsx')
+    if os.path.exists(path):
+        return path
+    runs = synthetic_runs(n_rows)
+    headers = {new: old for old, new in COLUMN_MAPPING.items()}
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(RUN_LOG_SHEET)
+    sheet.append(['Run ID'] + [headers[col] for col in runs.columns])
+    for run_id, row in enumerate(runs.itertuples(index=False, name=None), start=1):
+        sheet.append([f'RUN-{run_id:06d}'] + [value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+                                              for value in row])
+    partial = path + '.partial'
+    workbook.save(partial)
+    os.replace(partial, path)
+    return path
+
+
+def bench_charts(workbook, repeat, row_counts=(1000, 10000, 100000)):
+    """
+    Trend/distribution figures: every point vs server-side reduction.
+
+    Time covers building the figure and serializing it to JSON, which is what
+    Streamlit ships to the browser; payload is that JSON's size. Browser paint time
+    scales with the same point count but can't be measured headlessly.
+    """
+    print("\n== Chart payloads (synthetic runs) ==")
+    print(f"{'case':<48} {'best ms':>10} {'median ms':>10} {'payload MB':>11}")
+    for n_rows in row_counts:
+        df = synthetic_runs(n_rows)
+        cases = [
+            ('px.line, all points', lambda: px.line(
+                df, x='lhi_completion_datetime', y='sn_std7_blank', markers=True)),
+            ('trend_chart (LTTB)', lambda: trend_chart(df, 'sn_std7_blank', "S/N", '#d62728')),
+            ('px.box points="all", by instrument', lambda: px.box(
+                df, y='sn_std7_blank', x='instrument', color='instrument', points="all")),
+            ('box_chart (quantile sample)', lambda: box_chart(df, 'sn_std7_blank', "S/N", x='instrument')),
+        ]
+        for name, build in cases:
+            best, median, _ = measure(lambda: build().to_json(), repeat, trace=False)
+            payload_mb = len(build().to_json()) / 1e6
+            print(f"{f'{n_rows:,} rows: {name}':<48} {best * 1000:>10.1f} {median * 1000:>10.1f} {payload_mb:>11.2f}")
+
+
+def synthetic_standards(n_rows, seed=0):
+    """(conc, rfu, blank) for n_rows seven-point curves near the Tool's (slope ~0.98, 1% CV)"""
+    rng = np.random.default_rng(seed)
+    conc = np.array(list(STANDARD_CONCENTRATIONS.values()))
+    slope = rng.normal(0.98, 0.02, n_rows)
+    intercept = rng.normal(14.59, 0.05, n_rows)
+    blank = rng.normal(66000, 3000, n_rows)
+    signal = np.exp(intercept[:, None] + slope[:, None] * np.log(conc))
+    rfu = blank[:, None] + signal * rng.normal(1, 0.01, (n_rows, len(conc)))
+    return conc, rfu, blank
+
+
+def bench_curves(workbook, repeat, row_counts=(1000, 10000, 100000)):
+    """Batched standard-curve fits: one loop-free pass per method, reported as runs/second"""
+    print("\n== Standard curve fitting (synthetic seven-point curves) ==")
+    print(f"{'case':<48} {'best ms':>10} {'median ms':>10} {'runs/s':>11}")
+    for n_rows in row_counts:
+        conc, rfu, blank = synthetic_standards(n_rows)
+        for name, fit in (('fit_linear (log-log)', fit_linear), ('fit_4pl (Levenberg-Marquardt)', fit_4pl)):
+            best, median, _ = measure(lambda: fit(conc, rfu, blank), repeat, trace=False)
+            print(f"{f'{n_rows:,} runs: {name}':<48} {best * 1000:>10.1f} {median * 1000:>10.1f} {n_rows / best:>11,.0f}")
+
+
+def bench_spc(workbook, repeat, row_counts=(1000, 10000, 100000)):
+    """SPC statistics: replaying every run vs. the O(1) update for one new run"""
+    rows = []
+    for n_rows in row_counts:
+        runs = synthetic_runs(n_rows)
+        head, last = runs.iloc[:-1], runs.iloc[-1:]
+        _, series = compute_spc(head)
+        snapshot = {key: state.to_state() for key, state in series.items()}
+
+        def one_more():
+            # Fresh series from the saved state each time, as update_spc() does from spc_state
+            restored = {key: SPCSeries(state) for key, state in snapshot.items()}
+            compute_spc(last, restored)
+
+        rows.append((f"{n_rows:,} runs: full replay", measure(lambda: compute_spc(runs), repeat)))
+        rows.append((f"{n_rows:,} runs: +1 run from saved state", measure(one_more, repeat)))
+    report("SPC statistics (synthetic runs, 3 instruments x 4 metrics)", rows)
+
+
+def bench_service(workbook, repeat, row_counts=(1000, 10000, 100000), sessions=8):
+    """Sidebar filters as boolean masks vs. RunsIndex slices, and concurrent sessions on a cold cache"""
+    rows = []
+    for n_rows in row_counts:
+        runs = synthetic_runs(n_rows)
+        date_from, date_to = runs['lhi_completion_datetime'].quantile([0.25, 0.75])
+        index = RunsIndex(runs)
+
+        def mask():
+            dated = runs[(runs['lhi_completion_datetime'] >= date_from) & (runs['lhi_completion_datetime'] <= date_to)]
+            return dated[dated['instrument'] == 'LHI - 02']
+
+        rows.append((f"{n_rows:,} runs: boolean masks", measure(mask, repeat)))
+        rows.append((f"{n_rows:,} runs: RunsIndex.select", measure(lambda: index.select(date_from, date_to, 'LHI - 02'), repeat)))
+        rows.append((f"{n_rows:,} runs: build RunsIndex (once per version)", measure(lambda: RunsIndex(runs), repeat)))
+    report("Date/instrument filtering (synthetic runs)", rows)
+
+    # Every session misses at once, as after a new Tool file version lands
+    service, loads = DataService(), []
+
+    def loader():
+        loads.append(1)
+        return load_run_log_archive(workbook)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=service.get, args=('bench', loader)) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"{sessions} concurrent sessions on a cold cache: {len(loads)} parse, "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms until all had data")
+
+
+PIPELINE_STAGES = ['parse', 'rename', 'statuses', 'index', 'filter', 'figures', 'serialize']
+
+
+def _pipeline_pass(path, repeat):
+    """
+    The dashboard pipeline on one workbook, in a fresh process (see bench_pipeline).
+
+    Returns ({stage: best ms over `repeat` passes}, RSS after imports, peak RSS).
+    """
+    baseline = rss_mb()
+    best = {}
+    for _ in range(repeat):
+        perf = PerfRecorder('bench')
+        with perf.stage('parse'):
+            raw = read_sheet(path, RUN_LOG_SHEET)
+        with perf.stage('rename'):
+            runs = normalize_runs(raw)
+        with perf.stage('statuses'):
+            runs = pd.concat([runs, compute_statuses(runs)], axis=1)
+        with perf.stage('index'):
+            index = RunsIndex(runs)
+        date_from, date_to = runs['lhi_completion_datetime'].quantile([0.25, 0.75])
+        with perf.stage('filter'):
+            filtered = index.select(date_from, date_to)
+            index.select(date_from, date_to, 'LHI - 02')
+        with perf.stage('figures'):
+            figures = [trend_chart(filtered, col, col, '#1f77b4')
+                       for col in ('std_01_rfu', 'std_07_rfu', 'blank_rfu', 'sn_std7_blank')]
+            figures += [box_chart(filtered, 'std_01_rfu', "Std-01", '#1f77b4'),
+                        violin_chart(filtered, 'sn_std7_blank', "S/N", '#d62728'),
+                        box_chart(filtered, 'sn_std7_blank', "S/N by Instrument", x='instrument')]
+        with perf.stage('serialize'):
+            for fig in figures:
+                fig.to_json()
+        for record in perf.records():
+            best[record['stage']] = min(best.get(record['stage'], float('inf')), record['ms'])
+    return best, baseline, peak_rss_mb()
+
+
+def bench_pipeline(workbook, repeat, row_counts=(1000, 10000, 100000)):
+    """
+    Stage latencies and peak RSS of the whole pipeline on synthetic workbooks.
+
+    Each size runs in its own process so its peak RSS is not inflated by the one
+    before. Workbooks are generated once per size (see write_synthetic_workbook).
+    """
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for n_rows in row_counts:
+        path = write_synthetic_workbook(n_rows)
+        with context.Pool(1) as pool:
+            results[n_rows] = pool.apply(_pipeline_pass, (path, repeat))
+
+    print(f"\n== Dashboard pipeline (synthetic Run_Log_Archive workbooks, best of {repeat}) ==")
+    print(f"{'stage (ms)':<20}" + ''.join(f"{f'{n:,} runs':>14}" for n in row_counts))
+    for stage in PIPELINE_STAGES:
+        print(f"{stage:<20}" + ''.join(f"{results[n][0][stage]:>14.1f}" for n in row_counts))
+    print(f"{'total':<20}" + ''.join(f"{sum(results[n][0].values()):>14.1f}" for n in row_counts))
+    print(f"{'peak RSS (MB)':<20}" + ''.join(f"{results[n][2] or float('nan'):>14.0f}" for n in row_counts))
+    print(f"{'  after imports':<20}" + ''.join(f"{results[n][1] or float('nan'):>14.0f}" for n in row_counts))
+
+
+BENCHMARKS = {
+    'reader': bench_reader,
+    'cache': bench_cache,
+    'ingest': bench_ingest,
+    'qplates': bench_qplates,
+    'charts': bench_charts,
+    'curves': bench_curves,
+    'spc': bench_spc,
+    'service': bench_service,
+    'pipeline': bench_pipeline,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workbook', default=DEFAULT_WORKBOOK, help="Tool .xlsm to benchmark against")
+    parser.add_argument('--repeat', type=int, default=5, help="Repetitions per case")
+    parser.add_argument('--only', nargs='*', choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument('--rows', nargs='*', type=int, default=[1000, 10000, 100000],
+                        help="Synthetic row counts for the charts, curves, spc, service and pipeline benchmarks")
+    args = parser.parse_args()
+
+    for name in args.only or BENCHMARKS:
+        if name in ('charts', 'curves', 'spc', 'service', 'pipeline'):
+            BENCHMARKS[name](args.workbook, args.repeat, args.rows)
+        else:
+            BENCHMARKS[name](args.workbook, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
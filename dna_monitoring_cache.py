@@ -0,0 +1,176 @@
+"""
+On-disk snapshots of normalized frames, plus the source fingerprint index.
+
+A snapshot is one .npy file per column plus meta.json, reloaded through memory-mapped
+arrays, so reading one back costs a few milliseconds instead of a workbook parse. The
+incremental ingest store (dna_monitoring_ingest) keeps Run_Log_Archive as a series of
+these snapshots, keys them by the source's prefix hash and bounds their number by
+compacting them; it is the only cache built on them, so snapshots carry no source key
+of their own.
+
+Layout (next to the app by default):
+
+    .dna_cache/
+        index.json                  path -> {size, mtime_ns, sha256} of last hash
+        <snapshot>/meta.json        row count, column names and encodings
+        <snapshot>/<n>.npy          one array per column
+
+The source's content hash is only recomputed when its size or mtime changes.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.dna_cache')
+
+_INDEX_FILE = 'index.json'
+_META_FILE = 'meta.json'
+_HASH_CHUNK = 1 << 20
+
+
+def _hash_file(path):
+    """SHA-256 of a file, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json(path, payload):
+    """Write JSON atomically so a concurrent reader never sees half a file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def source_fingerprint(path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return {size, mtime_ns, sha256} for the source file.
+
+    The content hash is reused from the index while size and mtime are unchanged,
+    so the common case (nothing archived since last rerun) never reads the file.
+    """
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    index_path = os.path.join(cache_dir, _INDEX_FILE)
+    index = read_json(index_path, {})
+
+    entry = index.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry
+
+    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _hash_file(path)}
+    os.makedirs(cache_dir, exist_ok=True)
+    index[key] = entry
+    write_json(index_path, index)
+    return entry
+
+
+def _encode_category(value):
+    """JSON-encode one category; timestamps in mixed columns are tagged"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return {'timestamp': pd.Timestamp(value).isoformat()}
+    return str(value)
+
+
+def _decode_category(value):
+    if isinstance(value, dict):
+        return pd.Timestamp(value['timestamp'])
+    return value
+
+
+def _encode_column(series):
+    """Turn one column into (array, meta) suitable for np.save"""
+    meta = {'name': series.name, 'dtype': str(series.dtype)}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy()
+        meta.update(kind='datetime', unit=np.datetime_data(values.dtype)[0])
+        return values.view('int64'), meta
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        meta['kind'] = 'numeric'
+        return series.to_numpy(), meta
+
+    # Strings / mixed object columns: dictionary-encode to int32 codes
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    meta.update(kind='category', categories=[_encode_category(v) for v in uniques])
+    return codes.astype('int32'), meta
+
+
+def _decode_column(values, meta):
+    """Rebuild a pandas Series from a memory-mapped array and its meta"""
+    kind = meta['kind']
+    if kind == 'datetime':
+        data = values.view(f"datetime64[{meta['unit']}]")
+    elif kind == 'numeric':
+        data = values
+    else:
+        lookup = np.empty(len(meta['categories']) + 1, dtype=object)
+        lookup[:-1] = [_decode_category(v) for v in meta['categories']]
+        lookup[-1] = np.nan
+        data = lookup[values]  # code -1 picks the trailing NaN slot
+        return pd.Series(data, name=meta['name'], dtype=object).astype(meta['dtype'])
+    # copy=False keeps the column on the memory map (pandas 3 copies arrays by default)
+    return pd.Series(data, name=meta['name'], copy=False)
+
+
+def write_snapshot(df, snapshot_dir):
+    """Persist df as one .npy per column plus meta.json, atomically"""
+    parent = os.path.dirname(snapshot_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.building-')
+    try:
+        columns = []
+        for position, name in enumerate(df.columns):
+            values, meta = _encode_column(df[name])
+            meta['file'] = f'{position}.npy'
+            np.save(os.path.join(tmp_dir, meta['file']), np.ascontiguousarray(values), allow_pickle=False)
+            columns.append(meta)
+        write_json(os.path.join(tmp_dir, _META_FILE), {
+            'rows': len(df),
+            'columns': columns,
+            'created': time.time(),
+        })
+        try:
+            os.rename(tmp_dir, snapshot_dir)
+        except OSError:
+            # Another session finished the same snapshot first; theirs is identical
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_snapshot(snapshot_dir):
+    """Load a snapshot written by write_snapshot, memory-mapping every column"""
+    meta = read_json(os.path.join(snapshot_dir, _META_FILE), None)
+    if meta is None:
+        return None
+    series = []
+    for column in meta['columns']:
+        values = np.load(os.path.join(snapshot_dir, column['file']), mmap_mode='r', allow_pickle=False)
+        series.append(_decode_column(values, column))
+    if not series:
+        return pd.DataFrame(index=range(meta['rows']))
+    return pd.concat(series, axis=1)
+
@@ -0,0 +1,266 @@
+"""
+Plotly figures for the trend and distribution tabs, sized for long histories.
+
+Every point handed to Plotly ends up in the page's JSON payload and is drawn by the
+browser, so once the archive holds years of runs the charts are reduced server-side:
+
+- trend lines keep at most MAX_POINTS runs, chosen by Largest-Triangle-Three-Buckets
+  (LTTB) so peaks, dips and steps survive, and switch to WebGL (scattergl) above
+  WEBGL_THRESHOLD points;
+- distributions keep MAX_POINTS runs spread evenly over the sorted values, so box
+  quartiles and violin shapes stay true to within one sample rank.
+
+Runs whose status is 🔴 under the dashboard's rules are kept whatever the reduction
+drops. They get at most half of the MAX_POINTS budget (min/max- or rank-reduced if
+there are more), so a bad period cannot blow the payload back up. For date
+ranges too wide for individual runs, rollup_chart() plots the precomputed per-period
+rollups from dna_monitoring_rollups instead. add_spc_overlay() draws the rolling
+control limits and rule violations from dna_monitoring_spc on either kind of chart,
+and add_spec_lines() the status rules' green band and yellow limits.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from dna_monitoring_rollups import GRAIN_LABELS
+from dna_monitoring_status import DEFAULT_RULES, INF, RED, band_text, compute_statuses, limit_text, rule_for
+
+MAX_POINTS = 2000
+WEBGL_THRESHOLD = 1000
+
+DATETIME_COLUMN = 'lhi_completion_datetime'
+
+
+def _as_float(series):
+    """Numeric view of a column for geometry; datetimes become epoch nanoseconds"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the n_out points LTTB keeps from x/y (x sorted ascending).
+
+    The first and last points are always kept; each bucket in between contributes the
+    point forming the largest triangle with the previously kept point and the mean of
+    the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    bounds = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = bounds[i], bounds[i + 1]
+        if i + 2 < len(bounds):
+            next_x = x[stop:bounds[i + 2]].mean()
+            next_y = y[stop:bounds[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax_indices(y, n_out):
+    """Indices of the min and max of y in each of n_out // 2 equal-width buckets"""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    buckets = np.arange(n) * max(1, n_out // 2) // n
+    order = np.lexsort((y, buckets))
+    first = np.flatnonzero(np.r_[True, buckets[order][1:] != buckets[order][:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.union1d(order[first], order[last])
+
+
+def out_of_spec(df, column, rules=None):
+    """Boolean mask of runs whose status for `column` is red under `rules` (all False if no rule)"""
+    rule = rule_for(DEFAULT_RULES if rules is None else rules, column)
+    if rule is None or column not in df.columns:
+        return pd.Series(False, index=df.index)
+    if rule['status'] in df.columns:
+        statuses = df[rule['status']]
+    else:
+        statuses = compute_statuses(df[[column]], [rule])[rule['status']]
+    return statuses == RED
+
+
+def downsample(df, x, y, max_points=MAX_POINTS, keep=None, method='lttb'):
+    """
+    Rows of df to draw y over x: at most max_points, plus every row flagged in `keep`.
+
+    Rows missing x or y are dropped (Plotly would not draw them anyway) and the result
+    is ordered by x. method is 'lttb' or 'minmax'. Flagged rows beyond half of
+    max_points are min/max-reduced, and the rest of the budget goes to the others,
+    so the result never exceeds max_points rows.
+    """
+    valid = df[x].notna() & df[y].notna()
+    data = df[valid]
+    if not data[x].is_monotonic_increasing:
+        data = data.sort_values(x, kind='stable')
+    if len(data) <= max_points:
+        return data
+
+    ys = _as_float(data[y])
+    kept = _flagged(data, keep)
+    if len(kept) > max_points // 2:
+        kept = kept[minmax_indices(ys[kept], max_points // 2)]
+    n_out = max_points - len(kept)
+    if method == 'minmax':
+        idx = minmax_indices(ys, n_out)
+    else:
+        idx = lttb_indices(_as_float(data[x]), ys, n_out)
+    return data.iloc[np.union1d(idx, kept)]
+
+
+def quantile_sample(df, y, max_points=MAX_POINTS, keep=None):
+    """
+    Rows of df at evenly spaced ranks of y, plus the rows flagged in `keep`.
+
+    As in downsample(), flagged rows are capped at half of max_points (themselves
+    sampled at evenly spaced ranks) and the result has at most max_points rows.
+    """
+    data = df[df[y].notna()]
+    if len(data) <= max_points:
+        return data
+    ys = _as_float(data[y])
+    kept = _flagged(data, keep)
+    if len(kept) > max_points // 2:
+        kept = kept[_even_ranks(ys[kept], max_points // 2)]
+    idx = _even_ranks(ys, max_points - len(kept))
+    return data.iloc[np.union1d(idx, kept)]
+
+
+def _flagged(data, keep):
+    """Positions in data of the rows flagged in `keep`"""
+    if keep is None:
+        return np.array([], dtype=np.int64)
+    return np.flatnonzero(keep.reindex(data.index, fill_value=False).to_numpy())
+
+
+def _even_ranks(values, n_out):
+    """Indices of n_out values at evenly spaced ranks (min and max included)"""
+    order = np.argsort(values, kind='stable')
+    return order[np.linspace(0, len(values) - 1, n_out).round().astype(np.int64)]
+
+
+def _shown_title(title, shown, total):
+    return title if shown >= total else f"{title} ({shown:,} of {total:,} runs shown)"
+
+
+def trend_chart(df, y, title, color, x=DATETIME_COLUMN, max_points=MAX_POINTS, rules=None):
+    """px.line with markers over a downsampled series; WebGL once it is large"""
+    total = int((df[x].notna() & df[y].notna()).sum())
+    data = downsample(df, x, y, max_points, keep=out_of_spec(df, y, rules))
+    return px.line(data, x=x, y=y, markers=True, title=_shown_title(title, len(data), total),
+                   color_discrete_sequence=[color],
+                   render_mode='webgl' if len(data) > WEBGL_THRESHOLD else 'svg')
+
+
+def _distribution_data(df, y, group, max_points, rules):
+    total = int(df[y].notna().sum())
+    keep = out_of_spec(df, y, rules)
+    if group is None:
+        data = quantile_sample(df, y, max_points, keep)
+    else:
+        # Each group is sampled on its own so small instruments keep their shape
+        data = pd.concat([quantile_sample(part, y, max_points, keep)
+                          for _, part in df.groupby(group, sort=False, observed=True)])
+    # Drawing every sampled point as SVG is the slow part; show outliers only when reduced
+    points = "all" if len(data) <= WEBGL_THRESHOLD and len(data) == total else "outliers"
+    return data, points, total
+
+
+def box_chart(df, y, title, color=None, x=None, max_points=MAX_POINTS, rules=None):
+    """px.box over a quantile sample of y (per x group if given)"""
+    data, points, total = _distribution_data(df, y, x, max_points, rules)
+    return px.box(data, y=y, x=x, title=_shown_title(title, len(data), total), points=points,
+                  color=x, color_discrete_sequence=[color] if color else None)
+
+
+def violin_chart(df, y, title, color, max_points=MAX_POINTS, rules=None):
+    """px.violin (with inner box) over a quantile sample of y"""
+    data, points, total = _distribution_data(df, y, None, max_points, rules)
+    return px.violin(data, y=y, title=_shown_title(title, len(data), total), box=True, points=points,
+                     color_discrete_sequence=[color])
+
+
+def rollup_chart(rollups, metric, title, color, grain):
+    """Per-period mean with a min-max band, from select_rollups()/query_rollups() output"""
+    data = rollups[rollups['metric'] == metric].sort_values('period_start')
+    x = data['period_start']
+    fig = go.Figure([
+        go.Scatter(x=x, y=data['max_value'], mode='lines', line_width=0, showlegend=False, hoverinfo='skip'),
+        go.Scatter(x=x, y=data['min_value'], mode='lines', line_width=0, fill='tonexty',
+                   fillcolor=color, opacity=0.2, name="Min-max", hoverinfo='skip'),
+        go.Scatter(x=x, y=data['mean'], mode='lines+markers', line_color=color, name="Mean",
+                   customdata=data[['n', 'std', 'p05', 'p50', 'p95', 'min_value', 'max_value']].to_numpy(),
+                   hovertemplate="Mean %{y:.4g} (n=%{customdata[0]})<br>SD %{customdata[1]:.3g}"
+                                 "<br>p05/p50/p95 %{customdata[2]:.4g} / %{customdata[3]:.4g} / %{customdata[4]:.4g}"
+                                 "<br>Min-max %{customdata[5]:.4g} - %{customdata[6]:.4g}<extra></extra>"),
+    ])
+    fig.update_layout(title=f"{title} ({GRAIN_LABELS[grain]} mean, min-max band)", showlegend=False)
+    return fig
+
+
+def add_spc_overlay(fig, spc, metric, show_limits=True, max_points=MAX_POINTS):
+    """
+    Overlay SPC results for one metric on a trend or rollup figure.
+
+    Runs flagged by any rule are marked with an x (hover lists the rules). The
+    rolling center line and +/-3 SD limits are drawn only with show_limits, which
+    makes sense for one instrument's series, not several interleaved ones.
+    """
+    data = spc[spc['metric'] == metric]
+    if show_limits and len(data):
+        limits = data[data['sd'].notna()].assign(ucl=lambda d: d['center'] + 3 * d['sd'],
+                                                  lcl=lambda d: d['center'] - 3 * d['sd'])
+        limits = downsample(limits, DATETIME_COLUMN, 'center', max_points)
+        scatter = go.Scattergl if len(limits) > WEBGL_THRESHOLD else go.Scatter
+        for column, name, dash in (('ucl', "UCL (rolling +3 SD)", 'dot'), ('center', "Rolling mean", 'dash'),
+                                   ('lcl', "LCL (rolling -3 SD)", 'dot')):
+            fig.add_trace(scatter(x=limits[DATETIME_COLUMN], y=limits[column], mode='lines', name=name,
+                                  line=dict(color='gray', width=1, dash=dash), hoverinfo='skip'))
+
+    flagged = data[data['rules'] != '']
+    if len(flagged):
+        flagged = downsample(flagged, DATETIME_COLUMN, 'value', max_points)
+        scatter = go.Scattergl if len(flagged) > WEBGL_THRESHOLD else go.Scatter
+        fig.add_trace(scatter(x=flagged[DATETIME_COLUMN], y=flagged['value'], mode='markers', name="SPC rule",
+                              marker=dict(symbol='x', size=9, color='crimson'), text=flagged['rules'],
+                              hovertemplate="%{y:.4g}<br>SPC: %{text}<extra></extra>"))
+    return fig
+
+
+def add_spec_lines(fig, rules, column):
+    """
+    Draw the limits of every status rule on `column` (e.g. from load_rules()).
+
+    The green band is shaded (or a dashed line when it is open-ended) and yellow
+    limits that differ from it are dashed orange lines, so the chart shows the same
+    thresholds the status columns were computed with.
+    """
+    for rule in rules:
+        if rule['column'] != column:
+            continue
+        closed = rule.get('closed', False)
+        low, high = rule['green']
+        name = rule['label'] if closed else "Target"
+        text = f"{name} ({band_text((low, high), closed)})"
+        if low > -INF and high < INF:
+            fig.add_hrect(low, high, fillcolor="green", opacity=0.1, line_width=0, annotation_text=text)
+        elif low > -INF or high < INF:
+            fig.add_hline(y=low if low > -INF else high, line_dash="dash", line_color="green", annotation_text=text)
+        for bound in rule['yellow']:
+            if abs(bound) < INF and bound not in (low, high):
+                fig.add_hline(y=bound, line_dash="dash", line_color="orange", annotation_text=f"Warning ({limit_text(bound)})")
+    return fig
@@ -0,0 +1,309 @@
+"""
+Standard-curve fitting for many runs at once.
+
+Each run's standards form one row of an (n_runs, n_standards) RFU matrix against the
+shared nominal concentrations (NaN where a standard was not recorded), and every fit
+below works on the whole matrix in one NumPy pass instead of looping over runs:
+
+- linear: the Tool's log-log line, ln(RFU - blank) = intercept + slope * ln(conc),
+  fitted by masked least squares (closed form, so thousands of runs cost a few array
+  operations). R² is on the log scale, as in the Std Curve sheet's "Check #4".
+- 4PL: RFU = a + (d - a) * u / (1 + u), u = (conc / c)^b, with the blank as the
+  conc = 0 point, fitted by Levenberg-Marquardt on relative residuals. Every run
+  takes its own damped step each iteration, solved as a stack of 4x4 systems.
+  Needs at least five points; fluorescence standards rarely saturate, so c and d
+  are often poorly determined even when the fit itself (r2) is excellent.
+
+Run_Log_Archive only keeps Std-01, Std-07 and the blank per run, so archived runs
+get a two-point line (slope/intercept but no R² or 4PL); the current run's seven
+standards come from the SpectraMax Raw Data sheet (dna_monitoring_qplates).
+
+Usage:
+    python3 dna_monitoring_curves.py [--excel path/to/Tool.xlsm]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dna_monitoring_qplates import load_qplates
+
+# Nominal concentrations (ng/uL), as in the Specification sheet's Standard-01..07 rows
+STANDARD_CONCENTRATIONS = {
+    'Std-01': 20.0, 'Std-02': 8.333, 'Std-03': 3.472, 'Std-04': 1.447,
+    'Std-05': 0.603, 'Std-06': 0.251, 'Std-07': 0.105,
+}
+BLANK = 'Blank'
+
+FOURPL_MIN_POINTS = 5
+FOURPL_ITERATIONS = 60
+
+# curve_fits columns, see dna_monitoring_db
+FIT_COLUMNS = [
+    'curve_points', 'curve_slope', 'curve_intercept', 'curve_r2', 'curve_max_error_pct',
+    'fourpl_a', 'fourpl_b', 'fourpl_c', 'fourpl_d', 'fourpl_r2',
+]
+
+
+def standards_matrix(standards):
+    """
+    Pivot long standards rows (row_id, standard, rfu) into fitting inputs.
+
+    Returns (row_ids, conc, rfu, blank): conc holds the STANDARD_CONCENTRATIONS in
+    column order, rfu is (n_runs, 7) and blank (n_runs,), NaN where missing.
+    """
+    wide = standards.pivot_table(index='row_id', columns='standard', values='rfu', aggfunc='first')
+    wide = wide.reindex(columns=list(STANDARD_CONCENTRATIONS) + [BLANK])
+    rfu = wide[list(STANDARD_CONCENTRATIONS)].to_numpy(dtype=float)
+    return wide.index.to_numpy(), np.array(list(STANDARD_CONCENTRATIONS.values())), rfu, wide[BLANK].to_numpy(dtype=float)
+
+
+def _r2(y, fitted, mask):
+    """Coefficient of determination per row over the masked points"""
+    n = mask.sum(axis=1)
+    mean = np.where(mask, y, 0).sum(axis=1) / np.maximum(n, 1)
+    ss_res = np.where(mask, (y - fitted) ** 2, 0).sum(axis=1)
+    ss_tot = np.where(mask, (y - mean[:, None]) ** 2, 0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+
+
+def fit_linear(conc, rfu, blank):
+    """
+    Log-log least-squares line for every row of rfu.
+
+    Points at or below the blank are left out. Returns a dict of (n_runs,) arrays:
+    points, slope, intercept and r2 (NaN below three points, where it is always 1).
+    """
+    rfu = np.atleast_2d(np.asarray(rfu, dtype=float))
+    signal = rfu - np.asarray(blank, dtype=float).reshape(-1, 1)
+    x = np.broadcast_to(np.log(np.asarray(conc, dtype=float)), rfu.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log(np.where(signal > 0, signal, np.nan))
+    mask = np.isfinite(x) & np.isfinite(y)
+    x0, y0 = np.where(mask, x, 0), np.where(mask, y, 0)
+
+    n = mask.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = x0.sum(axis=1) / n
+        mean_y = y0.sum(axis=1) / n
+        dx = np.where(mask, x - mean_x[:, None], 0)
+        sxx = (dx ** 2).sum(axis=1)
+        slope = np.where((n >= 2) & (sxx > 0), (dx * (y0 - mean_y[:, None])).sum(axis=1) / sxx, np.nan)
+        intercept = mean_y - slope * mean_x
+    r2 = _r2(y, intercept[:, None] + slope[:, None] * x, mask)
+    return {'points': n, 'slope': slope, 'intercept': intercept, 'r2': np.where(n >= 3, r2, np.nan)}
+
+
+def back_calculate_linear(rfu, blank, fit):
+    """Concentrations for rfu (n_runs, k) from each run's line; NaN at or below the blank"""
+    signal = np.atleast_2d(np.asarray(rfu, dtype=float)) - np.asarray(blank, dtype=float).reshape(-1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_signal = np.log(np.where(signal > 0, signal, np.nan))
+        return np.exp((log_signal - fit['intercept'][:, None]) / fit['slope'][:, None])
+
+
+def _fourpl(params, log_x, zero):
+    """4PL response and Jacobian for params (n, 4) = [a, ln(d - a), ln c, b]"""
+    a, log_span, log_c, b = (params[:, i:i + 1] for i in range(4))
+    span = np.exp(log_span)
+    with np.errstate(over='ignore', invalid='ignore'):
+        u = np.where(zero, 0.0, np.exp(np.clip(b * (log_x - log_c), -50, 50)))
+    g = u / (1 + u)
+    dg = span / (1 + u) ** 2
+    jac = np.stack([np.ones_like(g), span * g, dg * -b * u,
+                    dg * np.where(zero, 0.0, log_x - log_c) * u], axis=-1)
+    return a + span * g, jac
+
+
+def fit_4pl(conc, rfu, blank, iterations=FOURPL_ITERATIONS):
+    """
+    Four-parameter logistic fit for every row of rfu, blank included as conc = 0.
+
+    Returns a dict of (n_runs,) arrays: points, a (response at zero), b (slope
+    factor), c (inflection concentration), d (response at saturation) and r2 (on
+    ln RFU, comparable with fit_linear). Rows with fewer than FOURPL_MIN_POINTS
+    points are NaN.
+    """
+    rfu = np.atleast_2d(np.asarray(rfu, dtype=float))
+    blank = np.asarray(blank, dtype=float).reshape(-1, 1)
+    conc = np.append(np.asarray(conc, dtype=float), 0.0)
+    y = np.concatenate([rfu, blank], axis=1)
+    zero = np.broadcast_to(conc == 0, y.shape)
+    with np.errstate(divide='ignore'):
+        log_x = np.broadcast_to(np.where(conc > 0, np.log(np.where(conc > 0, conc, 1)), 0.0), y.shape)
+    mask = np.isfinite(y) & (y > 0)
+    n = mask.sum(axis=1)
+    ok = n >= FOURPL_MIN_POINTS
+    # Relative residuals: RFU spans three decades and every standard should count
+    weight = np.where(mask, 1 / np.where(mask, y, 1), 0)
+    y0 = np.where(mask, y, 0)
+
+    low = np.where(mask, y, np.inf).min(axis=1)
+    high = np.where(mask, y, -np.inf).max(axis=1)
+    # Start linear in conc: c well above the top standard, span so the top standard fits
+    c0 = np.log(2 * conc.max())
+    params = np.column_stack([
+        np.where(ok, 0.9 * low, 0), np.log(np.where(ok, 3 * np.maximum(high - low, 1), 1)),
+        np.full(len(y), c0), np.ones(len(y)),
+    ])
+    damping = np.full(len(y), 1e-3)
+
+    def cost(p):
+        fitted, jac = _fourpl(p, log_x, zero)
+        resid = (fitted - y0) * weight
+        return (resid ** 2).sum(axis=1), resid, jac * weight[..., None]
+
+    current, resid, jac = cost(params)
+    for _ in range(iterations):
+        jtj = np.einsum('nki,nkj->nij', jac, jac)
+        jtr = np.einsum('nki,nk->ni', jac, resid)
+        diag = np.einsum('nii->ni', jtj)
+        system = jtj + (damping[:, None] * np.maximum(diag, 1e-12))[:, :, None] * np.eye(4)
+        solvable = ok & np.isfinite(system).all(axis=(1, 2)) & np.isfinite(jtr).all(axis=1)
+        step = np.linalg.solve(np.where(solvable[:, None, None], system, np.eye(4)),
+                               np.where(solvable[:, None], -jtr, 0)[..., None])[..., 0]
+        trial = params + np.where(solvable[:, None], step, 0)
+        trial_cost, trial_resid, trial_jac = cost(trial)
+        better = np.isfinite(trial_cost) & (trial_cost < current)
+        params = np.where(better[:, None], trial, params)
+        current = np.where(better, trial_cost, current)
+        resid = np.where(better[:, None], trial_resid, resid)
+        jac = np.where(better[:, None, None], trial_jac, jac)
+        damping = np.clip(np.where(better, damping * 0.3, damping * 10), 1e-9, 1e9)
+
+    fitted, _ = _fourpl(params, log_x, zero)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = _r2(np.log(np.where(mask, y, 1)), np.log(np.where(fitted > 0, fitted, np.nan)), mask)
+    nan = np.full(len(y), np.nan)
+    return {
+        'points': n,
+        'a': np.where(ok, params[:, 0], nan),
+        'b': np.where(ok, params[:, 3], nan),
+        'c': np.where(ok, np.exp(params[:, 2]), nan),
+        'd': np.where(ok, params[:, 0] + np.exp(params[:, 1]), nan),
+        'r2': np.where(ok, r2, nan),
+    }
+
+
+def back_calculate_4pl(rfu, fit):
+    """Concentrations for rfu (n_runs, k) from each run's 4PL; NaN outside (a, d)"""
+    rfu = np.atleast_2d(np.asarray(rfu, dtype=float))
+    a, b, c, d = (fit[key][:, None] for key in ('a', 'b', 'c', 'd'))
+    g = (rfu - a) / (d - a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((g > 0) & (g < 1), c * (g / (1 - g)) ** (1 / b), np.nan)
+
+
+def fit_curves(standards):
+    """
+    Linear and 4PL fits for every run in long standards rows (row_id, standard, rfu).
+
+    Returns a frame indexed by row_id with FIT_COLUMNS; curve_max_error_pct is the
+    worst back-calculated standard's deviation from its nominal concentration.
+    """
+    row_ids, conc, rfu, blank = standards_matrix(standards)
+    linear = fit_linear(conc, rfu, blank)
+    fourpl = fit_4pl(conc, rfu, blank)
+    with np.errstate(invalid='ignore'):
+        error = np.abs(back_calculate_linear(rfu, blank, linear) / conc - 1) * 100
+        max_error = np.where(np.isnan(error), -np.inf, error).max(axis=1)
+    max_error = np.where((linear['points'] >= 3) & np.isfinite(max_error), max_error, np.nan)
+    return pd.DataFrame({
+        'curve_points': linear['points'],
+        'curve_slope': linear['slope'],
+        'curve_intercept': linear['intercept'],
+        'curve_r2': linear['r2'],
+        'curve_max_error_pct': max_error,
+        'fourpl_a': fourpl['a'],
+        'fourpl_b': fourpl['b'],
+        'fourpl_c': fourpl['c'],
+        'fourpl_d': fourpl['d'],
+        'fourpl_r2': fourpl['r2'],
+    }, index=pd.Index(row_ids, name='row_id'))
+
+
+def standards_from_runs(runs):
+    """Long standards rows from a runs frame's std_01_rfu/std_07_rfu/blank_rfu (row_id = position)"""
+    columns = {'Std-01': 'std_01_rfu', 'Std-07': 'std_07_rfu', BLANK: 'blank_rfu'}
+    row_ids = np.arange(len(runs))
+    return pd.concat([pd.DataFrame({'row_id': row_ids, 'standard': standard,
+                                    'rfu': pd.to_numeric(runs[col], errors='coerce').to_numpy()})
+                      for standard, col in columns.items()], ignore_index=True)
+
+
+def standards_from_wells(wells):
+    """Long standards rows (row_id 0) from the standards plate of load_qplates() wells"""
+    plate = wells[wells['role'].isin(['Standard', 'Blank'])]
+    names = plate['sample'].astype(str).str.replace('Standard-', 'Std-', regex=False)
+    means = plate.groupby(names.to_numpy())['rfu'].mean()
+    return pd.DataFrame({'row_id': 0, 'standard': means.index, 'rfu': means.to_numpy(dtype=float)})
+
+
+def update_curve_fits(conn):
+    """
+    Fit every run that has standards but no row in curve_fits yet.
+
+    Fits are cached per run: after a sync only the new runs are fitted, and a
+    database from before curve fitting is backfilled once. Runs without a single
+    standard reading get an empty row (curve_points 0), so they are not queried
+    again on the next sync. Returns the number fitted.
+    """
+    standards = pd.read_sql_query(
+        'SELECT s.row_id, s.standard, s.rfu FROM standards s '
+        'WHERE NOT EXISTS (SELECT 1 FROM curve_fits f WHERE f.row_id = s.row_id)', conn)
+    if standards.empty:
+        return 0
+    # The pivot in fit_curves drops runs whose standards are all NULL
+    fits = fit_curves(standards).reindex(pd.Index(standards['row_id'].unique(), name='row_id'))
+    fits['curve_points'] = fits['curve_points'].fillna(0)
+    fits = fits.reset_index()
+    conn.executemany(
+        f"INSERT INTO curve_fits ({', '.join(fits.columns)}) VALUES ({', '.join('?' * len(fits.columns))})",
+        fits.astype(object).where(fits.notna(), None).itertuples(index=False, name=None))
+    return len(fits)
+
+
+_fit_cache = {}
+
+
+def cached_curve_fits(runs_df, generation):
+    """
+    fit_curves() for an append-only runs frame, caching fits per run.
+
+    Rows already fitted under the same ingest `generation` are reused, so each run
+    is fitted once; a new generation (the archive was rewritten) starts over.
+    Returns FIT_COLUMNS aligned with runs_df's index.
+    """
+    fits = _fit_cache.get(generation)
+    if fits is None or len(fits) > len(runs_df):
+        fits = fit_curves(standards_from_runs(runs_df)).reset_index(drop=True)
+    elif len(fits) < len(runs_df):
+        new = fit_curves(standards_from_runs(runs_df.iloc[len(fits):]))
+        fits = pd.concat([fits, new.reset_index(drop=True)], ignore_index=True)
+    _fit_cache.clear()
+    _fit_cache[generation] = fits
+    return fits.set_axis(runs_df.index)
+
+
+def main():
+    # Imported here: dna_monitoring_sync imports this module
+    from dna_monitoring_sync import EXCEL_PATH
+
+    parser = argparse.ArgumentParser(description="Refit the current run's standard curve and compare it with the Tool's")
+    parser.add_argument('--excel', default=EXCEL_PATH, help="Tool-000011 .xlsm to read")
+    args = parser.parse_args()
+
+    wells, _, curve = load_qplates(args.excel)
+    fits = fit_curves(standards_from_wells(wells)).iloc[0]
+    if curve is not None and curve['source'] != 'refit':
+        print(f"📐 Tool:   slope {curve['slope']:.4f}  intercept {curve['intercept']:.4f}  R² {curve['r2']:.5f}")
+    print(f"📐 Refit:  slope {fits['curve_slope']:.4f}  intercept {fits['curve_intercept']:.4f}  "
+          f"R² {fits['curve_r2']:.5f}  worst standard {fits['curve_max_error_pct']:.1f}% off")
+    print(f"📈 4PL:    a {fits['fourpl_a']:,.0f}  b {fits['fourpl_b']:.3f}  c {fits['fourpl_c']:.3g}  "
+          f"d {fits['fourpl_d']:.3g}  R² {fits['fourpl_r2']:.5f}")
+
+
+if __name__ == '__main__':
+    main()
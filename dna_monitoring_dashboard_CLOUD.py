@@ -1,72 +1,120 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import numpy as np
+from datetime import datetime
 import requests
 import os
 from io import BytesIO
 
+from dna_monitoring_charts import add_spc_overlay, add_spec_lines, box_chart, rollup_chart, trend_chart, violin_chart
+from dna_monitoring_curves import cached_curve_fits
+from dna_monitoring_excel import load_specifications
+from dna_monitoring_fetch import fetch, read_blob
+from dna_monitoring_ingest import DEFAULT_STORE_ROOT, ingest_run_log, ingest_status
+from dna_monitoring_qplates import load_qplates
+from dna_monitoring_reports import FrameSource, get_report_engine
+from dna_monitoring_rollups import GRAIN_LABELS, cached_rollups, choose_grain, select_rollups
+from dna_monitoring_service import shared_runs
+from dna_monitoring_spc import RULES, cached_spc, select_spc, violation_counts
+from dna_monitoring_status import (
+    CURVE_SPEC_RULES, GREEN, RED, YELLOW, band_text, cached_statuses, load_rules, rule_for, rules_from_specifications,
+    rules_version, status_counts,
+)
+from dna_monitoring_perf import PerfRecorder
+from dna_monitoring_ui import render_perf_panel, render_qplates, render_reports, render_run_browser, show_figure
+
 st.set_page_config(page_title="DNA Concentration Monitoring", page_icon="🧬", layout="wide", initial_sidebar_state="expanded")
 
 st.title("🧬 DNA Concentration Monitoring Dashboard")
 st.markdown("Real-time monitoring of SpectraMax DNA concentration assays with Q-Plate trends & statistical analysis")
 
+# Stage timings for this rerun; shown in the sidebar with ?admin=1 and logged as JSON
+perf = PerfRecorder('CLOUD')
+
 # ===== CLOUD VERSION - DOWNLOADS TOOL FILE FROM GITHUB =====
 GITHUB_REPO = "NonsoOrji/dna-monitoring-dashboard"
 GITHUB_RAW_URL = f"https://raw.githubusercontent.com/{GITHUB_REPO}/main/data/Tool-000011_DNA_Concentration_with_SpectraMax_Nonso_Version_Macro.xlsm"
+GITHUB_STORE_DIR = os.path.join(DEFAULT_STORE_ROOT, 'github')
+
+@st.cache_data(max_entries=2)
+def load_specifications_from_github(blob_path, blob_sha256):
+    """Specification sheet of the downloaded Tool file"""
+    return load_specifications(BytesIO(read_blob(blob_path)))
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def load_data_from_github():
-    """Download and load data from Tool file stored in GitHub"""
+def load_runs(blob_path, rules):
+    """Runs of the cached copy of the Tool file stored in GitHub, with statuses and curve fits"""
+    # Read the Excel file from bytes
+    excel_file = BytesIO(read_blob(blob_path))
+    # Only runs archived since the last download are parsed (and renamed to the dashboard columns)
+    with perf.stage('ingest'):
+        runs_df = ingest_run_log(excel_file, store_dir=GITHUB_STORE_DIR)
+    
+    # Statuses are evaluated once per ingested version, not on every download or rerun
+    state = ingest_status(GITHUB_STORE_DIR)
+    with perf.stage('statuses'):
+        statuses = cached_statuses(runs_df, (state['generation'], state['rows']), rules)
+    # Curves are fitted once per archived run and reused across downloads
+    with perf.stage('curves'):
+        curves = cached_curve_fits(runs_df, state['generation'])[['curve_slope', 'curve_intercept', 'curve_r2']]
+    return pd.concat([runs_df, statuses, curves], axis=1)
+
+def load_data_from_github(blob_path, blob_sha256, rules):
+    """
+    Shared, pre-indexed runs of one downloaded version of the Tool file.
+    
+    Parsed once per version for every session in this process; sessions asking while
+    it loads wait for that one parse.
+    """
     try:
-        st.info("📥 Loading data from GitHub...")
-        
-        # Download file from GitHub
-        response = requests.get(GITHUB_RAW_URL, timeout=30)
-        response.raise_for_status()
-        
-        # Read the Excel file from bytes
-        excel_file = BytesIO(response.content)
-        runs_df = pd.read_excel(excel_file, sheet_name='Run_Log_Archive')
-        
-        # Handle potential column name variations
-        column_mapping = {
-            'LHI Completion DateTime': 'lhi_completion_datetime',
-            'LHI ID': 'lhi_id',
-            'SpectraMax Instrument': 'instrument',
-            'Std Read DateTime': 'std_read_datetime',
-            'Std Δ Time (min)': 'std_delta_time_min',
-            'Std-01 RFU (avg)': 'std_01_rfu',
-            'Std-07 RFU (avg)': 'std_07_rfu',
-            'Blank RFU (avg)': 'blank_rfu',
-            'Std S/N (Std7/Blank)': 'sn_std7_blank',
-        }
-        
-        # Rename columns if they exist
-        for old_name, new_name in column_mapping.items():
-            if old_name in runs_df.columns:
-                runs_df.rename(columns={old_name: new_name}, inplace=True)
-        
-        # Ensure datetime column
-        if 'lhi_completion_datetime' in runs_df.columns:
-            runs_df['lhi_completion_datetime'] = pd.to_datetime(runs_df['lhi_completion_datetime'])
-        
-        st.success("✅ Data loaded successfully!")
-        return runs_df
+        with st.spinner("📥 Loading data from GitHub..."):
+            return shared_runs(('github', blob_sha256, rules_version(rules)), lambda: load_runs(blob_path, rules))
+    except Exception as e:
+        st.error(f"❌ Error reading Tool file: {str(e)}")
+        st.info("Ensure the file has 'Run_Log_Archive' sheet")
+        return None
+
+@st.cache_data(max_entries=2)
+def load_qplates_from_github(blob_path, blob_sha256):
+    """Per-well Q-Plate reads of the run in the downloaded Tool file"""
+    return load_qplates(BytesIO(read_blob(blob_path)))
+
+def show_qplates():
+    """Q-Plate section of tab4; a parse failure only hides this section"""
+    try:
+        qplates = load_qplates_from_github(blob_path, blob_meta['sha256'])
+    except Exception as e:
+        st.warning(f"⚠️ Q-Plate data unavailable: {str(e)}")
+        return
+    render_qplates(*qplates)
+
+def fetch_tool_file():
+    """
+    Path and metadata of the local copy of the GitHub Tool file.
     
+    Served from the on-disk cache shared by all workers; once it is older than the
+    server's max-age it is still served while a background conditional request
+    (ETag / If-Modified-Since) checks for a new version. Only a cold cache waits.
+    """
+    try:
+        return fetch(GITHUB_RAW_URL)
     except requests.exceptions.RequestException as e:
         st.error(f"❌ Error downloading file from GitHub: {str(e)}")
         st.info("Make sure the Tool file is uploaded to GitHub at: data/ directory")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"❌ Error reading Tool file: {str(e)}")
-        st.info("Ensure the file has 'Run_Log_Archive' sheet")
-        return pd.DataFrame()
+        return None, None
 
 # Load data
-runs_df = load_data_from_github()
+with perf.stage('fetch'):
+    blob_path, blob_meta = fetch_tool_file()
+with perf.stage('load'):
+    runs, specs = None, None
+    if blob_path is not None:
+        try:
+            specs = load_specifications_from_github(blob_path, blob_meta['sha256'])
+        except Exception as e:
+            st.warning(f"⚠️ Specification sheet unavailable, using the default limits: {str(e)}")
+    rules = load_rules(specifications=specs)
+    if blob_path is not None:
+        runs = load_data_from_github(blob_path, blob_meta['sha256'], rules)
+runs_df = pd.DataFrame() if runs is None else runs.runs
 
 if len(runs_df) == 0:
     st.warning("No data available. Check GitHub file and Run_Log_Archive sheet.")
@@ -76,154 +124,171 @@ else:
         date_from = st.date_input("From Date", value=datetime(2025, 11, 1))
         date_to = st.date_input("To Date", value=datetime.now())
         
-        if 'instrument' in runs_df.columns:
-            instruments = ["All Instruments"] + runs_df['instrument'].unique().tolist()
-            selected_instrument = st.selectbox("Select Instrument", instruments)
-        else:
-            selected_instrument = "All Instruments"
+        instruments = ["All Instruments"] + runs.instruments
+        selected_instrument = st.selectbox("Select Instrument", instruments)
         
         st.divider()
         st.info("☁️ Cloud version - data updated daily from GitHub")
-        st.caption("Last data update: Check GitHub repository")
-    
-    # Filter by date
-    if 'lhi_completion_datetime' in runs_df.columns:
-        date_from_dt = pd.Timestamp(date_from)
-        date_to_dt = pd.Timestamp(date_to)
-        filtered_df = runs_df[
-            (runs_df['lhi_completion_datetime'] >= date_from_dt) & 
-            (runs_df['lhi_completion_datetime'] <= date_to_dt)
-        ]
-    else:
-        filtered_df = runs_df
+        checked_min = (datetime.now().timestamp() - blob_meta['checked_at']) / 60
+        st.caption(f"Last data update: {blob_meta.get('last_modified') or 'Check GitHub repository'} "
+                   f"(checked {checked_min:.0f} min ago)")
     
-    # Filter by instrument
-    if selected_instrument != "All Instruments":
-        filtered_df = filtered_df[filtered_df['instrument'] == selected_instrument]
+    # Date and instrument filters are binary-search slices of the shared, pre-sorted runs
+    instrument = None if selected_instrument == "All Instruments" else selected_instrument
+    with perf.stage('filter'):
+        filtered_df = runs.select(date_from=pd.Timestamp(date_from), date_to=pd.Timestamp(date_to),
+                                  instrument=instrument)
     
     if len(filtered_df) == 0:
         st.warning("No data available for selected filters")
     else:
-        tab1, tab2, tab3, tab4 = st.tabs(["📋 By-Run Details", "📈 Trends & Analysis", "📊 Distribution Analysis", "🎯 Q-Plate Analysis"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["📋 By-Run Details", "📈 Trends & Analysis", "📊 Distribution Analysis", "🎯 Q-Plate Analysis", "📤 Reports"])
         
-        with tab1:
-            st.subheader(f"All Runs ({len(filtered_df)} total)")
-            
-            for idx, (_, run) in enumerate(filtered_df.iterrows()):
-                with st.expander(f"🔬 {run.get('lhi_id', 'N/A')} | {run.get('lhi_completion_datetime', 'N/A')} | {str(run.get('instrument', 'N/A')).split(' - ')[-1]}", expanded=(idx==0)):
-                    
-                    col1, col2, col3, col4, col5 = st.columns(5)
-                    
-                    with col1:
-                        std01 = run.get('std_01_rfu', 0)
-                        status_std01 = "🟢" if 40000000 < std01 < 42000000 else "🟡" if 39000000 < std01 < 43000000 else "🔴"
-                        st.metric("Std-01 RFU", f"{std01:.0f}", delta=status_std01)
-                    
-                    with col2:
-                        std07 = run.get('std_07_rfu', 0)
-                        status_std07 = "🟢" if 300000 < std07 < 400000 else "🟡" if 200000 < std07 < 450000 else "🔴"
-                        st.metric("Std-07 RFU", f"{std07:.0f}", delta=status_std07)
-                    
-                    with col3:
-                        blank = run.get('blank_rfu', 0)
-                        st.metric("Blank RFU", f"{blank:.0f}")
-                    
-                    with col4:
-                        sn = run.get('sn_std7_blank', 0)
-                        status_sn = "🟢" if sn > 3.0 else "🟡" if sn > 2.5 else "🔴"
-                        st.metric("S/N (Std-7/Blank)", f"{sn:.2f}", delta=status_sn)
-                    
-                    with col5:
-                        read_time = run.get('std_delta_time_min', 0)
-                        st.metric("Std Read Time", f"{read_time:.1f} min")
+        with tab1, perf.stage('tab1'):
+            render_run_browser(filtered_df)
         
-        with tab2:
+        with tab2, perf.stage('tab2'):
             st.subheader("Standards Trends")
             
+            # Wide, busy ranges plot the precomputed daily/weekly/monthly rollups instead of every run
+            grain = choose_grain(date_from, date_to, len(filtered_df))
+            rollups = None
+            ingest_state = ingest_status(GITHUB_STORE_DIR)
+            if grain is not None:
+                rollups = select_rollups(cached_rollups(runs_df, (ingest_state['generation'], ingest_state['rows'])),
+                                         grain, date_from, date_to, instrument)
+                st.caption(f"📅 {(date_to - date_from).days}-day range: showing {GRAIN_LABELS[grain].lower()} aggregates of {len(filtered_df)} runs")
+            
+            # Rolling control limits and rule flags; only runs new since the last rerun are processed
+            spc = select_spc(cached_spc(runs_df, ingest_state['generation']), date_from, date_to, instrument)
+            show_limits = instrument is not None and rollups is None
+            
             col1, col2 = st.columns(2)
             
             with col1:
                 if 'std_01_rfu' in filtered_df.columns:
-                    fig_std01 = px.line(filtered_df, x='lhi_completion_datetime', y='std_01_rfu', markers=True, 
-                                       title="Standard-01 RFU Trend", color_discrete_sequence=['#1f77b4'])
-                    fig_std01.add_hline(y=40000000, line_dash="dash", line_color="green", annotation_text="Target")
-                    fig_std01.add_hrect(39000000, 41000000, fillcolor="green", opacity=0.1)
+                    fig_std01 = (trend_chart(filtered_df, 'std_01_rfu', "Standard-01 RFU Trend", '#1f77b4', rules=rules) if rollups is None else
+                                 rollup_chart(rollups, 'std_01', "Standard-01 RFU Trend", '#1f77b4', grain))
+                    add_spec_lines(fig_std01, rules, 'std_01_rfu')
+                    add_spc_overlay(fig_std01, spc, 'std_01', show_limits)
                     fig_std01.update_layout(hovermode='x unified', height=400, template="plotly_white")
-                    st.plotly_chart(fig_std01, use_container_width=True)
+                    show_figure(fig_std01, perf)
             
             with col2:
                 if 'std_07_rfu' in filtered_df.columns:
-                    fig_std07 = px.line(filtered_df, x='lhi_completion_datetime', y='std_07_rfu', markers=True,
-                                       title="Standard-07 RFU Trend", color_discrete_sequence=['#ff7f0e'])
-                    fig_std07.add_hline(y=350000, line_dash="dash", line_color="green", annotation_text="Target")
+                    fig_std07 = (trend_chart(filtered_df, 'std_07_rfu', "Standard-07 RFU Trend", '#ff7f0e', rules=rules) if rollups is None else
+                                 rollup_chart(rollups, 'std_07', "Standard-07 RFU Trend", '#ff7f0e', grain))
+                    add_spec_lines(fig_std07, rules, 'std_07_rfu')
+                    add_spc_overlay(fig_std07, spc, 'std_07', show_limits)
                     fig_std07.update_layout(hovermode='x unified', height=400, template="plotly_white")
-                    st.plotly_chart(fig_std07, use_container_width=True)
+                    show_figure(fig_std07, perf)
             
             col1, col2 = st.columns(2)
             
             with col1:
                 if 'blank_rfu' in filtered_df.columns:
-                    fig_blank = px.line(filtered_df, x='lhi_completion_datetime', y='blank_rfu', markers=True,
-                                       title="Blank RFU Trend", color_discrete_sequence=['#2ca02c'])
+                    fig_blank = (trend_chart(filtered_df, 'blank_rfu', "Blank RFU Trend", '#2ca02c', rules=rules) if rollups is None else
+                                 rollup_chart(rollups, 'blank', "Blank RFU Trend", '#2ca02c', grain))
+                    add_spc_overlay(fig_blank, spc, 'blank', show_limits)
                     fig_blank.update_layout(hovermode='x unified', height=400, template="plotly_white")
-                    st.plotly_chart(fig_blank, use_container_width=True)
+                    show_figure(fig_blank, perf)
             
             with col2:
                 if 'sn_std7_blank' in filtered_df.columns:
-                    fig_sn = px.line(filtered_df, x='lhi_completion_datetime', y='sn_std7_blank', markers=True,
-                                    title="S/N Ratio Trend", color_discrete_sequence=['#d62728'])
-                    fig_sn.add_hline(y=3.0, line_dash="dash", line_color="green", annotation_text="Target (3.0)")
-                    fig_sn.add_hline(y=2.5, line_dash="dash", line_color="orange", annotation_text="Warning (2.5)")
-                    fig_sn.add_hline(y=2.0, line_dash="dash", line_color="red", annotation_text="Critical (2.0)")
+                    fig_sn = (trend_chart(filtered_df, 'sn_std7_blank', "S/N Ratio Trend", '#d62728', rules=rules) if rollups is None else
+                              rollup_chart(rollups, 'sn', "S/N Ratio Trend", '#d62728', grain))
+                    add_spec_lines(fig_sn, rules, 'sn_std7_blank')
+                    add_spc_overlay(fig_sn, spc, 'sn', show_limits)
                     fig_sn.update_layout(hovermode='x unified', height=400, template="plotly_white")
-                    st.plotly_chart(fig_sn, use_container_width=True)
+                    show_figure(fig_sn, perf)
+            
+            flagged = spc[spc['rules'] != '']
+            if len(flagged):
+                st.caption(f"🚨 SPC: {flagged['row_id'].nunique()} runs flagged by a control rule"
+                           + ("" if show_limits else " (select one instrument to see its rolling control limits)"))
+                with st.expander("📏 SPC rule violations"):
+                    st.dataframe(violation_counts(spc), use_container_width=True)
+                    st.markdown("\n".join(f"- **{code}**: {text}" for code, text in RULES.items()))
+            
+            st.subheader("Standard Curve Trends")
+            # Slope and intercept limits from the Specification sheet (no band if it has none)
+            curve_rules = rules_from_specifications(specs, CURVE_SPEC_RULES)
+            st.caption("Two-point log-log line through each run's Std-01 and Std-07 (blank subtracted), refitted from Run_Log_Archive")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                if 'curve_slope' in filtered_df.columns:
+                    fig_slope = trend_chart(filtered_df, 'curve_slope', "Standard Curve Slope", '#9467bd', rules=rules)
+                    add_spec_lines(fig_slope, curve_rules, 'curve_slope')
+                    fig_slope.update_layout(hovermode='x unified', height=400, template="plotly_white")
+                    show_figure(fig_slope, perf)
+            
+            with col2:
+                if 'curve_intercept' in filtered_df.columns:
+                    fig_intercept = trend_chart(filtered_df, 'curve_intercept', "Standard Curve Intercept", '#8c564b', rules=rules)
+                    add_spec_lines(fig_intercept, curve_rules, 'curve_intercept')
+                    fig_intercept.update_layout(hovermode='x unified', height=400, template="plotly_white")
+                    show_figure(fig_intercept, perf)
         
-        with tab3:
+        with tab3, perf.stage('tab3'):
             st.subheader("Distribution Analysis")
             
             col1, col2 = st.columns(2)
             
             with col1:
                 if 'std_01_rfu' in filtered_df.columns:
-                    fig_box_std01 = px.box(filtered_df, y='std_01_rfu', title="Std-01 Distribution",
-                                          points="all", color_discrete_sequence=['#1f77b4'])
-                    st.plotly_chart(fig_box_std01, use_container_width=True)
+                    fig_box_std01 = box_chart(filtered_df, 'std_01_rfu', "Std-01 Distribution", '#1f77b4', rules=rules)
+                    show_figure(fig_box_std01, perf)
             
             with col2:
                 if 'std_07_rfu' in filtered_df.columns:
-                    fig_box_std07 = px.box(filtered_df, y='std_07_rfu', title="Std-07 Distribution",
-                                          points="all", color_discrete_sequence=['#ff7f0e'])
-                    st.plotly_chart(fig_box_std07, use_container_width=True)
+                    fig_box_std07 = box_chart(filtered_df, 'std_07_rfu', "Std-07 Distribution", '#ff7f0e', rules=rules)
+                    show_figure(fig_box_std07, perf)
             
             col1, col2 = st.columns(2)
             
             with col1:
                 if 'sn_std7_blank' in filtered_df.columns:
-                    fig_violin_sn = px.violin(filtered_df, y='sn_std7_blank', title="S/N Ratio Distribution",
-                                             box=True, points="all", color_discrete_sequence=['#d62728'])
-                    st.plotly_chart(fig_violin_sn, use_container_width=True)
+                    fig_violin_sn = violin_chart(filtered_df, 'sn_std7_blank', "S/N Ratio Distribution", '#d62728', rules=rules)
+                    show_figure(fig_violin_sn, perf)
             
             with col2:
                 if 'instrument' in filtered_df.columns and 'sn_std7_blank' in filtered_df.columns:
                     inst_df = filtered_df[filtered_df['instrument'].notna()]
                     if len(inst_df) > 0:
-                        fig_box_by_inst = px.box(inst_df, y='sn_std7_blank', 
-                                                x='instrument', title="S/N by Instrument", color='instrument')
-                        st.plotly_chart(fig_box_by_inst, use_container_width=True)
+                        fig_box_by_inst = box_chart(inst_df, 'sn_std7_blank', "S/N by Instrument", x='instrument', rules=rules)
+                        show_figure(fig_box_by_inst, perf)
         
-        with tab4:
+        with tab4, perf.stage('tab4'):
             st.subheader("Quality Summary")
-            st.info("Note: Q-Plate data from Run_Log_Archive sheet (if available)")
+            st.info("Note: S/N counts cover the filtered runs in Run_Log_Archive; the Q-Plates below are the run currently in the Tool file")
             
-            if 'sn_std7_blank' in filtered_df.columns:
-                sn_passing = len(filtered_df[filtered_df['sn_std7_blank'] > 2.0])
-                sn_warning = len(filtered_df[(filtered_df['sn_std7_blank'] > 2.5) & (filtered_df['sn_std7_blank'] <= 3.0)])
-                sn_excellent = len(filtered_df[filtered_df['sn_std7_blank'] > 3.0])
+            if 'sn_status' in filtered_df.columns:
+                # Each run falls in exactly one level, so the three counts add up to the total
+                sn_counts = status_counts(filtered_df['sn_status'])
+                
+                sn_rule = rule_for(rules, 'sn_std7_blank')
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("🟢 Excellent (>3.0)", sn_excellent)
+                    st.metric(f"🟢 Excellent ({band_text(sn_rule['green'])})", sn_counts[GREEN])
                 with col2:
-                    st.metric("🟡 Warning (2.5-3.0)", sn_warning)
+                    st.metric(f"🟡 Warning ({band_text(sn_rule['yellow'])}, not green)", sn_counts[YELLOW])
                 with col3:
-                    st.metric("🔴 Critical (<2.5)", sn_passing - sn_warning - sn_excellent)
+                    st.metric("🔴 Critical (below warning or missing)", sn_counts[RED])
+                
+                if 'sn_sop_status' in filtered_df.columns and filtered_df['sn_sop_status'].notna().any():
+                    outside_sop = int((filtered_df['sn_sop_status'] != GREEN).sum())
+                    st.caption(f"{outside_sop} of {len(filtered_df)} runs outside the Specification sheet S/N window")
+            
+            st.divider()
+            show_qplates()
+        
+        with tab5, perf.stage('tab5'):
+            # Exports slice the shared runs; summaries read the rollups already cached for tab2
+            report_source = FrameSource(runs, cached_rollups(runs_df, (ingest_state['generation'], ingest_state['rows'])),
+                                        blob_meta['sha256'])
+            render_reports(get_report_engine(), report_source, date_from, date_to, instrument)
+
+render_perf_panel(perf)
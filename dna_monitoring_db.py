@@ -0,0 +1,332 @@
+"""
+SQLite backend for the DNA monitoring dashboard.
+
+Creates the schema the sync script writes into and provides the read queries the
+dashboard uses. The database runs in WAL mode so the dashboard can keep reading
+while dna_monitoring_sync.py appends new runs.
+
+Usage:
+    python3 dna_monitoring_db.py [--db path/to/dna_monitoring.db]
+"""
+
+import argparse
+import os
+import sqlite3
+
+import pandas as pd
+
+from dna_monitoring_status import STATUS_DTYPE
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dna_monitoring.db')
+
+# Timestamps are stored as sortable ISO text so range filters can use the indexes
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    row_id                  INTEGER PRIMARY KEY,   -- 0-based position in Run_Log_Archive
+    run_id                  TEXT,
+    lhi_id                  TEXT,
+    instrument              TEXT,
+    lhi_completion_datetime TEXT,
+    std_read_datetime       TEXT,
+    std_delta_time_min      REAL,
+    std_01_rfu              REAL,
+    std_07_rfu              REAL,
+    blank_rfu               REAL,
+    sn_std7_blank           REAL,
+    run_overall_qc          TEXT,
+    std_01_status           TEXT,                  -- traffic lights from dna_monitoring_status,
+    std_07_status           TEXT,                  -- computed once at sync time
+    sn_status               TEXT,
+    sn_sop_status           TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_completion ON runs (lhi_completion_datetime);
+CREATE INDEX IF NOT EXISTS idx_runs_instrument_completion ON runs (instrument, lhi_completion_datetime);
+
+CREATE TABLE IF NOT EXISTS standards (
+    row_id   INTEGER NOT NULL REFERENCES runs (row_id) ON DELETE CASCADE,
+    standard TEXT NOT NULL,                        -- 'Std-01', 'Std-07', 'Blank'
+    rfu      REAL,
+    PRIMARY KEY (row_id, standard)
+);
+
+CREATE TABLE IF NOT EXISTS qplates (
+    row_id         INTEGER NOT NULL REFERENCES runs (row_id) ON DELETE CASCADE,
+    plate          INTEGER NOT NULL,               -- Q1..Q5
+    read_datetime  TEXT,
+    delta_time_min REAL,
+    qhigh_conc     REAL,
+    qlow_conc      REAL,
+    qblank_conc    REAL,
+    qblank_note    TEXT,                           -- e.g. 'RFU QBlank < Std Curve Blank'
+    sn_ratio       REAL,
+    qc_status      TEXT,
+    median_conc    REAL,
+    n_below_range  REAL,
+    n_above_range  REAL,
+    PRIMARY KEY (row_id, plate)
+);
+
+CREATE TABLE IF NOT EXISTS specifications (
+    section   TEXT,
+    tbl       TEXT,
+    parameter TEXT NOT NULL,
+    value     REAL,
+    min_value REAL,
+    max_value REAL,
+    stdev     REAL,
+    criteria  TEXT
+);
+
+-- Per-run standard curve fits from dna_monitoring_curves, filled once per run
+CREATE TABLE IF NOT EXISTS curve_fits (
+    row_id              INTEGER PRIMARY KEY REFERENCES runs (row_id) ON DELETE CASCADE,
+    curve_points        INTEGER,                   -- standards above the blank used in the line
+    curve_slope         REAL,                      -- ln(RFU - blank) = intercept + slope * ln(conc)
+    curve_intercept     REAL,
+    curve_r2            REAL,                      -- NULL for two-point (archived) curves
+    curve_max_error_pct REAL,
+    fourpl_a            REAL,                      -- 4PL, NULL below five points
+    fourpl_b            REAL,
+    fourpl_c            REAL,
+    fourpl_d            REAL,
+    fourpl_r2           REAL
+);
+
+-- Mergeable per-period aggregates maintained by dna_monitoring_rollups
+CREATE TABLE IF NOT EXISTS rollups (
+    grain        TEXT NOT NULL,                    -- 'day', 'week' (Monday start), 'month'
+    period_start TEXT NOT NULL,                    -- YYYY-MM-DD
+    instrument   TEXT NOT NULL,
+    metric       TEXT NOT NULL,                    -- 'std_01', 'std_07', 'blank', 'sn'
+    runs         INTEGER NOT NULL,                 -- runs in the period, with or without a value
+    n            INTEGER NOT NULL,                 -- runs with a value for this metric
+    total        REAL,
+    total_sq     REAL,
+    min_value    REAL,
+    max_value    REAL,
+    sketch       TEXT,                             -- JSON {bucket: count}, see dna_monitoring_rollups
+    PRIMARY KEY (grain, instrument, metric, period_start)
+);
+
+-- Per-run SPC results and the state each series continues from, see dna_monitoring_spc
+CREATE TABLE IF NOT EXISTS spc (
+    row_id     INTEGER NOT NULL REFERENCES runs (row_id) ON DELETE CASCADE,
+    instrument TEXT NOT NULL,
+    metric     TEXT NOT NULL,                      -- 'std_01', 'std_07', 'blank', 'sn'
+    value      REAL,
+    center     REAL,                               -- rolling mean/SD of the runs before this one
+    sd         REAL,
+    z          REAL,
+    ewma       REAL,
+    cusum_pos  REAL,
+    cusum_neg  REAL,
+    rules      TEXT,                               -- violated rule codes, comma-separated
+    PRIMARY KEY (metric, row_id)
+);
+
+CREATE TABLE IF NOT EXISTS spc_state (
+    instrument TEXT NOT NULL,
+    metric     TEXT NOT NULL,
+    state      TEXT NOT NULL,                      -- JSON
+    PRIMARY KEY (instrument, metric)
+);
+
+-- Spec-rule alerts raised by dna_monitoring_alerts; alert_key makes each finding fire once
+CREATE TABLE IF NOT EXISTS alerts (
+    alert_key               TEXT PRIMARY KEY,      -- LHI ID | completion time | status column | level
+    raised_at               TEXT NOT NULL,
+    lhi_id                  TEXT,
+    instrument              TEXT,
+    lhi_completion_datetime TEXT,
+    rule                    TEXT NOT NULL,         -- status column, e.g. 'sn_status'
+    level                   TEXT NOT NULL,         -- 🟡 / 🔴
+    value                   REAL,
+    message                 TEXT NOT NULL,
+    outcome                 TEXT NOT NULL          -- 'pending', 'sent', 'rate-limited', 'failed', 'baseline'
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_instrument_raised ON alerts (instrument, raised_at);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Legacy wide metric tables, now views over rollups
+METRIC_VIEWS = {'daily_metrics': ('day', 'day'), 'weekly_metrics': ('week', 'week_start'),
+                'monthly_metrics': ('month', 'month_start')}
+
+
+def _metric_view(name, grain, period_column):
+    columns = []
+    for metric in ('std_01', 'std_07', 'blank', 'sn'):
+        columns.append(f"SUM(CASE WHEN metric = '{metric}' THEN total END) / "
+                       f"SUM(CASE WHEN metric = '{metric}' THEN n END) AS {metric}_avg")
+        columns.append(f"MIN(CASE WHEN metric = '{metric}' THEN min_value END) AS {metric}_min")
+        columns.append(f"MAX(CASE WHEN metric = '{metric}' THEN max_value END) AS {metric}_max")
+    return (f"CREATE VIEW IF NOT EXISTS {name} AS SELECT period_start AS {period_column}, instrument, "
+            f"MAX(runs) AS run_count, {', '.join(columns)} FROM rollups WHERE grain = '{grain}' "
+            f"GROUP BY period_start, instrument;")
+
+
+SCHEMA += '\n'.join(_metric_view(name, *spec) for name, spec in METRIC_VIEWS.items())
+
+# runs columns handed back to the dashboard, in dashboard naming
+RUN_COLUMNS = [
+    'run_id', 'lhi_id', 'instrument', 'lhi_completion_datetime', 'std_read_datetime',
+    'std_delta_time_min', 'std_01_rfu', 'std_07_rfu', 'blank_rfu', 'sn_std7_blank', 'run_overall_qc',
+    'std_01_status', 'std_07_status', 'sn_status', 'sn_sop_status',
+]
+
+STATUS_COLUMNS = ['std_01_status', 'std_07_status', 'sn_status', 'sn_sop_status']
+
+# curve_fits columns joined onto each run (NaN until the run has been fitted)
+CURVE_COLUMNS = ['curve_slope', 'curve_intercept', 'curve_r2']
+
+
+def connect(db_path=DB_PATH):
+    """Open the database in WAL mode; safe to share across Streamlit threads"""
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+
+def init_db(db_path=DB_PATH):
+    """Create tables and indexes if they don't exist yet"""
+    conn = connect(db_path)
+    # daily_metrics/weekly_metrics used to be tables; they are rebuilt from rollups on the next sync
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)",
+                                tuple(METRIC_VIEWS)).fetchall():
+        conn.execute(f'DROP TABLE {name}')
+    conn.executescript(SCHEMA)
+    # Databases created before status columns existed get them added; the next sync fills them
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(runs)')}
+    for col in STATUS_COLUMNS:
+        if col not in existing:
+            conn.execute(f'ALTER TABLE runs ADD COLUMN {col} TEXT')
+    conn.commit()
+    return conn
+
+
+def to_db_datetime(value):
+    """Format a timestamp-like value the way runs.lhi_completion_datetime is stored"""
+    return pd.Timestamp(value).strftime(DATETIME_FORMAT)
+
+
+def get_state(conn, key, default=None):
+    row = conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_state(conn, key, value):
+    conn.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+
+def count_runs(conn):
+    return conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+
+def list_instruments(conn):
+    """Distinct instruments, read straight off idx_runs_instrument_completion"""
+    rows = conn.execute('SELECT DISTINCT instrument FROM runs WHERE instrument IS NOT NULL ORDER BY instrument')
+    return [r[0] for r in rows]
+
+
+def query_specifications(conn):
+    """Specification sheet limits stored by the last sync (column 'tbl' is the sheet's table)"""
+    return pd.read_sql_query('SELECT * FROM specifications', conn)
+
+
+def _run_filters(date_from, date_to, instrument, table=''):
+    """WHERE clause and parameters for the runs date/instrument filters"""
+    clauses, params = [], []
+    if date_from is not None:
+        clauses.append(f'{table}lhi_completion_datetime >= ?')
+        params.append(to_db_datetime(date_from))
+    if date_to is not None:
+        clauses.append(f'{table}lhi_completion_datetime <= ?')
+        params.append(to_db_datetime(date_to))
+    if instrument is not None:
+        clauses.append(f'{table}instrument = ?')
+        params.append(instrument)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ''), params
+
+
+def _parse_runs(df):
+    for col in ('lhi_completion_datetime', 'std_read_datetime'):
+        df[col] = pd.to_datetime(df[col], format=DATETIME_FORMAT)
+    for col in STATUS_COLUMNS:
+        df[col] = df[col].astype(STATUS_DTYPE)
+    # All-NULL columns (e.g. R² of two-point curves) would otherwise come back as object
+    df[CURVE_COLUMNS] = df[CURVE_COLUMNS].astype(float)
+    return df
+
+
+def _parse_qplates(df):
+    for col in ('lhi_completion_datetime', 'read_datetime'):
+        df[col] = pd.to_datetime(df[col], format=DATETIME_FORMAT)
+    return df
+
+
+def _runs_sql(date_from, date_to, instrument):
+    where, params = _run_filters(date_from, date_to, instrument)
+    return (f"SELECT {', '.join(RUN_COLUMNS + CURVE_COLUMNS)} FROM runs "
+            f"LEFT JOIN curve_fits USING (row_id) {where} ORDER BY row_id"), params
+
+
+def query_runs(conn, date_from=None, date_to=None, instrument=None):
+    """
+    Return runs in [date_from, date_to] (inclusive), optionally for one instrument.
+
+    Both filters are answered from the completion-datetime indexes, so the cost is
+    proportional to the rows returned rather than the whole archive. Rows come back
+    in archive order with lhi_completion_datetime parsed as datetime64, the status
+    columns as ordered categoricals and each run's standard curve (CURVE_COLUMNS).
+    """
+    sql, params = _runs_sql(date_from, date_to, instrument)
+    return _parse_runs(pd.read_sql_query(sql, conn, params=params))
+
+
+def _iter_chunks(conn, sql, params, chunksize, parse=None):
+    """read_sql_query in chunks; always yields at least one (possibly empty) frame"""
+    empty = True
+    for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize):
+        empty = False
+        yield chunk if parse is None else parse(chunk)
+    if empty:
+        chunk = pd.read_sql_query(f'SELECT * FROM ({sql}) LIMIT 0', conn, params=params)
+        yield chunk if parse is None else parse(chunk)
+
+
+def iter_runs(conn, date_from=None, date_to=None, instrument=None, chunksize=10000):
+    """query_runs() as a stream of frames of at most `chunksize` runs"""
+    sql, params = _runs_sql(date_from, date_to, instrument)
+    yield from _iter_chunks(conn, sql, params, chunksize, _parse_runs)
+
+
+def iter_qplates(conn, date_from=None, date_to=None, instrument=None, chunksize=10000):
+    """Q-plate rows of the runs query_runs() would return, with each run's identifiers, in chunks"""
+    where, params = _run_filters(date_from, date_to, instrument, table='r.')
+    sql = (f"SELECT r.run_id, r.lhi_id, r.instrument, r.lhi_completion_datetime, q.* "
+           f"FROM qplates q JOIN runs r USING (row_id) {where} ORDER BY q.row_id, q.plate")
+    yield from _iter_chunks(conn, sql, params, chunksize, _parse_qplates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the DNA monitoring SQLite schema")
+    parser.add_argument('--db', default=DB_PATH, help="Database file to create")
+    args = parser.parse_args()
+
+    conn = init_db(args.db)
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    conn.close()
+    print(f"✅ Database ready at {args.db}")
+    print(f"   Tables: {', '.join(tables)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,430 @@
+"""
+Streaming reader for single sheets of the Tool-000011 workbook.
+
+pd.read_excel() hands the whole .xlsm to openpyxl, which walks styles, charts and
+every worksheet part before returning one sheet. The Tool file carries a ~6 MB
+Specification sheet and several raw-data sheets we never show, so this module opens
+the zip directly, resolves the requested sheet through workbook.xml and its rels,
+and stream-parses only that part plus sharedStrings/styles. Rows are cleared as soon
+as they are read, so memory follows the size of the sheet, not the workbook.
+
+Every reader takes a path, a binary file-like object or an OpenWorkbook. Code that
+reads several sheets of one file opens it once as an OpenWorkbook, so the zip
+directory, sharedStrings and styles are read once rather than once per sheet.
+"""
+
+import posixpath
+import re
+import zipfile
+from contextlib import contextmanager
+from functools import cached_property
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+import pandas as pd
+
+RUN_LOG_SHEET = 'Run_Log_Archive'
+
+# Excel column headers -> dashboard column names
+COLUMN_MAPPING = {
+    'LHI Completion DateTime': 'lhi_completion_datetime',
+    'LHI ID': 'lhi_id',
+    'SpectraMax Instrument': 'instrument',
+    'Std Read DateTime': 'std_read_datetime',
+    'Std Δ Time (min)': 'std_delta_time_min',
+    'Std-01 RFU (avg)': 'std_01_rfu',
+    'Std-07 RFU (avg)': 'std_07_rfu',
+    'Blank RFU (avg)': 'blank_rfu',
+    'Std S/N (Std7/Blank)': 'sn_std7_blank',
+}
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Built-in number formats that Excel renders as dates/times
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | {27, 30, 36, 45, 46, 47, 50, 57}
+
+# Pieces of a format code that never mean "date": quoted text, [$-409]/[Red] blocks,
+# and escaped characters (\x, _x, *x)
+_FORMAT_NOISE = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.|_.|\*.')
+_DATE_TOKENS = re.compile(r'[dmyhs]', re.IGNORECASE)
+
+# pd.read_excel's default na_values, plus the Excel error literals
+_NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+    '#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!',
+}
+
+
+def _column_index(cell_ref):
+    """Convert an A1-style reference ('BI13') to a 0-based column index"""
+    index = 0
+    for ch in cell_ref:
+        if ch.isdigit():
+            break
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index - 1
+
+
+def _sheet_part(archive, sheet_name):
+    """Resolve a sheet name to its worksheet part inside the zip"""
+    rel_id = None
+    for _, elem in iterparse(archive.open('xl/workbook.xml')):
+        if elem.tag == f'{_MAIN_NS}sheet' and elem.get('name') == sheet_name:
+            rel_id = elem.get(f'{_REL_NS}id')
+            break
+    if rel_id is None:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+    for _, elem in iterparse(archive.open('xl/_rels/workbook.xml.rels')):
+        if elem.tag == f'{_PKG_REL_NS}Relationship' and elem.get('Id') == rel_id:
+            target = elem.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError(f"Relationship '{rel_id}' for sheet '{sheet_name}' not found")
+
+
+def _shared_strings(archive):
+    """Load the shared string table (rich-text runs are concatenated)"""
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    parts = []
+    in_phonetic = False
+    for event, elem in iterparse(archive.open('xl/sharedStrings.xml'), events=('start', 'end')):
+        tag = elem.tag
+        if tag == f'{_MAIN_NS}rPh':
+            in_phonetic = event == 'start'
+        elif event == 'end' and tag == f'{_MAIN_NS}t' and not in_phonetic:
+            parts.append(elem.text or '')
+        elif event == 'end' and tag == f'{_MAIN_NS}si':
+            strings.append(''.join(parts))
+            parts = []
+            elem.clear()
+    return strings
+
+
+def _date_styles(archive):
+    """Return the set of cellXfs indexes whose number format is a date/time"""
+    if 'xl/styles.xml' not in archive.namelist():
+        return set()
+    custom_date_ids = set()
+    date_styles = set()
+    xf_index = 0
+    in_cell_xfs = False
+    for event, elem in iterparse(archive.open('xl/styles.xml'), events=('start', 'end')):
+        tag = elem.tag
+        if tag == f'{_MAIN_NS}numFmt' and event == 'end':
+            code = _FORMAT_NOISE.sub('', elem.get('formatCode', ''))
+            if _DATE_TOKENS.search(code):
+                custom_date_ids.add(int(elem.get('numFmtId')))
+        elif tag == f'{_MAIN_NS}cellXfs':
+            in_cell_xfs = event == 'start'
+            if not in_cell_xfs:
+                break
+        elif tag == f'{_MAIN_NS}xf' and in_cell_xfs and event == 'start':
+            fmt_id = int(elem.get('numFmtId', 0))
+            if fmt_id in _BUILTIN_DATE_FORMATS or fmt_id in custom_date_ids:
+                date_styles.add(xf_index)
+            xf_index += 1
+    return date_styles
+
+
+def _parse_number(text):
+    """Excel stores numbers as text; keep integers as int like openpyxl does"""
+    if '.' in text or 'E' in text or 'e' in text:
+        return float(text)
+    return int(text)
+
+
+class OpenWorkbook:
+    """One open workbook; its shared strings and date styles are parsed on first use"""
+
+    def __init__(self, source):
+        self.archive = zipfile.ZipFile(source)
+
+    @cached_property
+    def shared_strings(self):
+        return _shared_strings(self.archive)
+
+    @cached_property
+    def date_styles(self):
+        return _date_styles(self.archive)
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def _opened(source):
+    """The OpenWorkbook for source, opened (and closed afterwards) unless it already is one"""
+    if isinstance(source, OpenWorkbook):
+        yield source
+        return
+    with OpenWorkbook(source) as book:
+        yield book
+
+
+def read_date_styles(source):
+    """Return the cellXfs indexes of a workbook whose number format is a date/time"""
+    with _opened(source) as book:
+        return book.date_styles
+
+
+def iter_raw_rows(source, sheet_name, max_row=None):
+    """
+    Stream rows of one worksheet without converting cell values.
+
+    Yields (row_number, cells) where cells is a list of (column index, cell type,
+    style index, text). Shared-string references are already resolved to their text,
+    so a raw row is stable across Excel re-saves and cheap to checksum; use
+    decode_row() to turn it into values.
+    """
+    with _opened(source) as book:
+        archive = book.archive
+        part = _sheet_part(archive, sheet_name)
+        shared = book.shared_strings
+
+        row_tag = f'{_MAIN_NS}row'
+        cell_tag = f'{_MAIN_NS}c'
+        value_tag = f'{_MAIN_NS}v'
+        text_tag = f'{_MAIN_NS}t'
+        sheet_data_tag = f'{_MAIN_NS}sheetData'
+        sheet_data = None
+        expected_row = 1
+
+        for event, elem in iterparse(archive.open(part), events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == sheet_data_tag:
+                    sheet_data = elem
+                continue
+            if elem.tag != row_tag:
+                continue
+
+            row_number = int(elem.get('r', expected_row))
+            if max_row is not None and row_number > max_row:
+                break
+
+            cells = []
+            for position, cell in enumerate(elem.iter(cell_tag)):
+                # Styled-but-empty cells (no <v>/<is> child) can run out to column XFD
+                if not len(cell):
+                    continue
+                cell_type = cell.get('t', 'n')
+                if cell_type == 'inlineStr':
+                    text = ''.join(t.text or '' for t in cell.iter(text_tag))
+                else:
+                    v = cell.find(value_tag)
+                    text = v.text if v is not None else None
+                    if text is not None and cell_type == 's':
+                        text = shared[int(text)]
+                if text is None:
+                    continue
+                ref = cell.get('r')
+                col = _column_index(ref) if ref else position
+                cells.append((col, cell_type, int(cell.get('s', 0)), text))
+
+            # Drop the parsed row from the tree so only one row is ever held
+            elem.clear()
+            if sheet_data is not None:
+                sheet_data.clear()
+            yield row_number, cells
+            expected_row = row_number + 1
+
+
+def decode_row(cells, date_styles):
+    """
+    Convert raw cells from iter_raw_rows() into a positional list of values.
+
+    Date-formatted numeric cells become pd.Timestamp; blank and error cells None.
+    """
+    values = []
+    for col, cell_type, style, text in cells:
+        if cell_type in ('s', 'str', 'e', 'inlineStr'):
+            value = text
+        elif cell_type == 'b':
+            value = text == '1'
+        elif cell_type == 'd':
+            value = pd.Timestamp(text)
+        else:
+            value = _parse_number(text)
+            if style in date_styles:
+                value = pd.Timestamp('1899-12-30') + pd.to_timedelta(round(value * 86400000), unit='ms')
+
+        if isinstance(value, str) and value in _NA_STRINGS:
+            continue
+        if col >= len(values):
+            values.extend([None] * (col - len(values) + 1))
+        values[col] = value
+    return values
+
+
+def iter_sheet_rows(source, sheet_name, max_row=None):
+    """
+    Stream rows of one worksheet as lists of cell values.
+
+    source may be a path or a binary file-like object (e.g. BytesIO). Date-formatted
+    numeric cells are returned as pd.Timestamp; blank and error cells as None.
+    Missing rows are yielded as empty lists so row positions stay aligned.
+    """
+    date_styles = read_date_styles(source)
+    expected_row = 1
+    for row_number, cells in iter_raw_rows(source, sheet_name, max_row=max_row):
+        while expected_row < row_number:
+            yield []
+            expected_row += 1
+        yield decode_row(cells, date_styles)
+        expected_row = row_number + 1
+
+
+def frame_from_rows(columns, records):
+    """
+    Build a DataFrame from decoded rows the way pd.read_excel types it.
+
+    Rows are padded to the header width, trailing blank rows dropped, and object
+    columns get NaN for missing cells (all-empty columns become float NaN).
+    """
+    columns = list(columns)
+    width = max([len(columns)] + [len(r) for r in records])
+    columns += [f'Unnamed: {i}' for i in range(len(columns), width)]
+    records = [r[:width] + [None] * (width - len(r)) for r in records]
+    # Trailing rows with nothing in them are formatting leftovers, not runs
+    while records and all(v is None for v in records[-1]):
+        records.pop()
+
+    df = pd.DataFrame(records, columns=columns)
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        if df[col].isna().all():
+            # Empty columns come back as float NaN, same as pd.read_excel
+            df[col] = np.nan
+        else:
+            df[col] = df[col].where(df[col].notna(), np.nan).infer_objects()
+    return df
+
+
+def header_names(values):
+    """Column names for a decoded header row ('Unnamed: n' for blanks)"""
+    return [str(v) if v is not None else f'Unnamed: {i}' for i, v in enumerate(values)]
+
+
+def read_sheet(source, sheet_name, header=0, max_row=None):
+    """Read one worksheet into a DataFrame using the streaming row parser"""
+    columns = None
+    records = []
+    for index, values in enumerate(iter_sheet_rows(source, sheet_name, max_row=max_row)):
+        if index < header:
+            continue
+        if columns is None:
+            columns = header_names(values)
+            continue
+        records.append(values)
+
+    if columns is None:
+        return pd.DataFrame()
+    return frame_from_rows(columns, records)
+
+
+def normalize_runs(runs_df):
+    """Apply the dashboard column names and datetime coercion to a Run_Log_Archive frame"""
+    renames = {old: new for old, new in COLUMN_MAPPING.items() if old in runs_df.columns}
+    runs_df = runs_df.rename(columns=renames)
+
+    if 'lhi_completion_datetime' in runs_df.columns:
+        runs_df['lhi_completion_datetime'] = pd.to_datetime(runs_df['lhi_completion_datetime'])
+
+    return runs_df
+
+
+def load_run_log_archive(source):
+    """Load Run_Log_Archive with dashboard column names, parsing only that sheet"""
+    return normalize_runs(read_sheet(source, RUN_LOG_SHEET))
+
+
+SPECIFICATION_SHEET = 'Specification'
+
+# The Specification print area is A1:E102; everything below is formatting only
+_SPECIFICATION_MAX_ROW = 102
+
+# Header text fragments -> long-format field, checked in order
+_SPEC_HEADER_FIELDS = [
+    ('STDEV', 'stdev'),
+    ('Min', 'min_value'),
+    ('Max', 'max_value'),
+    ('CV%', 'max_value'),
+    ('Nominal', 'value'),
+    ('Value', 'value'),
+    ('Criteria', 'criteria'),
+    ('Metric', 'metric'),
+]
+
+
+def _spec_field(header):
+    for fragment, field in _SPEC_HEADER_FIELDS:
+        if fragment in header:
+            return field
+    return None
+
+
+def load_specifications(source):
+    """
+    Flatten the Specification sheet's limit tables into one long-format frame.
+
+    Columns: section, table, parameter, value, min_value, max_value, stdev, criteria.
+    Each table is recognised by its header row (Min/Max/Nominal/Criteria...), whose
+    first cell becomes `table`; `section` is the nearest title row above it. Rows without any numeric limit
+    (instrument lists, lot numbers, sign-off block) are skipped.
+    """
+    records = []
+    section = None
+    table = None
+    fields = None
+    rows = iter_sheet_rows(source, SPECIFICATION_SHEET, max_row=_SPECIFICATION_MAX_ROW)
+    for values in rows:
+        cells = {i: v for i, v in enumerate(values) if v is not None}
+        if not cells:
+            fields = None
+            continue
+
+        texts = {i: v for i, v in cells.items() if isinstance(v, str)}
+        mapped = {i: _spec_field(v) for i, v in texts.items() if i > 0}
+        if len(texts) == len(cells) and any(mapped.values()):
+            fields = {i: f for i, f in mapped.items() if f}
+            table = texts[0].strip() if 0 in texts else None
+            continue
+        if fields is None:
+            if list(cells) == [0] and isinstance(cells[0], str):
+                section = cells[0].strip()
+            continue
+
+        record = {'section': section, 'table': table, 'parameter': cells.get(0)}
+        for i, field in fields.items():
+            if i in cells:
+                record[field] = cells[i]
+        metric = record.pop('metric', None)
+        if metric is not None:
+            record['parameter'] = ' - '.join(str(p) for p in (record['parameter'], metric) if p is not None)
+        if record['parameter'] is None:
+            continue
+        numeric = [k for k in ('value', 'min_value', 'max_value', 'stdev')
+                   if isinstance(record.get(k), (int, float))]
+        if not numeric:
+            continue
+        for k in ('value', 'min_value', 'max_value', 'stdev'):
+            if not isinstance(record.get(k), (int, float)):
+                record[k] = None
+        record['parameter'] = str(record['parameter']).strip()
+        records.append(record)
+
+    return pd.DataFrame(records, columns=['section', 'table', 'parameter', 'value', 'min_value', 'max_value',
+                                          'stdev', 'criteria'])
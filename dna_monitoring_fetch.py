@@ -0,0 +1,230 @@
+"""
+HTTP fetch layer for the cloud dashboard: pooled, conditional and cached on disk.
+
+A downloaded file is kept as a blob next to a small metadata file holding its ETag,
+Last-Modified and when it was last confirmed current. Any process on the machine
+(every Streamlit worker, a fresh container start) reuses the blob:
+
+- fresh (checked within max_age)  -> served from disk, no request at all;
+- stale                           -> served from disk immediately, and a background
+                                     thread revalidates with If-None-Match /
+                                     If-Modified-Since (a 304 costs a few hundred bytes);
+- missing                         -> downloaded synchronously, the only case that waits.
+
+Blobs are named after their content hash and never rewritten, so the path fetch()
+returns always holds the content of the sha256 it returns with it, even if a
+background revalidation has meanwhile picked up a newer version. The previous
+version is kept (one back) for callers still reading it.
+
+Layout:
+
+    .dna_cache/http/<sha1(url)[:16]>-<sha256[:16]>.blob
+    .dna_cache/http/<sha1(url)[:16]>.json   url, etag, last_modified, checked_at, sha256, size
+
+Usage:
+    python3 dna_monitoring_fetch.py URL [--max-age SECONDS]
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dna_monitoring_cache import DEFAULT_CACHE_DIR, read_json, write_json
+
+DEFAULT_BLOB_DIR = os.path.join(DEFAULT_CACHE_DIR, 'http')
+
+# Used when the server sends no Cache-Control max-age (raw.githubusercontent.com sends 300)
+DEFAULT_MAX_AGE = 300
+TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+# URLs with a background revalidation in flight in this process
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide requests session: keep-alive connection pool plus retries on 5xx"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                          allowed_methods=('GET', 'HEAD'))
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+def _meta_path(url, blob_dir):
+    return os.path.join(blob_dir, f'{_url_key(url)}.json')
+
+
+def blob_path_for(url, sha256, blob_dir=DEFAULT_BLOB_DIR):
+    """Path of the blob holding the version of url with this content hash"""
+    return os.path.join(blob_dir, f'{_url_key(url)}-{sha256[:16]}.blob')
+
+
+def _cached(url, blob_dir):
+    """Stored metadata of url, or None unless its blob is on disk too"""
+    meta = read_json(_meta_path(url, blob_dir), None)
+    if meta is None or not os.path.exists(blob_path_for(url, meta['sha256'], blob_dir)):
+        return None
+    return meta
+
+
+def _max_age(response, default):
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else default
+
+
+def _write_blob(blob_path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, blob_path)
+
+
+def _prune_blobs(url, blob_dir, keep):
+    """Remove url's blobs other than the paths in keep"""
+    key = _url_key(url)
+    for name in os.listdir(blob_dir):
+        path = os.path.join(blob_dir, name)
+        if name.startswith(key) and name.endswith('.blob') and path not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def revalidate(url, blob_dir=DEFAULT_BLOB_DIR, timeout=TIMEOUT):
+    """
+    Conditionally re-request url and store any new version; returns the new metadata.
+
+    Sends the stored validators, so an unchanged file comes back as 304 and only the
+    metadata's checked_at moves. A changed file is written to a new blob before the
+    metadata points at it. Raises requests exceptions on network/HTTP errors.
+    """
+    os.makedirs(blob_dir, exist_ok=True)
+    meta_path = _meta_path(url, blob_dir)
+    meta = _cached(url, blob_dir)
+
+    headers = {}
+    if meta and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    response = get_session().get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and meta is not None:
+        meta['checked_at'] = time.time()
+        meta['max_age'] = _max_age(response, meta.get('max_age', DEFAULT_MAX_AGE))
+        meta['last_status'] = 304
+        write_json(meta_path, meta)
+        return meta
+
+    response.raise_for_status()
+    content = response.content
+    sha256 = hashlib.sha256(content).hexdigest()
+    blob_path = blob_path_for(url, sha256, blob_dir)
+    if not os.path.exists(blob_path):
+        _write_blob(blob_path, content)
+    keep = {blob_path} if meta is None else {blob_path, blob_path_for(url, meta['sha256'], blob_dir)}
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'checked_at': time.time(),
+        'max_age': _max_age(response, DEFAULT_MAX_AGE),
+        'sha256': sha256,
+        'size': len(content),
+        'last_status': response.status_code,
+    }
+    write_json(meta_path, meta)
+    _prune_blobs(url, blob_dir, keep)
+    return meta
+
+
+def _revalidate_in_background(url, blob_dir, timeout):
+    with _revalidating_lock:
+        if url in _revalidating:
+            return
+        _revalidating.add(url)
+
+    def run():
+        try:
+            revalidate(url, blob_dir, timeout)
+        except Exception as e:
+            # Keep serving the stale blob; the next stale read tries again
+            logger.warning("Revalidating %s failed: %s", url, e)
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(url)
+
+    threading.Thread(target=run, name='dna-fetch-revalidate', daemon=True).start()
+
+
+def fetch(url, blob_dir=DEFAULT_BLOB_DIR, max_age=None, timeout=TIMEOUT):
+    """
+    Return (blob_path, metadata) for url, using the disk cache where possible.
+
+    blob_path holds exactly the content of metadata['sha256']. metadata['state'] is
+    'fresh', 'stale' (served from disk, revalidating in the background) or 'fetched'
+    (had to download now). max_age overrides the server's Cache-Control. Only the
+    'fetched' case can raise requests exceptions.
+    """
+    meta = _cached(url, blob_dir)
+    if meta is None:
+        meta = revalidate(url, blob_dir, timeout)
+        return blob_path_for(url, meta['sha256'], blob_dir), dict(meta, state='fetched')
+
+    blob_path = blob_path_for(url, meta['sha256'], blob_dir)
+    age = time.time() - meta['checked_at']
+    if age <= (meta.get('max_age', DEFAULT_MAX_AGE) if max_age is None else max_age):
+        return blob_path, dict(meta, state='fresh')
+
+    _revalidate_in_background(url, blob_dir, timeout)
+    return blob_path, dict(meta, state='stale')
+
+
+def read_blob(blob_path):
+    """Blob contents (blobs are written once, under their content hash)"""
+    with open(blob_path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch a URL through the DNA dashboard blob cache")
+    parser.add_argument('url')
+    parser.add_argument('--max-age', type=int, default=None, help="Seconds a cached copy counts as fresh")
+    parser.add_argument('--blob-dir', default=DEFAULT_BLOB_DIR, help="Cache directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    blob_path, meta = fetch(args.url, args.blob_dir, max_age=args.max_age)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {meta['state']}: {meta['size']:,} bytes, sha256 {meta['sha256'][:12]} ({elapsed * 1000:.0f} ms)")
+    print(f"   {blob_path}")
+
+
+if __name__ == '__main__':
+    main()
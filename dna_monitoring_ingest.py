@@ -0,0 +1,243 @@
+"""
+Incremental, append-only ingestion of the Run_Log_Archive sheet.
+
+"Archive Current Run" only ever appends rows to Run_Log_Archive, so re-typing the
+whole history on every change is wasted work. The ingest store remembers how far it
+got (last Excel row) and a SHA-256 over the raw cells of every row up to and
+including it. On the next call the prefix is re-hashed from raw XML text (no type
+conversion, no DataFrame building), and only the trailing rows are decoded,
+normalized and appended as a new chunk. If the prefix hash no longer matches - a
+historical row was edited, deleted or reordered - the store is rebuilt from scratch.
+
+Store layout (one directory per source):
+
+    <store_dir>/state.json      last_row, prefix_sha256, rows, chunks, ...
+    <store_dir>/chunk-000000/   snapshot written by dna_monitoring_cache.write_snapshot
+    <store_dir>/chunk-000001/   ...
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from dna_monitoring_cache import DEFAULT_CACHE_DIR, read_json, write_json, read_snapshot, write_snapshot
+from dna_monitoring_excel import (
+    RUN_LOG_SHEET, decode_row, frame_from_rows, header_names, iter_raw_rows, normalize_runs,
+    read_date_styles,
+)
+
+DEFAULT_STORE_ROOT = os.path.join(DEFAULT_CACHE_DIR, 'ingest')
+
+# Chunks are merged back into one once a store accumulates this many appends
+MAX_CHUNKS = 32
+
+_STATE_FILE = 'state.json'
+_STATE_VERSION = 1
+
+# Streamlit sessions share one process; only one of them should ingest at a time
+_ingest_lock = threading.Lock()
+
+
+def store_dir_for(path, root=DEFAULT_STORE_ROOT):
+    """Default store directory for a workbook path"""
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(root, key)
+
+
+def _hash_row(hasher, row_number, cells):
+    hasher.update(repr((row_number, cells)).encode('utf-8'))
+
+
+def _scan(source, sheet_name, last_row):
+    """
+    Hash rows up to last_row and collect everything after it.
+
+    Returns (prefix_sha256, new_rows) where new_rows is a list of
+    (row_number, cells, hasher-including-this-row).
+    """
+    hasher = hashlib.sha256()
+    prefix_sha256 = None
+    new_rows = []
+    for row_number, cells in iter_raw_rows(source, sheet_name):
+        if row_number <= last_row:
+            _hash_row(hasher, row_number, cells)
+            continue
+        if prefix_sha256 is None:
+            prefix_sha256 = hasher.hexdigest()
+        _hash_row(hasher, row_number, cells)
+        new_rows.append((row_number, cells, hasher.copy()))
+    if prefix_sha256 is None:
+        prefix_sha256 = hasher.hexdigest()
+    return prefix_sha256, new_rows
+
+
+def _decode_new_rows(new_rows, first_row, date_styles):
+    """
+    Decode appended rows, filling gaps with blanks and stopping at the last non-blank row.
+
+    Returns (records, last_row, hasher) for the rows that will be committed.
+    """
+    records = []
+    last_row, hasher = first_row - 1, None
+    committed = 0
+    expected = first_row
+    for row_number, cells, row_hasher in new_rows:
+        while expected < row_number:
+            records.append([])
+            expected += 1
+        values = decode_row(cells, date_styles)
+        records.append(values)
+        expected = row_number + 1
+        if any(v is not None for v in values):
+            committed = len(records)
+            last_row, hasher = row_number, row_hasher
+    # Trailing blank rows stay un-ingested; Excel may still be filling them in
+    return records[:committed], last_row, hasher
+
+
+def _chunk_dirs(store_dir, state):
+    return [os.path.join(store_dir, name) for name in state['chunks']]
+
+
+def load_store(store_dir):
+    """Return the ingested frame for a store, or None if it has never been built"""
+    state = read_json(os.path.join(store_dir, _STATE_FILE), None)
+    if state is None or state.get('version') != _STATE_VERSION:
+        return None
+    frames = [read_snapshot(path) for path in _chunk_dirs(store_dir, state)]
+    if any(frame is None for frame in frames):
+        return None
+    if not frames:
+        return normalize_runs(pd.DataFrame(columns=state['columns']))
+    if len(frames) == 1:
+        return frames[0]
+    return _concat_chunks(frames)
+
+
+def _concat_chunks(frames):
+    """
+    Concatenate chunks, restoring dtypes lost to all-blank columns.
+
+    A chunk where e.g. 'Q5 Read DateTime' is entirely empty types it as float NaN;
+    concatenating that with a datetime chunk yields object. Re-type such columns to
+    the one dtype seen in chunks that actually hold values, matching a full parse.
+    """
+    df = pd.concat(frames, ignore_index=True)
+    for col in df.columns[df.dtypes == object]:
+        dtypes = {frame[col].dtype for frame in frames if col in frame and frame[col].notna().any()}
+        if len(dtypes) != 1:
+            continue
+        dtype = dtypes.pop()
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            df[col] = pd.to_datetime(df[col]).astype(dtype)
+        elif dtype != object:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _new_chunk(store_dir, state, df):
+    name = f"chunk-{state['next_chunk']:06d}"
+    write_snapshot(df, os.path.join(store_dir, name))
+    state['next_chunk'] += 1
+    state['chunks'].append(name)
+
+
+def _rebuild(source, store_dir, sheet_name):
+    """Ingest the full sheet into a fresh store"""
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.makedirs(store_dir)
+
+    date_styles = read_date_styles(source)
+    _, rows = _scan(source, sheet_name, last_row=0)
+    state = {
+        'version': _STATE_VERSION,
+        'sheet': sheet_name,
+        # Changes on every rebuild so downstream stores know to reload, not append
+        'generation': uuid.uuid4().hex,
+        'columns': [],
+        'rows': 0,
+        'last_row': 0,
+        'prefix_sha256': hashlib.sha256().hexdigest(),
+        'chunks': [],
+        'next_chunk': 0,
+        'last_new_rows': 0,
+    }
+    if rows:
+        header_row, header_cells, header_hasher = rows[0]
+        state['columns'] = header_names(decode_row(header_cells, date_styles))
+        state['last_row'] = header_row
+        state['prefix_sha256'] = header_hasher.hexdigest()
+        _append(source, store_dir, state, rows[1:], date_styles)
+    state['last_mode'] = 'rebuild'
+    state['ingested_at'] = time.time()
+    write_json(os.path.join(store_dir, _STATE_FILE), state)
+
+
+def _append(source, store_dir, state, new_rows, date_styles):
+    """Decode and persist rows after state['last_row']; updates state in place"""
+    records, last_row, hasher = _decode_new_rows(new_rows, state['last_row'] + 1, date_styles)
+    state['last_new_rows'] = len(records)
+    if not records:
+        return
+
+    chunk = normalize_runs(frame_from_rows(state['columns'], records))
+    _new_chunk(store_dir, state, chunk)
+    state['rows'] += len(chunk)
+    state['last_row'] = last_row
+    state['prefix_sha256'] = hasher.hexdigest()
+
+
+def _compact(store_dir, state):
+    """Merge all chunks into one so loads don't concat dozens of small frames"""
+    df = load_store(store_dir).copy()
+    old = _chunk_dirs(store_dir, state)
+    state['chunks'] = []
+    _new_chunk(store_dir, state, df)
+    write_json(os.path.join(store_dir, _STATE_FILE), state)
+    for path in old:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def ingest_run_log(source, store_dir=None, sheet_name=RUN_LOG_SHEET):
+    """
+    Bring the ingest store up to date with `source` and return the full normalized frame.
+
+    source may be a path or a binary file-like object; file-like sources need an
+    explicit store_dir. Cost is one raw scan of the sheet plus decoding of new rows
+    only; a full rebuild happens on first use or when history was edited.
+    """
+    if store_dir is None:
+        store_dir = store_dir_for(source)
+    state_path = os.path.join(store_dir, _STATE_FILE)
+
+    with _ingest_lock:
+        state = read_json(state_path, None)
+        usable = (state is not None and state.get('version') == _STATE_VERSION
+                  and state.get('sheet') == sheet_name
+                  and all(os.path.isdir(path) for path in _chunk_dirs(store_dir, state)))
+
+        if usable:
+            prefix_sha256, new_rows = _scan(source, sheet_name, state['last_row'])
+            if prefix_sha256 == state['prefix_sha256']:
+                _append(source, store_dir, state, new_rows, read_date_styles(source))
+                state['last_mode'] = 'append' if state['last_new_rows'] else 'unchanged'
+                state['ingested_at'] = time.time()
+                write_json(state_path, state)
+                if len(state['chunks']) > MAX_CHUNKS:
+                    _compact(store_dir, state)
+            else:
+                _rebuild(source, store_dir, sheet_name)
+        else:
+            _rebuild(source, store_dir, sheet_name)
+
+        return load_store(store_dir)
+
+
+def ingest_status(store_dir):
+    """Return the store's state dict (rows, last_row, generation, last_mode, ...) or None"""
+    return read_json(os.path.join(store_dir, _STATE_FILE), None)
@@ -0,0 +1,130 @@
+"""
+Stage timing and memory instrumentation for the dashboard pipeline.
+
+A PerfRecorder covers one dashboard script run (or one benchmark pass). Code wraps
+each stage in `with perf.stage('name'):`. Stages nest, and a stage entered more than
+once in a run adds up, so every st.plotly_chart call in tab2 lands in one
+'tab2/plotly' record next to the 'tab2' total.
+
+For each stage it records wall time, self time (wall time minus nested stages), the
+change in resident memory and the process's peak RSS. finish() writes one JSON log
+line per stage to the 'dna_monitoring_perf' logger; set DNA_MONITORING_PERF_LOG to
+a file path to also append them there. The admin panel shows the same records.
+
+Resident memory comes from /proc on Linux and ru_maxrss for the peak. On Windows
+it needs psutil if installed; without psutil the memory columns are left empty.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PERF_LOG_ENV = 'DNA_MONITORING_PERF_LOG'
+
+logger = logging.getLogger('dna_monitoring_perf')
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _configure_logger():
+    path = os.environ.get(PERF_LOG_ENV)
+    if path and not any(getattr(h, 'baseFilename', None) == os.path.abspath(path) for h in logger.handlers):
+        handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+def _rounded(record):
+    return {key: round(value, 2) if isinstance(value, float) else value for key, value in record.items()}
+
+
+def rss_mb():
+    """Current resident set size in MB, or None where it can't be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1e6
+    except (OSError, ValueError, IndexError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MB, or None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # KiB on Linux, bytes on macOS
+        return peak / 1e6 if sys.platform == 'darwin' else peak * 1024 / 1e6
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1e6
+    return None
+
+
+class PerfRecorder:
+    """Nested, accumulating stage timings for one script run"""
+
+    def __init__(self, script):
+        self.script = script
+        self.run_id = uuid.uuid4().hex[:8]
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        path = '/'.join(self._stack + [name])
+        # Created on entry so records() lists parents before their children
+        record = self.stages.setdefault(path, {'stage': path, 'calls': 0, 'ms': 0.0, 'rss_delta_mb': None})
+        self._stack.append(name)
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            rss_after = rss_mb()
+            self._stack.pop()
+            record['calls'] += 1
+            record['ms'] += elapsed * 1000
+            if rss_before is not None and rss_after is not None:
+                record['rss_delta_mb'] = (record['rss_delta_mb'] or 0.0) + rss_after - rss_before
+
+    def records(self):
+        """Stage records in first-entered order, each with self_ms (wall minus child stages)"""
+        rows = []
+        for path, record in self.stages.items():
+            children = sum(other['ms'] for other_path, other in self.stages.items()
+                           if other_path.startswith(path + '/') and other_path.count('/') == path.count('/') + 1)
+            rows.append(dict(record, self_ms=record['ms'] - children))
+        return rows
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def finish(self):
+        """Log every stage as one JSON line; returns the records"""
+        _configure_logger()
+        rows = self.records()
+        peak = peak_rss_mb()
+        for row in rows:
+            logger.info(json.dumps(_rounded(dict(row, script=self.script, run=self.run_id, peak_rss_mb=peak))))
+        logger.info(json.dumps(_rounded({'stage': 'total', 'script': self.script, 'run': self.run_id,
+                                         'ms': self.total_ms(), 'rss_mb': rss_mb(), 'peak_rss_mb': peak})))
+        return rows
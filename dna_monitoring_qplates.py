@@ -0,0 +1,294 @@
+"""
+Per-well Q-Plate data from the Tool file's SpectraMax export.
+
+"SpectraMax Raw Data" is the SoftMax Pro text export pasted into the workbook: a
+"Plate:" block per read (a row of well IDs, then a row of RFU values), each followed
+by "Group:" tables naming the sample in every well. The standards plate carries the
+Standards and STD-Blanks groups; each Q-plate one "Qn-Samples" group with its QBlank
+(H12), QHigh (F12), QLow (G12) and Sample-01..93 wells.
+
+The sheet is streamed row by row and only the plate and group rows are kept, so the
+result is one long table with a row per assigned well:
+
+    plate     category   plate barcode read by SpectraMax ('Qpat112025KH')
+    q_plate   category   'Std' for the standards plate, 'Q1'..'Q5' for Q-plates
+    well      category   'A1'..'H12'
+    role      category   ROLES
+    sample    category   name in the group table ('Standard-01', 'Sample-17', ...)
+    nominal   float32    known concentration of standards (ng/uL), NaN otherwise
+    rfu       float32    raw fluorescence
+    conc      float32    back-calculated concentration (ng/uL)
+    in_range  bool       conc within the standard curve (Standard 7 .. Standard 1)
+
+Concentrations are back-calculated the way the Tool's "Sample Q-Plates" sheet does:
+conc = exp((ln(RFU - blank) - intercept) / slope) with the Std Curve sheet's fitted
+log-log line and weighted blank. If those cells are missing the line is refitted from
+the standards on the plate.
+"""
+
+import numpy as np
+import pandas as pd
+
+from dna_monitoring_excel import OpenWorkbook, iter_sheet_rows
+
+RAW_DATA_SHEET = 'SpectraMax Raw Data'
+STD_CURVE_SHEET = 'Std Curve'
+QPLATE_SHEET = 'Sample Q-Plates'
+
+ROLES = ('Standard', 'Blank', 'QBlank', 'QHigh', 'QLow', 'Sample')
+ROLE_DTYPE = pd.CategoricalDtype(ROLES)
+WELLS = tuple(f'{row}{col}' for col in range(1, 13) for row in 'ABCDEFGH')
+WELL_DTYPE = pd.CategoricalDtype(WELLS)
+
+WELL_COLUMNS = ['plate', 'q_plate', 'well', 'role', 'sample', 'nominal', 'rfu', 'conc', 'in_range']
+PLATE_COLUMNS = ['plate', 'q_plate', 'read_time', 'temperature', 'wells']
+
+STANDARD_PLATE = 'Std'
+
+# Std Curve sheet, "Check #4" block: label -> curve key
+_CURVE_LABELS = {'Slope': 'slope', 'Intercept': 'intercept', 'R2': 'r2'}
+# Every Sample Q-Plates column block is this wide (label, value, check, spacer)
+_QPLATE_BLOCK = 4
+
+
+def _number(value):
+    """Float for numeric cells; SoftMax leaves ' ' or text in unread wells"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def _role(sample):
+    if sample.startswith('Standard'):
+        return 'Standard'
+    if sample in ROLES:
+        return sample
+    return 'Sample'
+
+
+def _group_plate(group):
+    """'Q3-Samples' -> 'Q3'; the standards groups belong to the standards plate"""
+    if group.startswith('Q') and '-' in group:
+        return group.split('-', 1)[0]
+    return STANDARD_PLATE
+
+
+def parse_raw_data(source):
+    """
+    Stream the SpectraMax Raw Data sheet into (wells, plates).
+
+    wells has WELL_COLUMNS without conc/in_range (see load_qplates()); plates has one
+    row per plate block with its read time and temperature. A group without a plate
+    block (a Q-plate that was never read) is dropped.
+    """
+    reads = {}       # q_plate -> (barcode, {well: rfu}, temperature)
+    read_times = {}  # q_plate -> timestamp
+    assigned = []    # (q_plate, well, sample, nominal)
+    pending = None   # barcode of the plate block being read
+    header = None
+    group = None
+    columns = None
+    sample = None
+    nominal = np.nan
+
+    for values in iter_sheet_rows(source, RAW_DATA_SHEET):
+        first = values[0] if values else None
+        if isinstance(first, str):
+            first = first.strip()
+
+        if first == 'Plate:':
+            pending, header = values[1], None
+            continue
+        if pending is not None:
+            if header is None:
+                # Well IDs follow the 'Temperature(¡C)' cell
+                if 'A1' in values:
+                    header = values
+            elif len(values) > 2:
+                wells = {w: _number(v) for w, v in zip(header[2:], values[2:]) if w in WELL_DTYPE.categories}
+                temperature = _number(values[1])
+                # The plate block always precedes its groups; tag it once they name the plate
+                reads[None] = (pending, wells, temperature)
+                pending = None
+            continue
+
+        if isinstance(first, str) and first.startswith('Group:'):
+            group = _group_plate(first[len('Group:'):].strip())
+            if None in reads:
+                reads[group] = reads.pop(None)
+            columns, sample, nominal = None, None, np.nan
+            continue
+        if first in ('Group Column', 'Group Summaries', '~End'):
+            columns = None
+            continue
+        if group is None:
+            continue
+        if isinstance(first, str) and first.endswith('Read Time =') and len(values) > 2:
+            read_times[group] = values[2]
+            continue
+        if columns is None:
+            if first == 'Sample':
+                columns = {name: i for i, name in enumerate(values) if isinstance(name, str)}
+            continue
+
+        well_col = columns.get('Well', columns.get('Wells'))
+        well = values[well_col] if well_col is not None and len(values) > well_col else None
+        if well not in WELL_DTYPE.categories:
+            continue
+        if isinstance(first, str) and first:
+            # Replicate rows leave Sample and ng/ul blank (' ') under the first well
+            sample = first
+            nominal = _number(values[columns['ng/ul']]) if 'ng/ul' in columns else np.nan
+        if sample is not None:
+            assigned.append((group, well, sample, nominal))
+
+    plates = pd.DataFrame(
+        [(barcode, q_plate, read_times.get(q_plate), temperature, len(wells))
+         for q_plate, (barcode, wells, temperature) in reads.items() if q_plate is not None],
+        columns=PLATE_COLUMNS)
+
+    assigned = [row for row in assigned if row[0] in reads]
+    q_plates = [row[0] for row in assigned]
+    well_ids = [row[1] for row in assigned]
+    samples = [row[2] for row in assigned]
+    wells = pd.DataFrame({
+        # Two Q-plates can be read under the same barcode; categories must be unique
+        'plate': pd.Categorical([reads[q][0] for q in q_plates], categories=plates['plate'].unique()),
+        'q_plate': pd.Categorical(q_plates, categories=plates['q_plate'].unique()),
+        'well': pd.Categorical(well_ids, dtype=WELL_DTYPE),
+        'role': pd.Categorical([_role(s) for s in samples], dtype=ROLE_DTYPE),
+        'sample': pd.Categorical(samples),
+        'nominal': np.array([row[3] for row in assigned], dtype=np.float32),
+        'rfu': np.array([reads[q][1].get(w, np.nan) for q, w in zip(q_plates, well_ids)], dtype=np.float32),
+    })
+    return wells, plates
+
+
+def read_standard_curve(source):
+    """
+    The Tool's fitted standard curve: dict with slope, intercept, r2 and blank.
+
+    slope/intercept describe ln(RFU - blank) = intercept + slope * ln(conc), as in the
+    Std Curve sheet's "Check #4"; blank is the weighted-mean blank RFU. Returns None
+    if any of them is missing (the sheet not yet filled for this run).
+    """
+    curve = {}
+    for values in iter_sheet_rows(source, STD_CURVE_SHEET):
+        if len(values) < 2 or not isinstance(values[0], str):
+            continue
+        label = values[0].strip()
+        if label in _CURVE_LABELS:
+            curve[_CURVE_LABELS[label]] = _number(values[1])
+        elif label == 'Blank' and len(values) > 8:
+            # Only the "Calculation Weighted Mean RFU" table has a ninth column
+            curve['blank'] = _number(values[8])
+    if not all(np.isfinite(curve.get(key, np.nan)) for key in ('slope', 'intercept', 'blank')):
+        return None
+    return curve
+
+
+def fit_standard_curve(wells):
+    """Least-squares log-log curve from the standards plate (mean RFU per standard minus mean blank)"""
+    standards = wells[wells['q_plate'] == STANDARD_PLATE]
+    blank = float(standards.loc[standards['role'] == 'Blank', 'rfu'].mean())
+    means = standards[standards['role'] == 'Standard'].groupby('nominal')['rfu'].mean()
+    x = np.log(means.index.to_numpy(dtype=float))
+    y = np.log(means.to_numpy(dtype=float) - blank)
+    ok = np.isfinite(x) & np.isfinite(y)
+    if ok.sum() < 2:
+        return None
+    slope, intercept = np.polyfit(x[ok], y[ok], 1)
+    r2 = np.corrcoef(x[ok], y[ok])[0, 1] ** 2
+    return {'slope': slope, 'intercept': intercept, 'r2': r2, 'blank': blank}
+
+
+def back_calculate(rfu, curve):
+    """Concentration (ng/uL) for each RFU; NaN at or below the blank"""
+    signal = np.asarray(rfu, dtype=np.float64) - curve['blank']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conc = np.exp((np.log(np.where(signal > 0, signal, np.nan)) - curve['intercept']) / curve['slope'])
+    return conc.astype(np.float32)
+
+
+def read_qplate_summary(source):
+    """
+    The QC verdicts of the Sample Q-Plates sheet, one row per Q-plate column block.
+
+    Columns: q_plate ('Q1'..), validity, sn_ratio (QLow/QBlank over Std7/Blank) and
+    plate_qc. Only the summary rows above the per-well listing are read.
+    """
+    fields = {
+        'Validity (Data & Readout time)': 'validity',
+        'Ratio Signal-to-Noise': 'sn_ratio',
+        'Overall Plate QC': 'plate_qc',
+    }
+    summary = {}
+    for values in iter_sheet_rows(source, QPLATE_SHEET):
+        if values and values[0] == 'Position':
+            break
+        for start in range(0, len(values), _QPLATE_BLOCK):
+            label = values[start]
+            if not isinstance(label, str) or len(values) <= start + 1:
+                continue
+            field = next((f for prefix, f in fields.items() if label.startswith(prefix)), None)
+            if field is not None:
+                summary.setdefault(f'Q{start // _QPLATE_BLOCK + 1}', {})[field] = values[start + 1]
+    return pd.DataFrame([dict(q_plate=q, **row) for q, row in summary.items()],
+                        columns=['q_plate', 'validity', 'sn_ratio', 'plate_qc'])
+
+
+def load_qplates(source):
+    """
+    Wells of every read plate with back-calculated concentrations.
+
+    Returns (wells, plates, curve). plates also carries the Sample Q-Plates verdicts
+    (validity, sn_ratio, plate_qc). curve is the Tool's standard curve, or one refitted
+    from the standards if the Std Curve sheet has none (curve['source'] says which).
+    """
+    # Three sheets of one file: open the zip and read its string table once
+    with OpenWorkbook(source) as book:
+        wells, plates = parse_raw_data(book)
+        plates = plates.merge(read_qplate_summary(book), on='q_plate', how='left')
+        curve = read_standard_curve(book)
+    if curve is not None:
+        curve['source'] = STD_CURVE_SHEET
+    else:
+        curve = fit_standard_curve(wells)
+        if curve is not None:
+            curve['source'] = 'refit'
+
+    if curve is None:
+        wells['conc'] = np.full(len(wells), np.nan, dtype=np.float32)
+        wells['in_range'] = False
+    else:
+        wells['conc'] = back_calculate(wells['rfu'].to_numpy(), curve)
+        standards = wells.loc[wells['role'] == 'Standard', 'nominal']
+        curve['low'], curve['high'] = float(standards.min()), float(standards.max())
+        wells['in_range'] = wells['conc'].between(curve['low'], curve['high']).to_numpy()
+    return wells, plates, curve
+
+
+def plate_summary(wells, plates):
+    """
+    One row per Q-plate: controls, sample statistics and the sheet's QC verdicts.
+
+    Columns: plate, q_plate, read_time, qhigh_conc, qlow_conc, qblank_rfu, samples,
+    median_conc, in_range_pct, validity, plate_qc.
+    """
+    q_wells = wells[wells['q_plate'] != STANDARD_PLATE]
+    controls = q_wells[q_wells['role'].isin(['QHigh', 'QLow', 'QBlank'])]
+    conc = controls.pivot_table(index='q_plate', columns='role', values='conc', observed=True, aggfunc='first')
+    rfu = controls.pivot_table(index='q_plate', columns='role', values='rfu', observed=True, aggfunc='first')
+    samples = q_wells[q_wells['role'] == 'Sample'].groupby('q_plate', observed=True)
+    summary = pd.DataFrame({
+        'qhigh_conc': conc.get('QHigh'),
+        'qlow_conc': conc.get('QLow'),
+        'qblank_rfu': rfu.get('QBlank'),
+        'samples': samples['rfu'].count(),
+        'median_conc': samples['conc'].median(),
+        'in_range_pct': samples['in_range'].mean() * 100,
+    })
+    summary = plates[plates['q_plate'] != STANDARD_PLATE].merge(
+        summary, left_on='q_plate', right_index=True, how='left')
+    return summary[['plate', 'q_plate', 'read_time', 'qhigh_conc', 'qlow_conc', 'qblank_rfu', 'samples',
+                    'median_conc', 'in_range_pct', 'validity', 'plate_qc']].reset_index(drop=True)
@@ -0,0 +1,475 @@
+"""
+Exports and summary reports, built in the background and served as downloads.
+
+Exports stream the filtered runs (and, from the database, the per-run Q-plate
+rows) to CSV, XLSX or Parquet a chunk at a time. LOCAL reads the chunks straight
+from SQLite; CLOUD slices them from the shared RunsIndex. Either way, no second
+copy of the range or of the spreadsheet is held in memory: CSV and Parquet are
+written chunk by chunk, and XLSX goes through openpyxl's write-only mode. Parquet
+needs pyarrow and is only offered when it is installed.
+
+Summary reports are XLSX files for one day, week or month. They contain the
+rollup statistics per instrument (mean, SD, percentiles for each metric) and the
+status counts of the runs in that period. ensure_summaries() queues the last
+complete day, week and month for the current data version if they don't exist
+yet. The dashboards call it on every rerun; cron can call
+`python dna_monitoring_reports.py --summaries` instead.
+
+All building happens in a small process-wide pool (ReportEngine), so a session
+only submits a job and polls it. Database jobs each run in a fresh
+`dna_monitoring_reports.py --job` process: writing XLSX through openpyxl is pure
+Python and would otherwise hold the GIL against the dashboard, and a
+multiprocessing worker would re-run the dashboard script it was started from.
+CLOUD's jobs slice the in-memory RunsIndex and stay on threads. The
+same job asked for twice (same dataset, filters, format and data version) is
+built once and shared. Files are written to a temporary name and renamed when
+complete, so a download never sees a half-written file; a finished file pruned
+later is rebuilt the next time it is asked for.
+
+Usage:
+    python3 dna_monitoring_reports.py --summaries [--db path/to/db]
+    python3 dna_monitoring_reports.py --export runs.csv [--from 2025-11-01] [--to 2025-12-01]
+        [--instrument "LHI - 01"] [--dataset qplates]
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import openpyxl
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from dna_monitoring_cache import DEFAULT_CACHE_DIR
+from dna_monitoring_db import DB_PATH, connect, get_state, iter_qplates, iter_runs, list_instruments
+from dna_monitoring_rollups import GRAIN_LABELS, GRAINS, period_starts, query_rollups, select_rollups
+from dna_monitoring_status import STATUS_LEVELS
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR = os.path.join(DEFAULT_CACHE_DIR, 'reports')
+
+# Rows per chunk read, converted and written; bounds the memory an export holds
+CHUNK_ROWS = 10000
+
+REPORT_WORKERS = 2
+
+# Finished files kept per directory (oldest are removed first)
+MAX_FILES = 50
+
+# Excel's row limit, less the header; longer exports continue on another sheet
+XLSX_MAX_ROWS = 1048575
+
+FORMATS = {
+    'csv': ("CSV", 'text/csv'),
+    'xlsx': ("Excel", 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+if pq is not None:
+    FORMATS['parquet'] = ("Parquet", 'application/vnd.apache.parquet')
+
+DATASETS = {'runs': "Runs", 'qplates': "Q-Plates"}
+
+SUMMARY_STATUS_COLUMNS = ['std_01_status', 'std_07_status', 'sn_status']
+
+
+def write_csv(chunks, path):
+    """Write frames to one CSV (header from the first)"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=(i == 0), quoting=csv.QUOTE_MINIMAL)
+
+
+def _excel_rows(chunk):
+    """Rows of plain Python values (None for missing) that openpyxl can write"""
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def write_xlsx(chunks, path, sheet_name='Runs'):
+    """Write frames to one workbook in write-only mode, starting a new sheet at Excel's row limit"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet, rows, part = None, 0, 0
+    for chunk in chunks:
+        if sheet is None:
+            columns = [str(col) for col in chunk.columns]
+        for row in _excel_rows(chunk):
+            if sheet is None or rows >= XLSX_MAX_ROWS:
+                part += 1
+                sheet = workbook.create_sheet(sheet_name if part == 1 else f'{sheet_name} ({part})')
+                sheet.append(columns)
+                rows = 0
+            sheet.append(row)
+            rows += 1
+        if sheet is None:
+            # No rows at all: still write the header
+            sheet = workbook.create_sheet(sheet_name)
+            sheet.append(columns)
+    workbook.save(path)
+
+
+def write_parquet(chunks, path):
+    """Write frames to one Parquet file, one row group per chunk (requires pyarrow)"""
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # Columns that are all-empty in the first chunk are text in practice
+                schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                    for field in schema], metadata=schema.metadata)
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx, 'parquet': write_parquet}
+
+
+class DatabaseSource:
+    """
+    Report data read from the SQLite database (LOCAL); every job opens its own connection.
+
+    Holds only the path and version, so jobs can be built in a worker process.
+    That process's stderr is captured and shown when the job fails.
+    """
+
+    datasets = ('runs', 'qplates')
+    in_process = True
+
+    def __init__(self, db_path=DB_PATH, version=None):
+        self.db_path = db_path
+        if version is None:
+            conn = connect(db_path)
+            try:
+                version = f"{get_state(conn, 'synced_at')}|{get_state(conn, 'status_rules')}"
+            finally:
+                conn.close()
+        self.version = version
+
+    def chunks(self, dataset, date_from=None, date_to=None, instrument=None, chunksize=CHUNK_ROWS):
+        conn = connect(self.db_path)
+        try:
+            reader = iter_qplates if dataset == 'qplates' else iter_runs
+            yield from reader(conn, date_from, date_to, instrument, chunksize)
+        finally:
+            conn.close()
+
+    def instruments(self):
+        conn = connect(self.db_path)
+        try:
+            return list_instruments(conn)
+        finally:
+            conn.close()
+
+    def rollups(self, grain, period_start, instrument=None):
+        conn = connect(self.db_path)
+        try:
+            return query_rollups(conn, grain, period_start, period_start, instrument)
+        finally:
+            conn.close()
+
+
+class FrameSource:
+    """Report data sliced from a shared RunsIndex and its raw rollups (CLOUD)"""
+
+    datasets = ('runs',)
+    in_process = False
+
+    def __init__(self, runs, rollups, version):
+        self.runs = runs
+        self.raw_rollups = rollups
+        self.version = str(version)
+
+    def chunks(self, dataset, date_from=None, date_to=None, instrument=None, chunksize=CHUNK_ROWS):
+        frame = self.runs.select(date_from, date_to, instrument)
+        if len(frame) == 0:
+            yield frame
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+
+    def instruments(self):
+        return self.runs.instruments
+
+    def rollups(self, grain, period_start, instrument=None):
+        return select_rollups(self.raw_rollups, grain, period_start, period_start, instrument)
+
+
+def period_bounds(grain, when):
+    """(first instant, last instant) of the day/week/month containing `when`"""
+    start = period_starts(pd.Series([pd.Timestamp(when)]), grain).iloc[0]
+    step = {'day': pd.DateOffset(days=1), 'week': pd.DateOffset(weeks=1), 'month': pd.DateOffset(months=1)}[grain]
+    return start, start + step - pd.Timedelta(microseconds=1)
+
+
+def last_complete_period(grain, now=None):
+    """Start of the most recent day/week/month that has fully ended"""
+    start, _ = period_bounds(grain, pd.Timestamp.now() if now is None else now)
+    return period_bounds(grain, start - pd.Timedelta(microseconds=1))[0]
+
+
+def summary_frames(source, grain, period_start):
+    """
+    (metrics, statuses) frames of one period's summary report.
+
+    metrics: finalized rollups for all instruments together, then each instrument.
+    statuses: runs per instrument and status level, counted chunk by chunk.
+    """
+    start, end = period_bounds(grain, period_start)
+    parts = [source.rollups(grain, start)]
+    parts += [source.rollups(grain, start, instrument) for instrument in source.instruments()]
+    parts = [part for part in parts if len(part)]
+    metrics = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['period_start', 'instrument'])
+
+    counts = []
+    for chunk in source.chunks('runs', start, end):
+        instruments = chunk['instrument'].astype(object).fillna('Unknown')
+        for col in SUMMARY_STATUS_COLUMNS:
+            if col in chunk.columns:
+                counts.append(chunk.groupby([instruments, chunk[col].astype(object)]).size()
+                              .rename_axis(['instrument', 'level']).reset_index(name='runs').assign(status=col))
+    statuses = pd.DataFrame(columns=['instrument', 'status'] + STATUS_LEVELS)
+    if counts:
+        statuses = (pd.concat(counts).pivot_table(index=['instrument', 'status'], columns='level', values='runs',
+                                                  aggfunc='sum', fill_value=0)
+                    .reindex(columns=STATUS_LEVELS, fill_value=0).reset_index())
+    return metrics, statuses
+
+
+def write_summary(source, grain, period_start, path):
+    """One period's summary report as an XLSX with Metrics and Statuses sheets"""
+    metrics, statuses = summary_frames(source, grain, period_start)
+    start, end = period_bounds(grain, period_start)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Summary')
+    sheet.append([f"{GRAIN_LABELS[grain]} report", f"{start:%Y-%m-%d} to {end:%Y-%m-%d}"])
+    sheet.append(["Data version", source.version])
+    for name, frame in (('Metrics', metrics), ('Statuses', statuses)):
+        sheet = workbook.create_sheet(name)
+        sheet.append([str(col) for col in frame.columns])
+        for row in _excel_rows(frame):
+            sheet.append(row)
+    workbook.save(path)
+
+
+def write_export(source, dataset, fmt, date_from, date_to, instrument, path):
+    """One export file of `dataset` in format `fmt`, written chunk by chunk"""
+    WRITERS[fmt](source.chunks(dataset, date_from, date_to, instrument), path)
+
+
+BUILDS = {'export': write_export, 'summary': write_summary}
+
+
+def _build(path, build, source, *args):
+    """Run BUILDS[build](source, *args, partial_path) and move the finished file to `path`"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    partial = f'{path}.{os.getpid()}-{threading.get_ident()}.partial'
+    try:
+        BUILDS[build](source, *args, partial)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    try:
+        _prune(directory)
+    except OSError as e:
+        # The file is built; a failed cleanup is retried by the next job
+        logger.warning("Could not prune %s: %s", directory, e)
+    return path
+
+
+def _encode_arg(value):
+    return {'timestamp': value.isoformat()} if isinstance(value, pd.Timestamp) else value
+
+
+def _decode_arg(value):
+    return pd.Timestamp(value['timestamp']) if isinstance(value, dict) else value
+
+
+def _build_in_worker(path, build, source, *args):
+    """Run _build for a DatabaseSource in a `dna_monitoring_reports.py --job` process"""
+    job = json.dumps({'db': source.db_path, 'version': source.version, 'path': path, 'build': build,
+                      'args': [_encode_arg(arg) for arg in args]})
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--job'], input=job,
+                            capture_output=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"Report worker exited with {result.returncode}")
+    return path
+
+
+def _run_job(stream):
+    """Build the job read as JSON from `stream` (the worker side of _build_in_worker)"""
+    job = json.load(stream)
+    source = DatabaseSource(job['db'], job['version'])
+    return _build(job['path'], job['build'], source, *[_decode_arg(arg) for arg in job['args']])
+
+
+def _file_key(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _prune(directory, keep=MAX_FILES):
+    """Remove the oldest finished files beyond `keep`"""
+    files = []
+    for name in os.listdir(directory):
+        if name.endswith('.partial'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            files.append((os.path.getmtime(path), path))
+        except OSError:
+            # Removed by another job's pruning since the listing
+            continue
+    files.sort(reverse=True)
+    for _, path in files[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ReportEngine:
+    """
+    Process-wide worker pool building export and report files once per job.
+
+    Jobs of sources marked in_process are handed by a pool thread to their own
+    worker process; the rest are built on the pool thread itself.
+    """
+
+    def __init__(self, output_dir=REPORT_DIR, max_workers=REPORT_WORKERS):
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dna-report')
+        self._jobs = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def submit(self, source, path, build, *args):
+        """
+        Future of `path`, built by BUILDS[build](source, *args, partial_path) unless it exists.
+
+        `args` must be JSON values or Timestamps when the source runs in_process. Jobs
+        for a path already being built share that job's Future; a finished job
+        whose file has since been pruned is built again.
+        """
+        with self._lock:
+            job = self._jobs.get(path)
+            if job is not None and not (job.done() and not os.path.exists(path)):
+                return job
+            if os.path.exists(path):
+                job = Future()
+                job.set_result(path)
+            elif source.in_process:
+                job = self._threads.submit(_build_in_worker, path, build, source, *args)
+            else:
+                job = self._threads.submit(_build, path, build, source, *args)
+            self._jobs[path] = job
+            if len(self._jobs) > 2 * MAX_FILES:
+                self._jobs = {key: other for key, other in self._jobs.items() if not other.done()}
+                self._jobs[path] = job
+            return job
+
+    def shutdown(self, wait=True):
+        """Stop the worker pool (after the jobs already queued finish, with wait)"""
+        self._threads.shutdown(wait=wait)
+
+    def export(self, source, dataset, fmt, date_from=None, date_to=None, instrument=None):
+        """Future of a chunked export file of `dataset` in format `fmt`"""
+        key = _file_key(dataset, fmt, str(date_from), str(date_to), instrument, source.version)
+        path = os.path.join(self.output_dir, 'exports', f'{dataset}-{key}.{fmt}')
+        return self.submit(source, path, 'export', dataset, fmt, date_from, date_to, instrument)
+
+    def _summary_path(self, source, grain, period_start):
+        """(path, period start) of the summary report of the period containing period_start"""
+        start, _ = period_bounds(grain, period_start)
+        key = _file_key(grain, str(start), source.version)
+        return os.path.join(self.output_dir, 'summaries', f'{grain}-{start:%Y-%m-%d}-{key}.xlsx'), start
+
+    def summary(self, source, grain, period_start):
+        """Future of the summary report of the period starting at period_start"""
+        path, start = self._summary_path(source, grain, period_start)
+        return self.submit(source, path, 'summary', grain, start)
+
+    def ensure_summaries(self, source, now=None):
+        """
+        Queue the last complete day, week and month for this data version; returns their Futures.
+
+        The report paths are worked out once per data version and day, so calling this
+        on every rerun only looks up the jobs (and rebuilds a report that was pruned).
+        """
+        now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+        key = (source.version, now.normalize())
+        with self._lock:
+            paths = self._summaries.get(key)
+        if paths is None:
+            paths = {grain: self._summary_path(source, grain, last_complete_period(grain, now)) for grain in GRAINS}
+            with self._lock:
+                self._summaries = {key: paths}
+        return {grain: self.submit(source, path, 'summary', grain, start)
+                for grain, (path, start) in paths.items()}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_report_engine():
+    """The process-wide ReportEngine shared by every session"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ReportEngine()
+        return _engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build summary reports or export runs from the database")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database to read")
+    parser.add_argument('--summaries', action='store_true',
+                        help="Build the last complete daily, weekly and monthly reports")
+    parser.add_argument('--export', help="Export to this file (.csv, .xlsx or .parquet)")
+    parser.add_argument('--dataset', choices=sorted(DATASETS), default='runs')
+    parser.add_argument('--from', dest='date_from', help="First completion date to export")
+    parser.add_argument('--to', dest='date_to', help="Last completion date to export")
+    parser.add_argument('--instrument', help="Only this instrument")
+    parser.add_argument('--job', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.job:
+        # A report engine's worker: the job arrives as JSON on stdin
+        _run_job(sys.stdin)
+        return
+    source = DatabaseSource(args.db)
+    engine = get_report_engine()
+    if args.summaries:
+        for grain, job in engine.ensure_summaries(source).items():
+            print(f"📄 {GRAIN_LABELS[grain]}: {job.result()}")
+    if args.export:
+        fmt = os.path.splitext(args.export)[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            parser.error(f"--export must end in one of: {', '.join('.' + f for f in FORMATS)}")
+        date_from = pd.Timestamp(args.date_from) if args.date_from else None
+        date_to = pd.Timestamp(args.date_to) if args.date_to else None
+        WRITERS[fmt](source.chunks(args.dataset, date_from, date_to, args.instrument), args.export)
+        print(f"✅ Exported {args.dataset} to {args.export}")
+
+
+if __name__ == '__main__':
+    main()
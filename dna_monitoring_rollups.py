@@ -0,0 +1,274 @@
+"""
+Daily, weekly and monthly rollups of the run metrics, per instrument.
+
+Each rollup row holds mergeable aggregates for one (grain, period, instrument, metric):
+run count, value count, sum, sum of squares, min, max and a percentile sketch. `runs`
+counts every run of the period and `n` those with a value for the metric, so a metric
+missing from a run still has a row for it (n 0, empty sketch) and the two counts agree
+whether the runs arrived in one rebuild or in several updates. Because
+every field merges by simple addition (or min/max), new runs are folded into the
+existing rows without touching older data, and rows for several instruments combine
+into an "all instruments" series the same way.
+
+The sketch buckets values logarithmically (bucket k holds values in (g^(k-1), g^k],
+g = (1 + a) / (1 - a)), so any quantile read from it is within SKETCH_ACCURACY
+relative error of the true one. Zero and negative values share one bucket.
+"""
+
+import json
+import math
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+GRAINS = ('day', 'week', 'month')
+GRAIN_LABELS = {'day': "Daily", 'week': "Weekly", 'month': "Monthly"}
+
+# rollup metric name -> runs column
+METRICS = {
+    'std_01': 'std_01_rfu',
+    'std_07': 'std_07_rfu',
+    'blank': 'blank_rfu',
+    'sn': 'sn_std7_blank',
+}
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+SKETCH_ACCURACY = 0.01
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_ZERO_KEY = -(2 ** 31)
+
+# Ranges up to this many days chart individual runs; wider ones use the grain given
+GRAIN_THRESHOLDS = ((62, None), (400, 'day'), (1100, 'week'))
+
+# Below this many runs every point is drawn, however wide the range
+ROLLUP_MIN_RUNS = 500
+
+_CACHE_SIZE = 4
+_rollup_cache = OrderedDict()
+
+_KEY_COLUMNS = ['grain', 'period_start', 'instrument', 'metric']
+_SUM_COLUMNS = ['runs', 'n', 'total', 'total_sq']
+
+
+def choose_grain(date_from, date_to, n_runs):
+    """None (plot raw runs) for short or sparse ranges, else the finest readable grain"""
+    if n_runs < ROLLUP_MIN_RUNS:
+        return None
+    days = (pd.Timestamp(date_to) - pd.Timestamp(date_from)).days
+    for limit, grain in GRAIN_THRESHOLDS:
+        if days <= limit:
+            return grain
+    return 'month'
+
+
+def period_starts(times, grain):
+    """First day of each timestamp's period; weeks start on Monday"""
+    day = times.dt.normalize()
+    if grain == 'week':
+        return day - pd.to_timedelta(day.dt.weekday, unit='D')
+    if grain == 'month':
+        return day - pd.to_timedelta(day.dt.day - 1, unit='D')
+    return day
+
+
+def sketch_keys(values):
+    """Sketch bucket for each value"""
+    values = np.asarray(values, dtype=float)
+    keys = np.full(len(values), _ZERO_KEY, dtype=np.int64)
+    positive = values > 0
+    keys[positive] = np.ceil(np.log(values[positive]) / _LOG_GAMMA).astype(np.int64)
+    return keys
+
+
+def merge_sketches(sketches):
+    merged = {}
+    for sketch in sketches:
+        for key, count in sketch.items():
+            merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def sketch_quantile(sketch, q, low=-math.inf, high=math.inf):
+    """Approximate q-quantile from a sketch, clamped to the known [low, high]"""
+    if not sketch:
+        return math.nan
+    keys = sorted(sketch)
+    counts = np.cumsum([sketch[key] for key in keys])
+    rank = q * (counts[-1] - 1)
+    key = keys[int(np.searchsorted(counts, rank, side='right'))]
+    value = 0.0 if key == _ZERO_KEY else 2 * _GAMMA ** key / (_GAMMA + 1)
+    return min(max(value, low), high)
+
+
+def compute_rollups(runs):
+    """
+    Aggregate runs into rollup rows for every grain.
+
+    `runs` needs lhi_completion_datetime, instrument and the METRICS columns (datetimes
+    may be stored text). Runs without a completion time or instrument are skipped;
+    every other run is counted in each metric's `runs`, with or without a value.
+    """
+    times = pd.to_datetime(runs['lhi_completion_datetime'], errors='coerce')
+    valid = times.notna() & runs['instrument'].notna()
+    times = times[valid]
+    instruments = runs.loc[valid, 'instrument'].astype(str)
+
+    parts = []
+    for grain in GRAINS:
+        periods = period_starts(times, grain).dt.strftime('%Y-%m-%d').rename('period_start')
+        run_counts = instruments.groupby([periods, instruments]).size().rename('runs')
+        for metric, column in METRICS.items():
+            values = pd.to_numeric(runs.loc[valid, column], errors='coerce')
+            has_value = values.notna()
+            frame = pd.DataFrame({
+                'period_start': periods[has_value], 'instrument': instruments[has_value],
+                'value': values[has_value].astype(float),
+            })
+            frame['square'] = frame['value'] ** 2
+            frame['key'] = sketch_keys(frame['value'].to_numpy())
+            groups = frame.groupby(['period_start', 'instrument'])
+            agg = groups['value'].agg(n='count', total='sum', min_value='min', max_value='max')
+            agg['total_sq'] = groups['square'].sum()
+            buckets = frame.groupby(['period_start', 'instrument', 'key']).size()
+            agg['sketch'] = [dict(zip(s.index.get_level_values('key').tolist(), s.tolist()))
+                             for _, s in buckets.groupby(level=['period_start', 'instrument'])]
+            # Periods where no run has this metric still count their runs
+            agg = agg.reindex(run_counts.index)
+            agg['n'] = agg['n'].fillna(0).astype('int64')
+            agg[['total', 'total_sq']] = agg[['total', 'total_sq']].fillna(0.0)
+            agg['sketch'] = [sketch if isinstance(sketch, dict) else {} for sketch in agg['sketch']]
+            agg = agg.join(run_counts).reset_index()
+            agg['grain'] = grain
+            agg['metric'] = metric
+            parts.append(agg)
+
+    columns = _KEY_COLUMNS + _SUM_COLUMNS + ['min_value', 'max_value', 'sketch']
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True)[columns]
+
+
+def merge_rollups(rollups, keys=_KEY_COLUMNS):
+    """Combine rows sharing `keys` (e.g. an existing row and newly arrived runs)"""
+    groups = rollups.groupby(keys, sort=True)
+    merged = groups[_SUM_COLUMNS].sum()
+    merged['min_value'] = groups['min_value'].min()
+    merged['max_value'] = groups['max_value'].max()
+    merged['sketch'] = groups['sketch'].agg(merge_sketches)
+    return merged.reset_index()
+
+
+def cached_rollups(runs_df, version):
+    """
+    compute_rollups() memoized per dataset version, for callers without the database.
+
+    `version` must change whenever runs_df's contents do (e.g. the ingest generation
+    plus row count); the last few versions are kept.
+    """
+    if version in _rollup_cache:
+        _rollup_cache.move_to_end(version)
+        return _rollup_cache[version]
+    rollups = compute_rollups(runs_df)
+    _rollup_cache[version] = rollups
+    while len(_rollup_cache) > _CACHE_SIZE:
+        _rollup_cache.popitem(last=False)
+    return rollups
+
+
+def finalize_rollups(rollups):
+    """Add mean, sample std dev and QUANTILES (p05, p25, ...) columns"""
+    df = rollups.copy()
+    n = df['n'].astype(float)
+    df['mean'] = df['total'] / n
+    variance = (df['total_sq'] - n * df['mean'] ** 2).clip(lower=0) / (n - 1).where(n > 1)
+    df['std'] = np.sqrt(variance)
+    for q in QUANTILES:
+        df[f'p{round(q * 100):02d}'] = [
+            sketch_quantile(sketch, q, low, high)
+            for sketch, low, high in zip(df['sketch'], df['min_value'], df['max_value'])
+        ]
+    df['period_start'] = pd.to_datetime(df['period_start'])
+    return df.drop(columns=['sketch', 'total', 'total_sq'])
+
+
+def _to_db(rollups):
+    df = rollups.copy()
+    df['sketch'] = [json.dumps(sketch, separators=(',', ':')) for sketch in df['sketch']]
+    return df
+
+
+def _from_db(df):
+    df['sketch'] = [{int(k): v for k, v in json.loads(sketch).items()} for sketch in df['sketch']]
+    return df
+
+
+def _write(conn, rollups):
+    if rollups.empty:
+        return
+    df = _to_db(rollups)
+    columns = list(df.columns)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO rollups ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def rebuild_rollups(conn, runs):
+    """Replace every rollup with aggregates of `runs` (the full archive)"""
+    conn.execute('DELETE FROM rollups')
+    _write(conn, compute_rollups(runs))
+
+
+def update_rollups(conn, new_runs):
+    """Fold newly archived runs into the stored rollups; only their periods are touched"""
+    partial = compute_rollups(new_runs)
+    if partial.empty:
+        return
+    existing = []
+    for grain, rows in partial.groupby('grain'):
+        existing.append(_from_db(pd.read_sql_query(
+            'SELECT * FROM rollups WHERE grain = ? AND period_start >= ?',
+            conn, params=(grain, rows['period_start'].min()))))
+    combined = pd.concat(existing + [partial], ignore_index=True)
+    touched = combined.set_index(_KEY_COLUMNS).index.isin(partial.set_index(_KEY_COLUMNS).index)
+    _write(conn, merge_rollups(combined[touched]))
+
+
+def select_rollups(rollups, grain, date_from=None, date_to=None, instrument=None):
+    """
+    Finalized rollups of one grain for the periods overlapping [date_from, date_to].
+
+    With instrument=None the instruments are merged into one series per metric
+    (instrument 'All Instruments'). Periods at either end cover their whole
+    day/week/month, including runs just outside the range.
+    """
+    df = rollups[rollups['grain'] == grain]
+    if date_from is not None:
+        first = period_starts(pd.Series([pd.Timestamp(date_from)]), grain).iloc[0]
+        df = df[df['period_start'] >= first.strftime('%Y-%m-%d')]
+    if date_to is not None:
+        df = df[df['period_start'] <= pd.Timestamp(date_to).strftime('%Y-%m-%d')]
+    if instrument is not None:
+        df = df[df['instrument'] == instrument]
+    elif len(df):
+        df = merge_rollups(df.assign(instrument='All Instruments'))
+    return finalize_rollups(df)
+
+
+def query_rollups(conn, grain, date_from=None, date_to=None, instrument=None):
+    """select_rollups() over the database's rollups table, filtered in SQL"""
+    clauses, params = ['grain = ?'], [grain]
+    if date_from is not None:
+        first = period_starts(pd.Series([pd.Timestamp(date_from)]), grain).iloc[0]
+        clauses.append('period_start >= ?')
+        params.append(first.strftime('%Y-%m-%d'))
+    if date_to is not None:
+        clauses.append('period_start <= ?')
+        params.append(pd.Timestamp(date_to).strftime('%Y-%m-%d'))
+    if instrument is not None:
+        clauses.append('instrument = ?')
+        params.append(instrument)
+    df = _from_db(pd.read_sql_query(f"SELECT * FROM rollups WHERE {' AND '.join(clauses)}", conn, params=params))
+    return select_rollups(df, grain, instrument=instrument)
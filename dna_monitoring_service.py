@@ -0,0 +1,156 @@
+"""
+Process-wide runs data shared by every dashboard session.
+
+A Streamlit server runs all sessions in one process. Before, each session had to
+load its own copy of the runs: per-rerun SQL in LOCAL, and in CLOUD a
+st.cache_data frame that is unpickled for every session. When a cache entry went
+stale, every session that missed it would parse at the same time. The data
+service holds one RunsIndex per data version (the Tool file's hash or the
+database's last sync) and loads each version single-flight: the first session to
+ask runs the loader, and concurrent sessions wait for its result instead of
+parsing themselves. A failed load is raised to every waiter and is not cached.
+
+RunsIndex never changes after it is built. Sessions get the same frames without
+copying them; pandas copy-on-write keeps any session-side edit local to that
+session. Copy-on-write is always on from pandas 3.0, which requirements.txt pins:
+under pandas 2 (without the copy_on_write option) an in-place edit to a slice
+could write through to the frame every other session is reading.
+
+The runs are pre-sorted by completion time, both as a whole and per instrument,
+so the sidebar's date and instrument filters become two binary searches plus a
+row slice (a view), not a boolean mask over the whole archive.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+DATETIME_COLUMN = 'lhi_completion_datetime'
+
+# Data versions kept per process; the previous one stays while sessions move on
+MAX_ENTRIES = 2
+
+
+def _bound(value):
+    return pd.Timestamp(value).to_datetime64()
+
+
+class RunsIndex:
+    """
+    Immutable runs frame with sorted views by completion time and by instrument.
+
+    `runs` is the frame as loaded, in archive order. select() returns slices of
+    the time-sorted views. Runs with no completion time only appear in `runs`,
+    because they can never pass a date filter.
+    """
+
+    def __init__(self, runs):
+        self.runs = runs
+        self.instruments = (sorted(runs['instrument'].dropna().astype(str).unique())
+                            if 'instrument' in runs.columns else [])
+
+        self._by_time = None
+        self._by_instrument = {}
+        if DATETIME_COLUMN not in runs.columns:
+            return
+        times = pd.to_datetime(runs[DATETIME_COLUMN], errors='coerce')
+        dated = runs[times.notna().to_numpy()]
+        order = np.argsort(times[times.notna()].to_numpy(), kind='stable')
+        by_time = dated.iloc[order]
+        self._by_time = (by_time, pd.to_datetime(by_time[DATETIME_COLUMN]).to_numpy())
+        if 'instrument' in runs.columns:
+            # One stable grouping pass; each group keeps the time order
+            for instrument, frame in by_time.groupby('instrument', sort=False, observed=True):
+                self._by_instrument[str(instrument)] = (frame, pd.to_datetime(frame[DATETIME_COLUMN]).to_numpy())
+
+    def __len__(self):
+        return len(self.runs)
+
+    def select(self, date_from=None, date_to=None, instrument=None):
+        """
+        Runs completed in [date_from, date_to] (inclusive), optionally for one instrument.
+
+        Sorted by completion time (archive order among equal times). The result is
+        a slice of a shared frame; bounds are found with np.searchsorted.
+        """
+        if self._by_time is None:
+            if instrument is None:
+                return self.runs
+            return self.runs[self.runs['instrument'].astype(str) == instrument]
+
+        if instrument is None:
+            frame, times = self._by_time
+        else:
+            frame, times = self._by_instrument.get(instrument, (self._by_time[0].iloc[:0], self._by_time[1][:0]))
+        start = 0 if date_from is None else np.searchsorted(times, _bound(date_from), side='left')
+        stop = len(times) if date_to is None else np.searchsorted(times, _bound(date_to), side='right')
+        return frame.iloc[start:stop]
+
+
+class DataService:
+    """Single-flight, per-version cache of RunsIndex objects"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.loads = 0
+        self.hits = 0
+        self.waits = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        RunsIndex of the data version `key`, calling loader() (-> DataFrame) at most once.
+
+        Callers that arrive while another thread is loading the same key block
+        until that load finishes and share its result or its exception.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+                self.loads += 1
+            else:
+                self.waits += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            index = RunsIndex(loader())
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+        flight.set_result(index)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_service = DataService()
+
+
+def shared_runs(key, loader):
+    """The process-wide service's RunsIndex for `key` (see DataService.get)"""
+    return _service.get(key, loader)
+
+
+def get_service():
+    return _service
@@ -0,0 +1,288 @@
+"""
+Statistical process control for the run metrics, per instrument.
+
+Every (instrument, metric) series is followed run by run, in archive order:
+
+- rolling limits: mean and standard deviation of the previous WINDOW runs (sliding
+  Welford, so adding one run and dropping the oldest costs the same at any history
+  length); a run is judged against the limits from before it, never its own value;
+- Westgard/Nelson rules on z = (value - mean) / sd, see RULES;
+- tabular CUSUM (k = CUSUM_K, h = CUSUM_H sd) and EWMA (lambda = EWMA_LAMBDA,
+  L = EWMA_L asymptotic limits) on the same z, so slow drift is flagged before any
+  single run crosses a limit.
+
+A series' whole state is a few numbers plus the last WINDOW values, so a sync only
+loads that state and feeds it the new runs (update_spc()); rebuild_spc() replays the
+full archive. No rules are evaluated until MIN_BASELINE runs are in the window.
+"""
+
+import json
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from dna_monitoring_db import DATETIME_FORMAT, get_state, set_state, to_db_datetime
+from dna_monitoring_rollups import METRICS
+
+WINDOW = 20
+MIN_BASELINE = 8
+
+CUSUM_K = 0.5
+CUSUM_H = 5.0
+EWMA_LAMBDA = 0.2
+EWMA_L = 3.0
+_EWMA_LIMIT = EWMA_L * math.sqrt(EWMA_LAMBDA / (2 - EWMA_LAMBDA))
+
+# rule code -> description (Westgard names; Nelson equivalents in brackets)
+RULES = {
+    '1_3s': "One run beyond 3 SD [Nelson 1]",
+    '2_2s': "Two consecutive runs beyond 2 SD on the same side",
+    'R_4s': "Consecutive runs more than 4 SD apart, on opposite sides",
+    '4_1s': "Four consecutive runs beyond 1 SD on the same side",
+    '10_x': "Ten consecutive runs on the same side of the mean [Nelson 2: nine]",
+    '6_trend': "Six runs in a row steadily increasing or decreasing [Nelson 3]",
+    'cusum': f"CUSUM beyond {CUSUM_H:g} SD (sustained shift)",
+    'ewma': f"EWMA beyond {EWMA_L:g}-sigma limits (drift)",
+}
+
+SPC_COLUMNS = ['row_id', 'instrument', 'metric', 'value', 'center', 'sd', 'z', 'ewma',
+               'cusum_pos', 'cusum_neg', 'rules']
+
+
+class SPCSeries:
+    """Incremental SPC state of one (instrument, metric) series"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.window = deque(state.get('window', []), maxlen=WINDOW)
+        self.mean = state.get('mean', 0.0)
+        self.m2 = state.get('m2', 0.0)
+        self.recent_z = deque(state.get('recent_z', []), maxlen=4)
+        self.side_run = state.get('side_run', 0)     # +n / -n consecutive runs above / below
+        self.trend_run = state.get('trend_run', 0)   # +n / -n consecutive increases / decreases
+        self.last_value = state.get('last_value')
+        self.ewma = state.get('ewma', 0.0)
+        self.cusum_pos = state.get('cusum_pos', 0.0)
+        self.cusum_neg = state.get('cusum_neg', 0.0)
+
+    def to_state(self):
+        return {
+            'window': list(self.window), 'mean': self.mean, 'm2': self.m2,
+            'recent_z': list(self.recent_z), 'side_run': self.side_run, 'trend_run': self.trend_run,
+            'last_value': self.last_value, 'ewma': self.ewma,
+            'cusum_pos': self.cusum_pos, 'cusum_neg': self.cusum_neg,
+        }
+
+    def _push(self, value):
+        if len(self.window) == WINDOW:
+            old = self.window[0]
+            n = len(self.window) - 1
+            delta = old - self.mean
+            self.mean = self.mean - delta / n if n else 0.0
+            self.m2 = max(self.m2 - delta * (old - self.mean), 0.0) if n else 0.0
+        self.window.append(value)
+        delta = value - self.mean
+        self.mean += delta / len(self.window)
+        self.m2 += delta * (value - self.mean)
+
+    def _trend(self, value):
+        if self.last_value is None or value == self.last_value:
+            self.trend_run = 0
+        elif value > self.last_value:
+            self.trend_run = self.trend_run + 1 if self.trend_run > 0 else 1
+        else:
+            self.trend_run = self.trend_run - 1 if self.trend_run < 0 else -1
+        self.last_value = value
+
+    def update(self, value):
+        """
+        Judge one new run against the current limits, then add it to the window.
+
+        Returns (center, sd, z, ewma, cusum_pos, cusum_neg, rules); center..cusum are
+        NaN and rules empty while the baseline is shorter than MIN_BASELINE.
+        """
+        n = len(self.window)
+        sd = math.sqrt(self.m2 / (n - 1)) if n > 1 else 0.0
+        self._trend(value)
+        if n < MIN_BASELINE or sd <= 0:
+            self._push(value)
+            return (math.nan,) * 6 + ('',)
+
+        center = self.mean
+        z = (value - center) / sd
+        rules = []
+        if abs(z) > 3:
+            rules.append('1_3s')
+        prev = self.recent_z[-1] if self.recent_z else 0.0
+        if (z > 2 and prev > 2) or (z < -2 and prev < -2):
+            rules.append('2_2s')
+        if z * prev < 0 and abs(z - prev) > 4:
+            rules.append('R_4s')
+        self.recent_z.append(z)
+        if len(self.recent_z) == 4 and (all(r > 1 for r in self.recent_z) or all(r < -1 for r in self.recent_z)):
+            rules.append('4_1s')
+        side = 1 if z > 0 else -1 if z < 0 else 0
+        self.side_run = self.side_run + side if side and self.side_run * side > 0 else side
+        if abs(self.side_run) >= 10:
+            rules.append('10_x')
+        if abs(self.trend_run) >= 5:
+            # Five steps up (or down) in a row is six runs
+            rules.append('6_trend')
+
+        self.ewma = EWMA_LAMBDA * z + (1 - EWMA_LAMBDA) * self.ewma
+        if abs(self.ewma) > _EWMA_LIMIT:
+            rules.append('ewma')
+        self.cusum_pos = max(0.0, self.cusum_pos + z - CUSUM_K)
+        self.cusum_neg = max(0.0, self.cusum_neg - z - CUSUM_K)
+        cusum_pos, cusum_neg = self.cusum_pos, self.cusum_neg
+        if cusum_pos > CUSUM_H or cusum_neg > CUSUM_H:
+            rules.append('cusum')
+            # Restart so the next shift is detected on its own
+            self.cusum_pos = self.cusum_neg = 0.0
+
+        self._push(value)
+        return center, sd, z, self.ewma, cusum_pos, cusum_neg, ','.join(rules)
+
+
+def compute_spc(runs, series=None, row_ids=None):
+    """
+    Feed runs (archive order) through the SPC series, creating any that are new.
+
+    `runs` needs instrument and the METRICS columns; row_ids defaults to the index.
+    `series` maps (instrument, metric) -> SPCSeries and is updated in place. Returns
+    (results with SPC_COLUMNS, one row per run and metric with a value; series).
+    """
+    series = {} if series is None else series
+    row_ids = runs.index.to_numpy() if row_ids is None else np.asarray(row_ids)
+    instruments = runs['instrument'].astype(object).where(runs['instrument'].notna(), None).tolist()
+    records = []
+    for metric, column in METRICS.items():
+        values = pd.to_numeric(runs[column], errors='coerce').to_numpy(dtype=float).tolist()
+        for row_id, instrument, value in zip(row_ids.tolist(), instruments, values):
+            if instrument is None or value != value:
+                continue
+            key = (instrument, metric)
+            state = series.get(key)
+            if state is None:
+                state = series[key] = SPCSeries()
+            records.append((row_id, instrument, metric, value) + state.update(value))
+    return pd.DataFrame.from_records(records, columns=SPC_COLUMNS), series
+
+
+def _write(conn, results, series):
+    if len(results):
+        frame = results.astype(object).where(results.notna(), None)
+        conn.executemany(f"INSERT OR REPLACE INTO spc ({', '.join(SPC_COLUMNS)}) "
+                         f"VALUES ({', '.join('?' * len(SPC_COLUMNS))})",
+                         frame.itertuples(index=False, name=None))
+    conn.executemany('INSERT OR REPLACE INTO spc_state (instrument, metric, state) VALUES (?, ?, ?)',
+                     [(instrument, metric, json.dumps(state.to_state()))
+                      for (instrument, metric), state in series.items()])
+
+
+def rebuild_spc(conn, runs):
+    """Replay every run (records with row_id) into fresh SPC series"""
+    conn.execute('DELETE FROM spc')
+    conn.execute('DELETE FROM spc_state')
+    results, series = compute_spc(runs, row_ids=runs['row_id'])
+    _write(conn, results, series)
+    # Runs without an instrument or any metric value leave spc_state empty; remember the replay
+    set_state(conn, 'spc_replayed', '1')
+
+
+def backfill_spc(conn):
+    """
+    Replay the stored runs if they have never been replayed (the database predates
+    SPC). Returns True if it did; a no-op query otherwise.
+    """
+    if get_state(conn, 'spc_replayed') or conn.execute('SELECT 1 FROM spc_state LIMIT 1').fetchone():
+        return False
+    columns = ', '.join(['row_id', 'instrument'] + list(METRICS.values()))
+    runs = pd.read_sql_query(f'SELECT {columns} FROM runs ORDER BY row_id', conn)
+    if runs.empty:
+        return False
+    rebuild_spc(conn, runs)
+    return True
+
+
+def update_spc(conn, new_runs):
+    """Continue the stored series with newly archived runs only (already inserted in runs)"""
+    if backfill_spc(conn):
+        return
+    series = {(instrument, metric): SPCSeries(json.loads(state))
+              for instrument, metric, state in conn.execute('SELECT instrument, metric, state FROM spc_state')}
+    touched = set(new_runs['instrument'].dropna())
+    results, series = compute_spc(new_runs, series, row_ids=new_runs['row_id'])
+    _write(conn, results, {key: state for key, state in series.items() if key[0] in touched})
+
+
+def query_spc(conn, date_from=None, date_to=None, instrument=None):
+    """SPC rows for runs in [date_from, date_to], with lhi_completion_datetime"""
+    clauses, params = [], []
+    if date_from is not None:
+        clauses.append('r.lhi_completion_datetime >= ?')
+        params.append(to_db_datetime(date_from))
+    if date_to is not None:
+        clauses.append('r.lhi_completion_datetime <= ?')
+        params.append(to_db_datetime(date_to))
+    if instrument is not None:
+        clauses.append('r.instrument = ?')
+        params.append(instrument)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    df = pd.read_sql_query(
+        f"SELECT s.*, r.lhi_completion_datetime FROM runs r JOIN spc s USING (row_id) {where} "
+        f"ORDER BY s.metric, r.row_id", conn, params=params)
+    df['lhi_completion_datetime'] = pd.to_datetime(df['lhi_completion_datetime'], format=DATETIME_FORMAT)
+    df['rules'] = df['rules'].fillna('')
+    return df
+
+
+_spc_cache = {}
+
+
+def cached_spc(runs_df, generation):
+    """
+    compute_spc() over an append-only runs frame, for callers without the database.
+
+    Runs already processed under the same ingest `generation` are not replayed: the
+    kept series continue from the first new row. Results carry
+    lhi_completion_datetime and index positions as row_id.
+    """
+    cached = _spc_cache.get(generation)
+    if cached is None or cached[0] > len(runs_df):
+        cached = (0, pd.DataFrame(columns=SPC_COLUMNS), {})
+    done, results, series = cached
+    if done < len(runs_df):
+        new = runs_df.iloc[done:]
+        more, series = compute_spc(new, series, row_ids=np.arange(done, len(runs_df)))
+        results = pd.concat([results, more], ignore_index=True) if len(results) else more
+    _spc_cache.clear()
+    _spc_cache[generation] = (len(runs_df), results, series)
+    out = results.copy()
+    out['lhi_completion_datetime'] = pd.to_datetime(
+        runs_df['lhi_completion_datetime'], errors='coerce').to_numpy()[out['row_id'].to_numpy(dtype=int)]
+    return out
+
+
+def select_spc(spc, date_from=None, date_to=None, instrument=None):
+    """cached_spc() rows for the dashboard filters"""
+    times = spc['lhi_completion_datetime']
+    keep = pd.Series(True, index=spc.index)
+    if date_from is not None:
+        keep &= times >= pd.Timestamp(date_from)
+    if date_to is not None:
+        keep &= times <= pd.Timestamp(date_to)
+    if instrument is not None:
+        keep &= spc['instrument'] == instrument
+    return spc[keep]
+
+
+def violation_counts(spc):
+    """Runs flagged per rule code, per metric (rule codes as columns)"""
+    flagged = spc[spc['rules'] != '']
+    if flagged.empty:
+        return pd.DataFrame(columns=list(RULES))
+    exploded = flagged.assign(rule=flagged['rules'].str.split(',')).explode('rule')
+    return exploded.groupby(['metric', 'rule']).size().unstack(fill_value=0).reindex(columns=list(RULES), fill_value=0)
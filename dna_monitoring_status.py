@@ -0,0 +1,195 @@
+"""
+Spec-status engine: traffic-light statuses for the run metrics.
+
+Every rule is a green band and a yellow band on one metric column; anything outside
+both (or missing) is red. Floors such as "S/N > 3.0" are bands open to +inf. All
+rules are evaluated together: the metric columns are stacked into one 2-D array and
+compared against per-rule bound vectors in a single NumPy pass, so the cost does not
+depend on how many runs are in range or how many rules there are.
+
+Limits come from, in order:
+  1. DEFAULT_RULES - the dashboard's historical thresholds,
+  2. dna_monitoring_specs.json next to the app, if present (same shape as DEFAULT_RULES),
+  3. the workbook's Specification sheet, for metrics it actually specifies
+     (see SPEC_RULES), when a specifications frame is passed to load_rules().
+
+The Specification sheet gives the standards as concentrations and has no RFU or
+Std-7/Blank limits, so the Std-01, Std-07 and S/N traffic lights are only ever set
+by 1 and 2. Everything that shows a limit (statuses, chart target lines, alerts)
+reads it from the load_rules() result rather than repeating the numbers.
+"""
+
+import copy
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+GREEN = "🟢"
+YELLOW = "🟡"
+RED = "🔴"
+
+STATUS_LEVELS = [GREEN, YELLOW, RED]
+STATUS_DTYPE = pd.CategoricalDtype(STATUS_LEVELS, ordered=True)
+
+SPEC_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dna_monitoring_specs.json')
+
+INF = float('inf')
+
+# Bands are (low, high), exclusive on both sides unless the rule sets "closed": true
+DEFAULT_RULES = [
+    {'column': 'std_01_rfu', 'status': 'std_01_status', 'label': "Std-01 RFU",
+     'green': [40000000, 42000000], 'yellow': [39000000, 43000000]},
+    {'column': 'std_07_rfu', 'status': 'std_07_status', 'label': "Std-07 RFU",
+     'green': [300000, 400000], 'yellow': [200000, 450000]},
+    {'column': 'sn_std7_blank', 'status': 'sn_status', 'label': "S/N (Std-7/Blank)",
+     'green': [3.0, INF], 'yellow': [2.5, INF]},
+]
+
+# Specification sheet rows that map onto run-level metrics: (table, parameter prefix)
+SPEC_RULES = [
+    {'table': 'Standard Curve Fitting', 'parameter': 'Signal to Noise Ratio',
+     'column': 'sn_std7_blank', 'status': 'sn_sop_status', 'label': "S/N SOP window"},
+]
+
+# Specification limits of the fitted standard curve; drawn on the curve trend charts,
+# not evaluated as run statuses
+CURVE_SPEC_RULES = [
+    {'table': 'Standard Curve Fitting', 'parameter': 'Slope',
+     'column': 'curve_slope', 'status': 'curve_slope_status', 'label': "Spec"},
+    {'table': 'Standard Curve Fitting', 'parameter': 'intercept',
+     'column': 'curve_intercept', 'status': 'curve_intercept_status', 'label': "Spec"},
+]
+
+_CACHE_SIZE = 8
+_status_cache = OrderedDict()
+
+
+def rules_from_specifications(specifications, spec_rules=SPEC_RULES):
+    """
+    Build closed-range rules from a load_specifications() frame (or the stored table).
+
+    Within [min, max] is green; outside is yellow for 'Warning' criteria and red
+    for QC PASS/FAIL criteria. spec_rules says which sheet rows to turn into rules.
+    """
+    rules = []
+    if specifications is None or len(specifications) == 0:
+        return rules
+    table_col = 'table' if 'table' in specifications.columns else 'tbl'
+    for spec in spec_rules:
+        rows = specifications[(specifications[table_col] == spec['table'])
+                              & specifications['parameter'].str.startswith(spec['parameter'])]
+        if len(rows) == 0:
+            continue
+        row = rows.iloc[0]
+        low = row['min_value'] if pd.notna(row['min_value']) else -INF
+        high = row['max_value'] if pd.notna(row['max_value']) else INF
+        warning_only = 'warning' in str(row['criteria']).lower()
+        rules.append({
+            'column': spec['column'], 'status': spec['status'], 'label': spec['label'], 'closed': True,
+            'green': [float(low), float(high)],
+            'yellow': [-INF, INF] if warning_only else [float(low), float(high)],
+        })
+    return rules
+
+
+def load_rules(config_path=SPEC_CONFIG_PATH, specifications=None):
+    """Dashboard rules (config file overrides defaults) plus Specification-sheet rules"""
+    rules = copy.deepcopy(DEFAULT_RULES)
+    if config_path and os.path.exists(config_path):
+        with open(config_path, encoding='utf-8') as f:
+            overrides = {rule['status']: rule for rule in json.load(f)}
+        rules = [dict(rule, **overrides.pop(rule['status'], {})) for rule in rules]
+        rules.extend(overrides.values())
+    return rules + rules_from_specifications(specifications)
+
+
+def limit_text(value):
+    """A limit as shown to users: 2.5, 3, 40,000,000"""
+    return f"{value:,.0f}" if float(value).is_integer() else f"{value:g}"
+
+
+def band_text(band, closed=False):
+    """Human-readable (low, high) band, e.g. '> 3', '≤ 0.1' or '40,000,000–42,000,000'"""
+    low, high = band
+    if high == INF:
+        return f"{'≥' if closed else '>'} {limit_text(low)}"
+    if low == -INF:
+        return f"{'≤' if closed else '<'} {limit_text(high)}"
+    return f"{limit_text(low)}–{limit_text(high)}"
+
+
+def rule_for(rules, column):
+    """The traffic-light rule for a metric column (not a Specification window), or None"""
+    return next((rule for rule in rules if rule['column'] == column and not rule.get('closed')), None)
+
+
+def rules_version(rules):
+    """Stable hash of a rule set, used to tell when stored statuses are stale"""
+    payload = json.dumps(rules, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def compute_statuses(runs_df, rules=None):
+    """
+    Evaluate all rules at once; returns a frame of categorical status columns.
+
+    Rules whose metric column is absent from runs_df are skipped.
+    """
+    if rules is None:
+        rules = DEFAULT_RULES
+    rules = [rule for rule in rules if rule['column'] in runs_df.columns]
+    if not rules:
+        return pd.DataFrame(index=runs_df.index)
+
+    values = np.column_stack([pd.to_numeric(runs_df[rule['column']], errors='coerce').to_numpy(dtype=float)
+                              for rule in rules])
+    green = np.array([rule['green'] for rule in rules], dtype=float)
+    yellow = np.array([rule['yellow'] for rule in rules], dtype=float)
+    closed = np.array([rule.get('closed', False) for rule in rules])
+
+    with np.errstate(invalid='ignore'):
+        in_green = np.where(closed, (values >= green[:, 0]) & (values <= green[:, 1]),
+                            (values > green[:, 0]) & (values < green[:, 1]))
+        in_yellow = np.where(closed, (values >= yellow[:, 0]) & (values <= yellow[:, 1]),
+                             (values > yellow[:, 0]) & (values < yellow[:, 1]))
+    codes = np.where(in_green, 0, np.where(in_yellow, 1, 2)).astype(np.int8)
+
+    return pd.DataFrame({
+        rule['status']: pd.Categorical.from_codes(codes[:, i], dtype=STATUS_DTYPE)
+        for i, rule in enumerate(rules)
+    }, index=runs_df.index)
+
+
+def add_status_columns(runs_df, rules=None):
+    """Return runs_df with any missing status columns computed and added"""
+    statuses = compute_statuses(runs_df, rules)
+    missing = [col for col in statuses.columns if col not in runs_df.columns]
+    return runs_df.assign(**{col: statuses[col] for col in missing})
+
+
+def cached_statuses(runs_df, version, rules=None):
+    """
+    compute_statuses() memoized per (dataset version, rule set).
+
+    `version` must change whenever runs_df's contents do (e.g. the ingest
+    generation plus row count); the last few versions are kept.
+    """
+    key = (version, rules_version(rules if rules is not None else DEFAULT_RULES))
+    if key in _status_cache:
+        _status_cache.move_to_end(key)
+        return _status_cache[key]
+    statuses = compute_statuses(runs_df, rules)
+    _status_cache[key] = statuses
+    while len(_status_cache) > _CACHE_SIZE:
+        _status_cache.popitem(last=False)
+    return statuses
+
+
+def status_counts(statuses):
+    """Count of runs per status level (every level present, zero if unused)"""
+    statuses = pd.Series(statuses).astype(STATUS_DTYPE)
+    return statuses.value_counts(sort=False).reindex(STATUS_LEVELS, fill_value=0).to_dict()
@@ -0,0 +1,246 @@
+"""
+Sync the Tool-000011 workbook into the SQLite database.
+
+Only does work when the workbook actually changed (size/mtime, then content hash).
+Run_Log_Archive is brought up to date through the incremental ingest store, so a
+sync after "Archive Current Run" inserts just the new runs; edited history triggers
+a full reload. Specification limits, run statuses and the daily/weekly/monthly
+rollups are refreshed in the same transaction, so readers never see a half sync.
+Appended runs are folded into the rollups of their own periods only, and statuses
+are computed only for new runs unless the limits changed (config file or
+Specification sheet), in which case every run is re-evaluated once. Standard
+curves are fitted once per run and kept in curve_fits, and the SPC series continue
+from their stored state through the new runs only.
+
+Usage:
+    python3 dna_monitoring_sync.py [--excel path/to/Tool.xlsm] [--db path/to/db] [--force]
+"""
+
+import argparse
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from dna_monitoring_cache import source_fingerprint
+from dna_monitoring_curves import update_curve_fits
+from dna_monitoring_db import (
+    DATETIME_FORMAT, DB_PATH, STATUS_COLUMNS, count_runs, get_state, init_db, query_specifications, set_state,
+)
+from dna_monitoring_excel import load_specifications
+from dna_monitoring_ingest import ingest_run_log, ingest_status, store_dir_for
+from dna_monitoring_rollups import rebuild_rollups, update_rollups
+from dna_monitoring_spc import backfill_spc, rebuild_spc, update_spc
+from dna_monitoring_status import SPEC_CONFIG_PATH, compute_statuses, load_rules, rules_version
+
+EXCEL_PATH = r"X:\AbC\ABC Monitoring\Tool-000011 DNA COUNT_Nonso_Version\Master File\Tool-000011_DNA_Concentration_with_SpectraMax_Nonso_Version_Macro.xlsm"
+
+# Streamlit sessions and the cron job may both call sync_workbook in one process
+_sync_lock = threading.Lock()
+
+_STANDARD_COLUMNS = {'Std-01': 'std_01_rfu', 'Std-07': 'std_07_rfu', 'Blank': 'blank_rfu'}
+
+# Each Q-plate block in Run_Log_Archive is 10 columns starting at "Qn Read DateTime";
+# the header wording differs between Q1 and Q2-Q5, the layout does not
+_QPLATE_FIELDS = [
+    'read_datetime', 'delta_time_min', 'qhigh_conc', 'qlow_conc', 'qblank_conc',
+    'sn_ratio', 'qc_status', 'median_conc', 'n_below_range', 'n_above_range',
+]
+_QPLATE_START = re.compile(r'^Q(\d) Read DateTime$')
+
+def _db_datetimes(series):
+    """Format a datetime-like column as stored TEXT (None for missing)"""
+    values = pd.to_datetime(series, errors='coerce')
+    return values.dt.strftime(DATETIME_FORMAT).astype(object).where(values.notna(), None)
+
+
+def _db_numbers(series):
+    """Numeric column as floats, with None for blanks and text notes"""
+    values = pd.to_numeric(series, errors='coerce')
+    return values.astype(object).where(values.notna(), None)
+
+
+def _db_text(series):
+    return series.astype(object).where(series.notna(), None).map(lambda v: v if v is None else str(v))
+
+
+def _status_records(metrics, rules):
+    """Status TEXT columns for the metric rows in `metrics` (None where no rule applies)"""
+    statuses = compute_statuses(metrics, rules)
+    return {col: _db_text(statuses[col]).to_numpy() if col in statuses else None
+            for col in STATUS_COLUMNS}
+
+
+def _run_records(runs_df, start, rules):
+    """runs rows for runs_df[start:], keyed by archive position"""
+    new = runs_df.iloc[start:]
+    blank = pd.Series(None, index=new.index, dtype=object)
+    frame = pd.DataFrame({'row_id': np.arange(start, start + len(new))})
+    # A workbook missing any mapped column stores NULLs there instead of failing the sync
+    frame['run_id'] = _db_text(new.get('Run ID', blank)).to_numpy()
+    for col in ('lhi_id', 'instrument'):
+        frame[col] = _db_text(new.get(col, blank)).to_numpy()
+    for col in ('lhi_completion_datetime', 'std_read_datetime'):
+        frame[col] = _db_datetimes(new.get(col, blank)).to_numpy()
+    for col in ('std_delta_time_min', 'std_01_rfu', 'std_07_rfu', 'blank_rfu', 'sn_std7_blank'):
+        frame[col] = _db_numbers(new.get(col, blank)).to_numpy()
+    frame['run_overall_qc'] = _db_text(new.get('Run Overall QC', blank)).to_numpy()
+    for col, values in _status_records(frame, rules).items():
+        frame[col] = values
+    return frame
+
+
+def _standard_records(runs):
+    """Long-format standards rows from the runs records"""
+    parts = []
+    for standard, col in _STANDARD_COLUMNS.items():
+        parts.append(pd.DataFrame({'row_id': runs['row_id'], 'standard': standard, 'rfu': runs[col]}))
+    return pd.concat(parts, ignore_index=True)
+
+
+def _qplate_records(runs_df, start):
+    """One row per (run, Q-plate) that has a read time"""
+    new = runs_df.iloc[start:]
+    row_ids = np.arange(start, start + len(new))
+    columns = list(runs_df.columns)
+    parts = []
+    for position, name in enumerate(columns):
+        match = _QPLATE_START.match(str(name))
+        if not match:
+            continue
+        block = new.iloc[:, position:position + len(_QPLATE_FIELDS)]
+        if block.shape[1] < len(_QPLATE_FIELDS):
+            continue
+        block = block.set_axis(_QPLATE_FIELDS, axis=1)
+        plate = pd.DataFrame({'row_id': row_ids, 'plate': int(match.group(1))})
+        plate['read_datetime'] = _db_datetimes(block['read_datetime']).to_numpy()
+        for field in ('delta_time_min', 'qhigh_conc', 'qlow_conc', 'qblank_conc', 'sn_ratio',
+                      'median_conc', 'n_below_range', 'n_above_range'):
+            plate[field] = _db_numbers(block[field]).to_numpy()
+        # QBlank holds a note instead of a number when it reads below the curve blank
+        notes = block['qblank_conc'].where(block['qblank_conc'].map(lambda v: isinstance(v, str)))
+        plate['qblank_note'] = _db_text(notes).to_numpy()
+        plate['qc_status'] = _db_text(block['qc_status']).to_numpy()
+        parts.append(plate[plate['read_datetime'].notna()])
+    if not parts:
+        return pd.DataFrame(columns=['row_id', 'plate'])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _refresh_statuses(conn, rules):
+    """Re-evaluate every stored run against new limits"""
+    metrics = pd.read_sql_query(
+        'SELECT row_id, std_01_rfu, std_07_rfu, blank_rfu, sn_std7_blank FROM runs', conn)
+    statuses = pd.DataFrame(_status_records(metrics, rules), index=metrics.index)
+    statuses['row_id'] = metrics['row_id']
+    assignments = ', '.join(f'{col} = ?' for col in STATUS_COLUMNS)
+    conn.executemany(f'UPDATE runs SET {assignments} WHERE row_id = ?',
+                     statuses.astype(object).where(statuses.notna(), None).itertuples(index=False, name=None))
+
+
+def _stored_rules(conn, config_path=SPEC_CONFIG_PATH):
+    """Status rules for the Specification limits already in the database"""
+    return load_rules(config_path, specifications=query_specifications(conn))
+
+
+def _insert(conn, table, frame):
+    if frame.empty:
+        return
+    columns = list(frame.columns)
+    placeholders = ', '.join('?' * len(columns))
+    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                     frame.itertuples(index=False, name=None))
+
+
+def sync_workbook(excel_path=EXCEL_PATH, db_path=DB_PATH, force=False, config_path=SPEC_CONFIG_PATH):
+    """
+    Bring the database up to date with the workbook and the status config file.
+
+    Returns a dict with mode ('unchanged', 'rules' when only the limits changed and
+    the stored statuses were re-evaluated, 'append' or 'reload'), rows_added and
+    total_runs. Raises FileNotFoundError if the workbook is unreachable.
+    """
+    with _sync_lock:
+        fingerprint = source_fingerprint(excel_path)
+        conn = init_db(db_path)
+        try:
+            if not force and get_state(conn, 'source_sha256') == fingerprint['sha256']:
+                # The workbook is the same, but dna_monitoring_specs.json may have been edited
+                rules = _stored_rules(conn, config_path)
+                mode = 'unchanged'
+                with conn:
+                    if get_state(conn, 'status_rules') != rules_version(rules):
+                        _refresh_statuses(conn, rules)
+                        set_state(conn, 'status_rules', rules_version(rules))
+                        set_state(conn, 'synced_at', str(time.time()))
+                        mode = 'rules'
+                    # No-ops unless the database predates curve fitting / SPC
+                    update_curve_fits(conn)
+                    backfill_spc(conn)
+                total = count_runs(conn)
+                return {'mode': mode, 'rows_added': 0, 'total_runs': total}
+
+            runs_df = ingest_run_log(excel_path)
+            status = ingest_status(store_dir_for(excel_path))
+            existing = count_runs(conn)
+            reload = (force or get_state(conn, 'ingest_generation') != status['generation']
+                      or existing > len(runs_df))
+            start = 0 if reload else existing
+            specs = load_specifications(excel_path)
+            rules = load_rules(config_path, specifications=specs)
+
+            with conn:
+                if reload:
+                    conn.execute('DELETE FROM curve_fits')
+                    conn.execute('DELETE FROM qplates')
+                    conn.execute('DELETE FROM standards')
+                    conn.execute('DELETE FROM runs')
+                elif get_state(conn, 'status_rules') != rules_version(rules):
+                    _refresh_statuses(conn, rules)
+
+                runs = _run_records(runs_df, start, rules)
+                _insert(conn, 'runs', runs)
+                _insert(conn, 'standards', _standard_records(runs))
+                _insert(conn, 'qplates', _qplate_records(runs_df, start))
+                update_curve_fits(conn)
+
+                specs = specs.rename(columns={'table': 'tbl'})
+                conn.execute('DELETE FROM specifications')
+                _insert(conn, 'specifications', specs.astype(object).where(specs.notna(), None))
+
+                if reload:
+                    rebuild_rollups(conn, runs)
+                    rebuild_spc(conn, runs)
+                else:
+                    update_rollups(conn, runs)
+                    update_spc(conn, runs)
+
+                set_state(conn, 'source_sha256', fingerprint['sha256'])
+                set_state(conn, 'ingest_generation', status['generation'])
+                set_state(conn, 'status_rules', rules_version(rules))
+                set_state(conn, 'synced_at', str(time.time()))
+
+            return {'mode': 'reload' if reload else 'append', 'rows_added': len(runs),
+                    'total_runs': start + len(runs)}
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the Tool workbook into the DNA monitoring database")
+    parser.add_argument('--excel', default=EXCEL_PATH, help="Tool-000011 .xlsm to read")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database to write")
+    parser.add_argument('--force', action='store_true', help="Reload everything even if unchanged")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = sync_workbook(args.excel, args.db, force=args.force)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Sync {result['mode']}: {result['rows_added']} runs added, "
+          f"{result['total_runs']} total ({elapsed:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
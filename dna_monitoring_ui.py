@@ -0,0 +1,292 @@
+"""
+Streamlit building blocks shared by the LOCAL and CLOUD dashboards.
+"""
+
+import math
+import os
+
+import pandas as pd
+import streamlit as st
+
+from dna_monitoring_charts import box_chart
+from dna_monitoring_curves import fit_curves, standards_from_wells
+from dna_monitoring_perf import peak_rss_mb, rss_mb
+from dna_monitoring_qplates import STANDARD_PLATE, plate_summary
+from dna_monitoring_reports import DATASETS, FORMATS, last_complete_period, period_bounds
+from dna_monitoring_rollups import GRAIN_LABELS, GRAINS
+from dna_monitoring_status import add_status_columns
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+# The performance panel only appears with ?admin=1 in the URL
+ADMIN_QUERY_PARAM = 'admin'
+
+# How often a report section re-checks a file that is still being built
+REPORT_POLL_SECONDS = 1
+
+SORT_OPTIONS = {
+    "Archive order": None,
+    "Newest first": ('lhi_completion_datetime', False),
+    "Oldest first": ('lhi_completion_datetime', True),
+    "Lowest S/N first": ('sn_std7_blank', True),
+}
+
+
+def _format_number(value, spec):
+    return "N/A" if pd.isna(value) else format(value, spec)
+
+
+def render_run_browser(filtered_df):
+    """
+    Paginated By-Run Details: only the runs on the current page get widgets.
+
+    Status columns are normally already on filtered_df (stored at sync time or
+    computed once per dataset version); any that are missing are filled in here for
+    the whole range before the page slice reads them.
+    """
+    st.subheader(f"All Runs ({len(filtered_df)} total)")
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        search = st.text_input("Jump to LHI ID", placeholder="e.g. Porsche", key="run_browser_search")
+    with col2:
+        sort_label = st.selectbox("Sort", list(SORT_OPTIONS), key="run_browser_sort")
+    with col3:
+        page_size = st.selectbox("Runs per page", PAGE_SIZES, key="run_browser_page_size")
+
+    runs = add_status_columns(filtered_df)
+    if search and 'lhi_id' in runs.columns:
+        runs = runs[runs['lhi_id'].astype(str).str.contains(search, case=False, regex=False, na=False)]
+
+    sort = SORT_OPTIONS[sort_label]
+    if sort is None:
+        # Filtered views come time-sorted; the index is the archive position
+        if not runs.index.is_monotonic_increasing:
+            runs = runs.sort_index(kind='stable')
+    elif sort[0] in runs.columns:
+        runs = runs.sort_values(sort[0], ascending=sort[1], kind='stable', na_position='last')
+
+    if len(runs) == 0:
+        st.info(f"No runs match LHI ID '{search}'")
+        return
+
+    n_pages = max(1, math.ceil(len(runs) / page_size))
+    # The page lives in session state only (no widget default), so it can be clamped
+    # when a narrower filter leaves the remembered page past the end
+    st.session_state.setdefault("run_browser_page", 1)
+    if st.session_state["run_browser_page"] > n_pages:
+        st.session_state["run_browser_page"] = n_pages
+    page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, step=1,
+                           key="run_browser_page") if n_pages > 1 else 1
+    start = (page - 1) * page_size
+    page_runs = runs.iloc[start:start + page_size]
+    st.caption(f"Showing runs {start + 1}–{start + len(page_runs)} of {len(runs)}")
+
+    for idx, run in enumerate(page_runs.to_dict('records')):
+        with st.expander(f"🔬 {run.get('lhi_id', 'N/A')} | {run.get('lhi_completion_datetime', 'N/A')} | {str(run.get('instrument', 'N/A')).split(' - ')[-1]}", expanded=(idx==0)):
+
+            col1, col2, col3, col4, col5 = st.columns(5)
+
+            with col1:
+                st.metric("Std-01 RFU", _format_number(run.get('std_01_rfu'), '.0f'), delta=run.get('std_01_status'))
+
+            with col2:
+                st.metric("Std-07 RFU", _format_number(run.get('std_07_rfu'), '.0f'), delta=run.get('std_07_status'))
+
+            with col3:
+                st.metric("Blank RFU", _format_number(run.get('blank_rfu'), '.0f'))
+
+            with col4:
+                st.metric("S/N (Std-7/Blank)", _format_number(run.get('sn_std7_blank'), '.2f'), delta=run.get('sn_status'))
+
+            with col5:
+                st.metric("Std Read Time", f"{_format_number(run.get('std_delta_time_min'), '.1f')} min")
+
+
+def _render_curve_audit(wells, curve):
+    """The Tool's standard curve next to a linear and a 4PL refit of the same standards"""
+    fits = fit_curves(standards_from_wells(wells)).iloc[0]
+    rows = []
+    if curve['source'] != 'refit':
+        rows.append({"Fit": "Tool (Std Curve sheet)", "Slope / b": curve['slope'],
+                     "Intercept": curve['intercept'], "R²": curve['r2']})
+    rows.append({"Fit": "Linear refit (log-log, mean RFU)", "Slope / b": fits['curve_slope'],
+                 "Intercept": fits['curve_intercept'], "R²": fits['curve_r2'],
+                 "Worst standard (% off)": fits['curve_max_error_pct']})
+    rows.append({"Fit": "4PL refit", "Slope / b": fits['fourpl_b'], "R²": fits['fourpl_r2']})
+    with st.expander("🔍 Standard curve audit"):
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+
+def render_qplates(wells, plates, curve):
+    """
+    Q-Plates of the run currently in the Tool file (from load_qplates()).
+
+    Per-plate controls and QC verdicts as a table, then the per-plate distributions
+    of back-calculated sample concentrations and raw RFU.
+    """
+    st.subheader("Current Run Q-Plates")
+    q_wells = wells[wells['q_plate'] != STANDARD_PLATE]
+    if len(q_wells) == 0:
+        st.info("No Q-Plate reads in the SpectraMax Raw Data sheet")
+        return
+
+    if curve is None:
+        st.warning("⚠️ No standard curve available; concentrations not calculated")
+    else:
+        source = "Std Curve sheet" if curve['source'] != 'refit' else "refitted from the standards"
+        st.caption(f"📐 Standard curve ({source}): ln(RFU − {curve['blank']:,.0f}) = "
+                   f"{curve['intercept']:.3f} + {curve['slope']:.4f}·ln(conc), R² {curve['r2']:.5f}; "
+                   f"quantitative range {curve['low']:g}–{curve['high']:g} ng/uL")
+
+        _render_curve_audit(wells, curve)
+
+    summary = plate_summary(wells, plates)
+    st.dataframe(summary.rename(columns={
+        'plate': "Plate", 'q_plate': "Q-Plate", 'read_time': "Read Time", 'qhigh_conc': "QHigh (ng/uL)",
+        'qlow_conc': "QLow (ng/uL)", 'qblank_rfu': "QBlank RFU", 'samples': "Samples",
+        'median_conc': "Median Conc. (ng/uL)", 'in_range_pct': "% In Range",
+        'validity': "Validity", 'plate_qc': "Plate QC",
+    }), hide_index=True, use_container_width=True)
+
+    samples = q_wells[q_wells['role'] == 'Sample']
+    col1, col2 = st.columns(2)
+    with col1:
+        fig_conc = box_chart(samples, 'conc', "Sample Concentration by Plate (ng/uL)", x='q_plate')
+        fig_conc.update_yaxes(type='log')
+        st.plotly_chart(fig_conc, use_container_width=True)
+    with col2:
+        fig_rfu = box_chart(q_wells, 'rfu', "Well RFU by Plate", x='q_plate')
+        fig_rfu.update_yaxes(type='log')
+        st.plotly_chart(fig_rfu, use_container_width=True)
+
+
+def show_figure(fig, perf):
+    """st.plotly_chart, timed as a 'plotly' stage (Plotly's JSON serialization happens here)"""
+    with perf.stage('plotly'):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def render_perf_panel(perf):
+    """
+    Log this rerun's stage timings and, for admins, show them in the sidebar.
+
+    Call last in the script so every stage is included.
+    """
+    rows = perf.finish()
+    if st.query_params.get(ADMIN_QUERY_PARAM) != '1':
+        return
+    with st.sidebar:
+        with st.expander("⏱️ Performance (this rerun)", expanded=True):
+            table = pd.DataFrame(rows, columns=['stage', 'calls', 'ms', 'self_ms', 'rss_delta_mb'])
+            st.dataframe(table.rename(columns={'stage': "Stage", 'calls': "Calls", 'ms': "Total ms",
+                                               'self_ms': "Self ms", 'rss_delta_mb': "RSS Δ (MB)"}),
+                         hide_index=True, use_container_width=True,
+                         column_config={"Total ms": st.column_config.NumberColumn(format="%.1f"),
+                                        "Self ms": st.column_config.NumberColumn(format="%.1f"),
+                                        "RSS Δ (MB)": st.column_config.NumberColumn(format="%.1f")})
+            rss, peak = rss_mb(), peak_rss_mb()
+            st.caption(f"Total {perf.total_ms():.0f} ms · RSS {_format_number(rss, '.0f')} MB · "
+                       f"peak {_format_number(peak, '.0f')} MB · run {perf.run_id}")
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _job_status(job, label, file_name, mime, key):
+    """Download button for a finished report job; returns True while it is still being built"""
+    if not job.done():
+        st.caption(f"⏳ Preparing {file_name}...")
+        return True
+    if job.exception() is not None:
+        st.error(f"❌ {file_name} failed: {job.exception()}")
+        return False
+    path = job.result()
+    if not os.path.exists(path):
+        # Pruned since it was built; resubmitting on the next rerun builds it again
+        st.caption(f"⏳ Preparing {file_name}...")
+        return True
+    # A callable: the file is read when the button is clicked, not on every rerun
+    st.download_button(label, lambda: _read_file(path), file_name=file_name, mime=mime, key=key)
+    return False
+
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def _wait_for_jobs(jobs):
+    """Rerun the page once every pending job has finished (only rendered while some are pending)"""
+    if all(job.done() for job in jobs):
+        st.rerun()
+
+
+def _render_export(engine, source, date_from, date_to, instrument):
+    """Export controls; returns the session's export job if it is still being built"""
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        dataset = st.selectbox("Data", source.datasets, format_func=DATASETS.get, key="export_dataset")
+    with col2:
+        fmt = st.selectbox("Format", list(FORMATS), format_func=lambda f: FORMATS[f][0], key="export_format")
+    with col3:
+        st.write("")
+        if st.button("📦 Prepare export", key="export_prepare"):
+            suffix = "" if instrument is None else f"_{instrument.replace(' ', '')}"
+            file_name = f"dna_{dataset}_{date_from:%Y%m%d}-{date_to:%Y%m%d}{suffix}.{fmt}"
+            # The request, not its Future: submitting again every rerun shares the
+            # running job, or rebuilds the file if it has been pruned since
+            st.session_state["export_job"] = ((dataset, fmt, pd.Timestamp(date_from), pd.Timestamp(date_to),
+                                               instrument), file_name)
+
+    if "export_job" in st.session_state:
+        request, file_name = st.session_state["export_job"]
+        job, job_fmt = engine.export(source, *request), request[1]
+        if _job_status(job, f"⬇️ Download {file_name}", file_name, FORMATS[job_fmt][1], "export_download"):
+            return [job]
+    return []
+
+
+def _render_summaries(engine, source, date_to):
+    """Scheduled and on-demand summary reports; returns the jobs still being built"""
+    mime = FORMATS['xlsx'][1]
+    pending = []
+    st.caption("Last complete day, week and month, rebuilt in the background after each data update")
+    for col, (grain, job) in zip(st.columns(len(GRAINS)), engine.ensure_summaries(source).items()):
+        with col:
+            file_name = f"dna_{grain}_report_{last_complete_period(grain):%Y-%m-%d}.xlsx"
+            if _job_status(job, f"⬇️ {GRAIN_LABELS[grain]} report", file_name, mime, f"summary_{grain}_download"):
+                pending.append(job)
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        grain = st.selectbox("Period", GRAINS, format_func=GRAIN_LABELS.get, key="summary_grain")
+    with col2:
+        day = st.date_input("Containing", value=date_to, key="summary_date")
+    with col3:
+        st.write("")
+        if st.button("📄 Build report", key="summary_build"):
+            start, _ = period_bounds(grain, day)
+            st.session_state["summary_job"] = ((grain, start), f"dna_{grain}_report_{start:%Y-%m-%d}.xlsx")
+    if "summary_job" in st.session_state:
+        request, file_name = st.session_state["summary_job"]
+        job = engine.summary(source, *request)
+        if _job_status(job, f"⬇️ Download {file_name}", file_name, mime, "summary_download"):
+            pending.append(job)
+    return pending
+
+
+def render_reports(engine, source, date_from, date_to, instrument):
+    """
+    Export and summary-report tab.
+
+    Files are built in the engine's worker pool, so this only submits jobs and shows
+    download buttons for finished ones; while any are pending a small fragment polls
+    them and reruns the page once they are done.
+    """
+    st.subheader("Export Filtered Runs")
+    st.caption("Streams the runs matching the sidebar filters to a file in the background")
+    pending = _render_export(engine, source, date_from, date_to, instrument)
+    st.divider()
+    st.subheader("Summary Reports")
+    pending += _render_summaries(engine, source, date_to)
+    if pending:
+        _wait_for_jobs(pending)
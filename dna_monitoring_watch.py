@@ -0,0 +1,210 @@
+"""
+Background watcher that keeps the database in step with the Tool file.
+
+One watcher thread per (workbook, database) per process polls the workbook's size and
+mtime. Polling rather than inotify, because the X: drive is a network share where
+change notifications are unreliable. A change is only acted on once the file has
+stopped changing for DEBOUNCE seconds and opens as a complete zip, so a save still in
+progress (or Excel holding the file mid-write) is waited out rather than parsed
+half-written. Then sync_workbook() runs once, incrementally, and `version` is bumped.
+The status config file (dna_monitoring_specs.json) is polled too: an edit to it syncs
+right away, so the stored statuses follow the new limits without waiting for the
+next save of the Tool file.
+
+Every dashboard session shares the watcher: sessions only compare `version` with
+the one they last rendered, so N open tabs cost one sync per change, not N parses.
+
+Usage:
+    python3 dna_monitoring_watch.py [--excel path/to/Tool.xlsm] [--db path/to/db]
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+import zipfile
+
+from dna_monitoring_db import DB_PATH
+from dna_monitoring_status import SPEC_CONFIG_PATH
+from dna_monitoring_sync import EXCEL_PATH, sync_workbook
+
+POLL_INTERVAL = 2.0
+# The file must be unchanged for this long before it is synced
+DEBOUNCE = 5.0
+
+logger = logging.getLogger(__name__)
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def file_signature(path):
+    """(size, mtime_ns) of path, or None if it can't be read"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SettledFile:
+    """
+    Size/mtime polling of one file that only reports a change once it has settled.
+
+    poll() returns the new signature when the file has been unchanged for `debounce`
+    seconds and opens as a complete zip; the caller marks it handled by setting `seen`.
+    """
+
+    def __init__(self, path, debounce=DEBOUNCE):
+        self.path = path
+        self.debounce = debounce
+        # Signature of the last version that was acted on
+        self.seen = None
+        self._pending = None
+        self._pending_since = None
+
+    def signature(self):
+        return file_signature(self.path)
+
+    def readable(self):
+        """True once the workbook opens as a complete zip (not locked or half-written)"""
+        try:
+            with zipfile.ZipFile(self.path):
+                return True
+        except (OSError, zipfile.BadZipFile):
+            return False
+
+    def poll(self):
+        """The settled signature if the file changed since `seen`, else None"""
+        signature = self.signature()
+        if signature is None or signature == self.seen:
+            self._pending = None
+            return None
+        now = time.monotonic()
+        if signature != self._pending:
+            # Still being written (or just changed): restart the debounce window
+            self._pending, self._pending_since = signature, now
+            return None
+        if now - self._pending_since < self.debounce or not self.readable():
+            return None
+        self._pending = None
+        return signature
+
+
+class ToolFileWatcher:
+    """
+    Polls one workbook and syncs it into one database when it settles after a change.
+
+    Also syncs when the status config file changes, so statuses follow edited limits.
+    """
+
+    def __init__(self, excel_path, db_path, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE,
+                 config_path=SPEC_CONFIG_PATH):
+        self.excel_path = excel_path
+        self.db_path = db_path
+        self.config_path = config_path
+        self.poll_interval = poll_interval
+        self.file = SettledFile(excel_path, debounce)
+        # Signature of the config file the last successful sync read
+        self.config_seen = None
+        # Bumped after every sync that added or reloaded runs or re-evaluated statuses
+        self.version = 0
+        self.last_result = None
+        self.last_error = None
+        self.last_sync_at = None
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sync(self):
+        """Sync now; on failure the error is kept and the next settled poll retries"""
+        signature = self.file.signature()
+        config_signature = file_signature(self.config_path)
+        try:
+            result = sync_workbook(self.excel_path, self.db_path, config_path=self.config_path)
+        except Exception as e:
+            self.last_error = e
+            logger.warning("Syncing %s failed: %s", self.excel_path, e)
+            return None
+        self.last_error = None
+        self.last_result = result
+        self.last_sync_at = time.time()
+        self.file.seen = signature
+        self.config_seen = config_signature
+        if result['mode'] != 'unchanged':
+            with self._changed:
+                self.version += 1
+                self._changed.notify_all()
+        return result
+
+    def poll(self):
+        """One polling step; returns the sync result if this step synced"""
+        if self.file.poll() is not None:
+            return self.sync()
+        # Limits edited while the workbook is settled (a workbook change in progress
+        # will sync with the new limits once it settles)
+        signature = self.file.signature()
+        if (file_signature(self.config_path) != self.config_seen
+                and signature is not None and signature == self.file.seen):
+            return self.sync()
+        return None
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until version moves past `version` (or timeout); returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Watcher poll failed for %s", self.excel_path)
+
+    def start(self):
+        """Sync once up front, then keep polling in a daemon thread"""
+        self.sync()
+        self._thread = threading.Thread(target=self._run, name='dna-tool-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def get_watcher(excel_path=EXCEL_PATH, db_path=DB_PATH):
+    """The process-wide, already-started watcher for this workbook and database"""
+    key = (os.path.abspath(excel_path), os.path.abspath(db_path))
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None:
+            watcher = _watchers[key] = ToolFileWatcher(excel_path, db_path).start()
+        return watcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch the Tool workbook and sync it on every change")
+    parser.add_argument('--excel', default=EXCEL_PATH, help="Tool-000011 .xlsm to watch")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database to write")
+    args = parser.parse_args()
+
+    watcher = get_watcher(args.excel, args.db)
+    print(f"👀 Watching {args.excel}")
+    if watcher.last_error is not None:
+        print(f"⚠️  Initial sync failed, retrying once the file is reachable: {watcher.last_error}")
+    version = watcher.version
+    try:
+        while True:
+            version = watcher.wait_for_change(version)
+            result = watcher.last_result
+            print(f"✅ Sync {result['mode']}: {result['rows_added']} runs added, {result['total_runs']} total")
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dna_monitoring_excel import COLUMN_MAPPING, RUN_LOG_SHEET  # noqa: E402
+
+RUN_LOG_HEADERS = list(COLUMN_MAPPING)
+
+
+def run_row(i, instrument='SpectraMax 1', std_read=True):
+    """One Run_Log_Archive row in sheet order; std_read=False leaves Std Read DateTime blank"""
+    completed = datetime(2025, 11, 1, 8) + timedelta(hours=6 * i)
+    return [completed, f'LHI-{i:04d}', instrument,
+            completed - timedelta(minutes=20) if std_read else None,
+            20.0 + i, 41e6 + i * 1000, 350000.0 + i, 1000.0 + i, 3.5]
+
+
+def write_workbook(path, rows, blank_rows=0, specification=False):
+    """
+    Save a workbook with a Run_Log_Archive sheet; blank_rows adds styled-but-empty rows.
+
+    specification=True adds the (empty) Specification sheet that a sync reads.
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = RUN_LOG_SHEET
+    ws.append(RUN_LOG_HEADERS)
+    for row in rows:
+        ws.append(row)
+    for offset in range(blank_rows):
+        for col in range(1, len(RUN_LOG_HEADERS) + 1):
+            ws.cell(row=len(rows) + 2 + offset, column=col).number_format = '0.00'
+    if specification:
+        wb.create_sheet('Specification')
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """Path of a scratch .xlsx plus a writer: workbook(rows, blank_rows=0, specification=False) -> path"""
+    path = str(tmp_path / 'Tool.xlsx')
+    return lambda rows, blank_rows=0, specification=False: write_workbook(path, rows, blank_rows, specification)
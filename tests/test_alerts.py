@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from dna_monitoring_alerts import AlertDaemon, RateLimiter
+from dna_monitoring_db import connect
+from dna_monitoring_status import RED
+
+from conftest import run_row
+
+
+def out_of_spec(i, instrument='SpectraMax 1'):
+    """A run whose Std-07 RFU (150,000) is red"""
+    row = run_row(i, instrument)
+    row[6] = 150000.0
+    return row
+
+
+class RecordingSink:
+    name = 'recording'
+
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+
+    async def send(self, alert):
+        if self.fail:
+            raise ConnectionError("webhook down")
+        self.sent.append(alert['alert_key'])
+
+
+class RecordingLimiter(RateLimiter):
+    """RateLimiter that remembers the keys it was asked about"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.keys = []
+
+    def allow(self, key, now=None):
+        self.keys.append(key)
+        return super().allow(key, now)
+
+
+def outcomes(db_path):
+    conn = connect(db_path)
+    try:
+        return dict(conn.execute('SELECT alert_key, outcome FROM alerts'))
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    def make(path):
+        return AlertDaemon(path, str(tmp_path / 'alerts.db'), [RecordingSink()],
+                           limiter=RecordingLimiter(2, 600), store_dir=str(tmp_path / 'store'))
+    return make
+
+
+def test_first_pass_is_baseline(workbook, daemon):
+    daemon = daemon(workbook([run_row(0), out_of_spec(1), out_of_spec(2)], specification=True))
+    assert daemon.check() == []
+    stored = outcomes(daemon.db_path)
+    assert len(stored) == 2
+    assert set(stored.values()) == {'baseline'}
+    assert all(f'|std_07_status|{RED}' in key for key in stored)
+
+
+def test_new_runs_alert_once_and_are_rate_limited(workbook, daemon):
+    rows = [run_row(0), out_of_spec(1)]
+    daemon = daemon(workbook(rows, specification=True))
+    daemon.check()
+
+    rows += [run_row(2), out_of_spec(3), out_of_spec(4), out_of_spec(5), out_of_spec(6, instrument=None)]
+    workbook(rows, specification=True)
+    alerts = daemon.check()
+    assert [alert['lhi_id'] for alert in alerts] == ['LHI-0003', 'LHI-0004', 'LHI-0005', 'LHI-0006']
+    assert asyncio.run(daemon.deliver(alerts)) == ['sent', 'sent', 'rate-limited', 'sent']
+    assert daemon.limiter.keys == ['SpectraMax 1'] * 3 + ['Unknown']
+    assert daemon.sinks[0].sent == [alerts[i]['alert_key'] for i in (0, 1, 3)]
+    assert sorted(outcomes(daemon.db_path).values()) == ['baseline', 'rate-limited', 'sent', 'sent', 'sent']
+
+    # Same file, then edited history (a new ingest generation re-checks every run): no repeats
+    assert daemon.check() == []
+    rows[0][4] = 25.0
+    workbook(rows, specification=True)
+    assert daemon.check() == []
+    assert len(outcomes(daemon.db_path)) == 5
+
+
+def test_failed_delivery_is_retried(workbook, daemon):
+    rows = [run_row(0)]
+    daemon = daemon(workbook(rows, specification=True))
+    daemon.check()
+
+    sink = daemon.sinks[0]
+    sink.fail = True
+    workbook(rows + [out_of_spec(1)], specification=True)
+    alerts = daemon.check()
+    assert asyncio.run(daemon.deliver(alerts)) == ['failed']
+    assert list(outcomes(daemon.db_path).values()) == ['failed']
+
+    sink.fail = False
+    retry = daemon.check()
+    assert [alert['alert_key'] for alert in retry] == [alerts[0]['alert_key']]
+    assert asyncio.run(daemon.deliver(retry)) == ['sent']
+    assert sink.sent == [alerts[0]['alert_key']]
+    assert daemon.check() == []
@@ -0,0 +1,58 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dna_monitoring_charts import downsample, out_of_spec, quantile_sample
+from dna_monitoring_status import DEFAULT_RULES
+
+
+@pytest.fixture
+def runs():
+    rng = np.random.default_rng(1)
+    n = 20000
+    sn = rng.normal(4.0, 0.3, n)
+    # A long bad stretch: a quarter of the archive reads red
+    sn[5000:10000] = rng.uniform(0.5, 2.4, 5000)
+    return pd.DataFrame({'lhi_completion_datetime': pd.date_range('2020-01-01', periods=n, freq='h'),
+                         'sn_std7_blank': sn})
+
+
+def test_out_of_spec_uses_the_given_rules(runs):
+    rules = copy.deepcopy(DEFAULT_RULES)
+    next(rule for rule in rules if rule['status'] == 'sn_status').update(green=[4.5, float('inf')],
+                                                                         yellow=[4.4, float('inf')])
+    default = out_of_spec(runs, 'sn_std7_blank')
+    stricter = out_of_spec(runs, 'sn_std7_blank', rules)
+    assert default.sum() == 5000
+    assert stricter.sum() > default.sum()
+    assert not out_of_spec(runs, 'blank_rfu', rules).any()
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_downsample_caps_flagged_rows(runs, method):
+    keep = out_of_spec(runs, 'sn_std7_blank')
+    data = downsample(runs, 'lhi_completion_datetime', 'sn_std7_blank', 1000, keep=keep, method=method)
+    assert len(data) <= 1000
+    assert data['lhi_completion_datetime'].is_monotonic_increasing
+    red = runs[keep]
+    # The worst and best red readings survive the reduction
+    assert red['sn_std7_blank'].idxmin() in data.index
+    assert red['sn_std7_blank'].idxmax() in data.index
+
+
+def test_downsample_keeps_every_flagged_row_under_budget(runs):
+    keep = pd.Series(False, index=runs.index)
+    keep.iloc[[3, 777, 15000]] = True
+    data = downsample(runs, 'lhi_completion_datetime', 'sn_std7_blank', 1000, keep=keep)
+    assert len(data) <= 1000
+    assert {3, 777, 15000} <= set(data.index)
+
+
+def test_quantile_sample_caps_flagged_rows(runs):
+    keep = out_of_spec(runs, 'sn_std7_blank')
+    data = quantile_sample(runs, 'sn_std7_blank', 1000, keep=keep)
+    assert len(data) <= 1000
+    assert data['sn_std7_blank'].min() == runs['sn_std7_blank'].min()
+    assert data['sn_std7_blank'].max() == runs['sn_std7_blank'].max()
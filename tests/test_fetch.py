@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import dna_monitoring_fetch
+from dna_monitoring_fetch import fetch, read_blob, revalidate
+
+
+class ToolFileHandler(BaseHTTPRequestHandler):
+    """Serves server.content with an ETag and honours If-None-Match, like raw.githubusercontent.com"""
+
+    def do_GET(self):
+        server = self.server
+        etag = '"%s"' % hashlib.sha1(server.content).hexdigest()
+        server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'max-age=300')
+        self.send_header('Content-Length', str(len(server.content)))
+        self.end_headers()
+        self.wfile.write(server.content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ToolFileHandler)
+    httpd.content = b'version 1'
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f'http://127.0.0.1:{httpd.server_port}/Tool.xlsm'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def blob_dir(tmp_path):
+    return str(tmp_path / 'http')
+
+
+def wait_for_revalidation(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while url in dna_monitoring_fetch._revalidating:
+        assert time.monotonic() < deadline, "background revalidation did not finish"
+        time.sleep(0.01)
+
+
+def test_cold_fetch_then_fresh(server, blob_dir):
+    path, meta = fetch(server.url, blob_dir)
+    assert meta['state'] == 'fetched'
+    assert read_blob(path) == b'version 1'
+    assert meta['max_age'] == 300
+
+    _, meta = fetch(server.url, blob_dir)
+    assert meta['state'] == 'fresh'
+    assert len(server.requests) == 1
+
+
+def test_revalidate_200_then_304(server, blob_dir):
+    first = revalidate(server.url, blob_dir)
+    assert first['last_status'] == 200
+
+    second = revalidate(server.url, blob_dir)
+    assert second['last_status'] == 304
+    assert second['sha256'] == first['sha256']
+    assert second['checked_at'] >= first['checked_at']
+    assert server.requests == [None, first['etag']]
+
+    server.content = b'version 2'
+    third = revalidate(server.url, blob_dir)
+    assert third['last_status'] == 200
+    path, meta = fetch(server.url, blob_dir)
+    assert meta['sha256'] == third['sha256']
+    assert read_blob(path) == b'version 2'
+
+
+def test_stale_while_revalidate(server, blob_dir):
+    fetch(server.url, blob_dir)
+    server.content = b'version 2'
+
+    # Stale: the old copy comes back at once and a background request picks up the new one
+    path, meta = fetch(server.url, blob_dir, max_age=0)
+    assert meta['state'] == 'stale'
+    assert meta['size'] == len(b'version 1')
+    wait_for_revalidation(server.url)
+    # The returned path still holds the returned sha's content
+    assert hashlib.sha256(read_blob(path)).hexdigest() == meta['sha256']
+
+    new_path, meta = fetch(server.url, blob_dir)
+    assert meta['state'] == 'fresh'
+    assert meta['sha256'] == hashlib.sha256(b'version 2').hexdigest()
+    assert new_path != path
+    assert read_blob(new_path) == b'version 2'
+
+
+def test_keeps_only_the_current_and_previous_blob(server, blob_dir):
+    paths = []
+    for version in (b'version 1', b'version 2', b'version 3'):
+        server.content = version
+        revalidate(server.url, blob_dir)
+        paths.append(fetch(server.url, blob_dir)[0])
+    assert [os.path.exists(path) for path in paths] == [False, True, True]
+
+
+def test_serves_cached_blob_while_server_is_down(server, blob_dir, monkeypatch):
+    path, fetched = fetch(server.url, blob_dir)
+    server.shutdown()
+    server.server_close()
+    # A session without the retry backoff, so the failed revalidation is quick
+    monkeypatch.setattr(dna_monitoring_fetch, '_session', requests.Session())
+
+    _, meta = fetch(server.url, blob_dir, max_age=0)
+    assert meta['state'] == 'stale'
+    wait_for_revalidation(server.url)
+
+    _, meta = fetch(server.url, blob_dir, max_age=0)
+    assert meta['state'] == 'stale'
+    assert meta['checked_at'] == fetched['checked_at']
+    assert read_blob(path) == b'version 1'
+    wait_for_revalidation(server.url)
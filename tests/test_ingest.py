@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+import dna_monitoring_ingest
+from dna_monitoring_excel import load_run_log_archive
+from dna_monitoring_ingest import ingest_run_log, ingest_status
+
+from conftest import run_row
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path / 'store')
+
+
+def ingest(path, store_dir):
+    """Ingest, check the result against a full parse and return the store's last_mode"""
+    df = ingest_run_log(path, store_dir)
+    # Chunks are memory-mapped; compare their values, not the array class
+    pd.testing.assert_frame_equal(df.apply(lambda col: col.to_numpy().copy() if col.dtype.kind == 'f' else col),
+                                  load_run_log_archive(path))
+    return ingest_status(store_dir)['last_mode']
+
+
+def test_first_ingest_rebuilds(workbook, store_dir):
+    path = workbook([run_row(i) for i in range(5)])
+    assert ingest(path, store_dir) == 'rebuild'
+    assert ingest_status(store_dir)['rows'] == 5
+
+
+def test_unchanged_then_appended(workbook, store_dir):
+    rows = [run_row(i) for i in range(5)]
+    ingest(workbook(rows), store_dir)
+    generation = ingest_status(store_dir)['generation']
+
+    assert ingest(workbook(rows), store_dir) == 'unchanged'
+    assert ingest(workbook(rows + [run_row(5), run_row(6)]), store_dir) == 'append'
+    state = ingest_status(store_dir)
+    assert state['rows'] == 7
+    assert state['last_new_rows'] == 2
+    assert state['generation'] == generation
+
+
+def test_edited_history_rebuilds(workbook, store_dir):
+    rows = [run_row(i) for i in range(5)]
+    ingest(workbook(rows), store_dir)
+    generation = ingest_status(store_dir)['generation']
+
+    rows[2][5] = 39e6
+    assert ingest(workbook(rows), store_dir) == 'rebuild'
+    assert ingest_status(store_dir)['generation'] != generation
+
+    del rows[1]
+    assert ingest(workbook(rows), store_dir) == 'rebuild'
+
+
+def test_trailing_blank_rows_are_not_ingested(workbook, store_dir):
+    rows = [run_row(i) for i in range(3)]
+    ingest(workbook(rows, blank_rows=4), store_dir)
+    assert ingest_status(store_dir)['last_row'] == 4
+
+    # Excel fills in the formatted rows later; they arrive as a plain append
+    assert ingest(workbook(rows + [run_row(3)], blank_rows=3), store_dir) == 'append'
+    assert ingest_status(store_dir)['rows'] == 4
+
+
+def test_chunks_restore_dtypes_of_blank_columns(workbook, store_dir):
+    # The first chunk has no Std Read DateTime at all, so it types the column as float NaN
+    rows = [run_row(i, std_read=False) for i in range(3)]
+    ingest(workbook(rows), store_dir)
+
+    rows += [run_row(3), run_row(4)]
+    assert ingest(workbook(rows), store_dir) == 'append'
+    df = ingest_run_log(workbook(rows), store_dir)
+    assert pd.api.types.is_datetime64_any_dtype(df['std_read_datetime'])
+
+
+def test_compacts_after_max_chunks(workbook, store_dir, monkeypatch):
+    monkeypatch.setattr(dna_monitoring_ingest, 'MAX_CHUNKS', 2)
+    rows = [run_row(0)]
+    ingest(workbook(rows), store_dir)
+    for i in range(1, 4):
+        rows.append(run_row(i))
+        assert ingest(workbook(rows), store_dir) == 'append'
+        assert len(ingest_status(store_dir)['chunks']) <= 2
+    assert ingest_status(store_dir)['rows'] == 4
@@ -0,0 +1,41 @@
+from openpyxl import Workbook
+
+from dna_monitoring_excel import OpenWorkbook
+from dna_monitoring_qplates import RAW_DATA_SHEET, parse_raw_data
+
+
+def plate_block(barcode, group, rfus):
+    """One SoftMax 'Plate:' block and its group table, the way the Raw Data sheet lays them out"""
+    wells = ['A1', 'B1', 'C1']
+    return [
+        ['Plate:', barcode],
+        [None, 'Temperature(¡C)'] + wells,
+        [None, 22.5] + rfus,
+        [f'Group: {group}'],
+        ['Sample', 'Well', 'ng/ul'],
+        ['QBlank', 'A1', ' '],
+        ['Sample-01', 'B1', ' '],
+        ['Sample-02', 'C1', ' '],
+        ['~End'],
+    ]
+
+
+def test_qplates_sharing_a_barcode(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = RAW_DATA_SHEET
+    for row in plate_block('QDUP', 'Q1-Samples', [10.0, 200.0, 300.0]) + \
+            plate_block('QDUP', 'Q2-Samples', [11.0, 210.0, 310.0]):
+        ws.append(row)
+    path = str(tmp_path / 'Tool.xlsx')
+    wb.save(path)
+
+    wells, plates = parse_raw_data(path)
+    assert plates['plate'].tolist() == ['QDUP', 'QDUP']
+    assert plates['q_plate'].tolist() == ['Q1', 'Q2']
+    assert list(wells['plate'].cat.categories) == ['QDUP']
+    assert wells.groupby('q_plate', observed=True)['rfu'].sum().to_dict() == {'Q1': 510.0, 'Q2': 531.0}
+
+    with OpenWorkbook(path) as book:
+        shared_wells, shared_plates = parse_raw_data(book)
+    assert shared_wells.equals(wells) and shared_plates.equals(plates)
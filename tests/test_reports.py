@@ -0,0 +1,78 @@
+import os
+
+import pandas as pd
+import pytest
+
+from dna_monitoring_db import connect, count_runs
+import dna_monitoring_reports
+from dna_monitoring_reports import DatabaseSource, ReportEngine
+from dna_monitoring_sync import sync_workbook
+
+from conftest import run_row
+
+
+@pytest.fixture
+def source(workbook, tmp_path):
+    path = workbook([run_row(i) for i in range(12)], specification=True)
+    db_path = str(tmp_path / 'runs.db')
+    sync_workbook(path, db_path)
+    return DatabaseSource(db_path)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = ReportEngine(str(tmp_path / 'reports'))
+    yield engine
+    engine.shutdown()
+
+
+def test_database_export_is_built_in_a_worker_process(engine, source):
+    path = engine.export(source, 'runs', 'csv').result(timeout=120)
+    conn = connect(source.db_path)
+    try:
+        assert len(pd.read_csv(path)) == count_runs(conn)
+    finally:
+        conn.close()
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.partial')]
+
+
+def test_worker_failure_is_reported(engine, tmp_path):
+    source = DatabaseSource(str(tmp_path / 'missing.db'), version='empty')
+    with pytest.raises(RuntimeError, match='no such table'):
+        engine.export(source, 'runs', 'csv').result(timeout=120)
+
+
+def test_prune_skips_files_removed_meanwhile(tmp_path, monkeypatch):
+    for i in range(4):
+        (tmp_path / f'{i}.csv').write_text('x')
+        os.utime(tmp_path / f'{i}.csv', (i, i))
+    getmtime = os.path.getmtime
+
+    def racing_getmtime(path):
+        if path.endswith('3.csv'):
+            raise FileNotFoundError(path)
+        return getmtime(path)
+
+    monkeypatch.setattr(dna_monitoring_reports.os.path, 'getmtime', racing_getmtime)
+    dna_monitoring_reports._prune(str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == ['1.csv', '2.csv', '3.csv']
+
+
+def test_pruned_export_is_rebuilt(engine, source):
+    job = engine.export(source, 'runs', 'xlsx')
+    path = job.result(timeout=120)
+    assert engine.export(source, 'runs', 'xlsx') is job
+
+    os.remove(path)
+    rebuilt = engine.export(source, 'runs', 'xlsx')
+    assert rebuilt is not job
+    assert rebuilt.result(timeout=120) == path
+    assert os.path.exists(path)
+
+
+def test_ensure_summaries_reuses_jobs(engine, source):
+    now = pd.Timestamp('2025-12-03 10:00')
+    jobs = engine.ensure_summaries(source, now)
+    for job in jobs.values():
+        assert os.path.exists(job.result(timeout=120))
+    assert all(again is jobs[grain] for grain, again in engine.ensure_summaries(source, now).items())
@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dna_monitoring_db import init_db
+from dna_monitoring_rollups import (
+    METRICS, SKETCH_ACCURACY, _from_db, compute_rollups, merge_sketches, rebuild_rollups, sketch_keys,
+    sketch_quantile, update_rollups,
+)
+
+
+def synthetic_runs(n, seed=0):
+    """Runs over ~3 months on three instruments, with missing values, zeros and a missing instrument"""
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp('2025-09-01') + pd.to_timedelta(np.sort(rng.uniform(0, 90, n)), unit='D')
+    runs = pd.DataFrame({
+        'row_id': np.arange(n),
+        'lhi_completion_datetime': times,
+        'instrument': rng.choice(['LHI - 01', 'LHI - 02', 'LHI - 03'], n).astype(object),
+        'std_01_rfu': rng.normal(41e6, 8e5, n),
+        'std_07_rfu': rng.normal(350000, 40000, n),
+        'blank_rfu': rng.normal(1000, 400, n),
+        'sn_std7_blank': rng.lognormal(1.2, 0.2, n),
+    })
+    for column in METRICS.values():
+        runs.loc[rng.random(n) < 0.1, column] = np.nan
+    runs.loc[rng.random(n) < 0.02, 'blank_rfu'] = 0.0
+    runs.loc[rng.random(n) < 0.01, 'instrument'] = None
+    return runs
+
+
+def stored(conn):
+    return _from_db(pd.read_sql_query(
+        'SELECT * FROM rollups ORDER BY grain, instrument, metric, period_start', conn))
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = init_db(str(tmp_path / 'runs.db'))
+    yield conn
+    conn.close()
+
+
+def test_update_after_appends_equals_rebuild(conn):
+    runs = synthetic_runs(5000)
+    rebuild_rollups(conn, runs)
+    full = stored(conn)
+
+    rebuild_rollups(conn, runs.iloc[:3000])
+    for start, end in ((3000, 3001), (3001, 4200), (4200, 5000)):
+        update_rollups(conn, runs.iloc[start:end])
+    pd.testing.assert_frame_equal(stored(conn), full, check_exact=False, rtol=1e-9)
+
+
+def test_runs_counts_every_run(conn):
+    runs = synthetic_runs(3)
+    runs['lhi_completion_datetime'] = pd.Timestamp('2025-11-03 09:00')
+    runs['instrument'] = 'LHI - 01'
+    rebuild_rollups(conn, runs.iloc[:2])
+
+    missing = runs.iloc[2:].copy()
+    missing['std_01_rfu'] = np.nan
+    update_rollups(conn, missing)
+    day = stored(conn).query("grain == 'day'").set_index('metric')
+    assert day.loc['std_01', 'runs'] == 3
+    assert day.loc['std_01', 'n'] == 2
+    assert (day['runs'] == 3).all()
+
+
+def test_metric_without_values_still_counts_runs():
+    runs = synthetic_runs(4)
+    runs['std_07_rfu'] = np.nan
+    rollups = compute_rollups(runs)
+    std_07 = rollups[rollups['metric'] == 'std_07']
+    assert std_07['runs'].sum() == rollups[rollups['metric'] == 'std_01']['runs'].sum()
+    assert (std_07['n'] == 0).all()
+
+
+@pytest.mark.parametrize('q', [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99])
+def test_sketch_quantile_within_accuracy(q):
+    values = np.random.default_rng(1).lognormal(10, 3, 20000)
+    keys, counts = np.unique(sketch_keys(values), return_counts=True)
+    sketch = dict(zip(keys.tolist(), counts.tolist()))
+    exact = np.sort(values)[math.floor(q * (len(values) - 1))]
+    assert abs(sketch_quantile(sketch, q) - exact) <= SKETCH_ACCURACY * exact
+
+
+def test_merged_sketches_equal_the_union():
+    values = np.random.default_rng(2).lognormal(5, 1, 3000)
+    parts = [values[:1000], values[1000:]]
+
+    def sketch(part):
+        keys, counts = np.unique(sketch_keys(part), return_counts=True)
+        return dict(zip(keys.tolist(), counts.tolist()))
+
+    assert merge_sketches([sketch(part) for part in parts]) == sketch(values)
@@ -0,0 +1,113 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dna_monitoring_service import DataService, RunsIndex
+
+THREADS = 8
+
+
+def synthetic_runs(n=400, seed=0):
+    """Runs in archive (not time) order, with repeated and missing completion times"""
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp('2025-11-01') + pd.to_timedelta(rng.integers(0, 60 * 24, n), unit='h')
+    runs = pd.DataFrame({
+        'lhi_id': [f'LHI-{i:04d}' for i in range(n)],
+        'instrument': rng.choice(['LHI - 01', 'LHI - 02', 'LHI - 03'], n).astype(object),
+        'lhi_completion_datetime': pd.Series(times).where(rng.random(n) > 0.03),
+        'std_01_rfu': rng.normal(41e6, 5e5, n),
+    })
+    runs.loc[rng.random(n) < 0.02, 'instrument'] = None
+    return runs
+
+
+def gated_loader(gate, calls, result=None, error=None):
+    def load():
+        calls.append(threading.get_ident())
+        gate.wait(10)
+        if error is not None:
+            raise error
+        return result
+    return load
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_concurrent_gets_load_once():
+    service, gate, calls = DataService(), threading.Event(), []
+    loader = gated_loader(gate, calls, synthetic_runs(20))
+    with ThreadPoolExecutor(THREADS) as pool:
+        futures = [pool.submit(service.get, 'v1', loader) for _ in range(THREADS)]
+        # Everyone but the loading thread is waiting on its result
+        wait_for(lambda: service.waits == THREADS - 1)
+        gate.set()
+        results = [future.result() for future in futures]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert (service.loads, service.waits) == (1, THREADS - 1)
+    assert service.get('v1', loader) is results[0]
+    assert service.hits == 1
+
+
+def test_failed_load_reaches_waiters_and_is_not_cached():
+    service, gate, calls = DataService(), threading.Event(), []
+    loader = gated_loader(gate, calls, error=OSError("Tool file locked"))
+    with ThreadPoolExecutor(THREADS) as pool:
+        futures = [pool.submit(service.get, 'v1', loader) for _ in range(THREADS)]
+        wait_for(lambda: service.waits == THREADS - 1)
+        gate.set()
+        for future in futures:
+            with pytest.raises(OSError, match="Tool file locked"):
+                future.result()
+    assert len(calls) == 1
+
+    index = service.get('v1', lambda: synthetic_runs(5))
+    assert len(index) == 5
+    assert service.loads == 2
+
+
+def test_least_recently_used_version_is_dropped():
+    service = DataService(max_entries=2)
+    loads = []
+
+    def loader(key):
+        return lambda: loads.append(key) or synthetic_runs(3)
+
+    for key in ('a', 'b', 'a', 'c', 'a', 'b'):
+        service.get(key, loader(key))
+    # 'b' was the least recently used when 'c' arrived
+    assert loads == ['a', 'b', 'c', 'b']
+
+
+@pytest.mark.parametrize('date_from, date_to, instrument', [
+    (None, None, None),
+    ('2025-11-10', '2025-11-20 12:00', None),
+    ('2025-11-10', None, 'LHI - 02'),
+    (None, '2025-11-05', 'LHI - 03'),
+    # Three runs share this completion time; they stay in archive order
+    ('2025-11-01 23:00', '2025-11-01 23:00', None),
+    ('2025-11-10', '2025-11-20', 'LHI - 99'),
+])
+def test_select_matches_a_boolean_mask(date_from, date_to, instrument):
+    runs = synthetic_runs()
+    times = runs['lhi_completion_datetime']
+    mask = times.notna()
+    if date_from is not None:
+        mask &= times >= pd.Timestamp(date_from)
+    if date_to is not None:
+        mask &= times <= pd.Timestamp(date_to)
+    if instrument is not None:
+        mask &= runs['instrument'] == instrument
+    expected = runs[mask].sort_values('lhi_completion_datetime', kind='stable')
+
+    selected = RunsIndex(runs).select(date_from, date_to, instrument)
+    pd.testing.assert_frame_equal(selected, expected)
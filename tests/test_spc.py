@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dna_monitoring_db import init_db
+from dna_monitoring_rollups import METRICS
+from dna_monitoring_spc import WINDOW, SPCSeries, compute_spc, rebuild_spc, update_spc
+
+
+def synthetic_runs(n, seed=0):
+    """Runs on two instruments with a level shift halfway and some missing values"""
+    rng = np.random.default_rng(seed)
+    shift = np.where(np.arange(n) > n // 2, 1.5, 0.0)
+    runs = pd.DataFrame({
+        'row_id': np.arange(n),
+        'instrument': rng.choice(['LHI - 01', 'LHI - 02'], n).astype(object),
+        'std_01_rfu': rng.normal(41e6, 5e5, n) + shift * 5e5,
+        'std_07_rfu': rng.normal(350000, 20000, n),
+        'blank_rfu': rng.normal(1000, 100, n),
+        'sn_std7_blank': rng.normal(3.5, 0.2, n) - shift * 0.2,
+    })
+    for column in METRICS.values():
+        runs.loc[rng.random(n) < 0.05, column] = np.nan
+    runs.loc[rng.random(n) < 0.02, 'instrument'] = None
+    return runs
+
+
+def test_resume_from_json_state_equals_full_replay():
+    runs = synthetic_runs(600)
+    full, _ = compute_spc(runs)
+
+    parts, series = [], {}
+    for start, end in ((0, 7), (7, 250), (250, 251), (251, 600)):
+        # Every batch starts from state that went through JSON, as it does between syncs
+        series = {key: SPCSeries(json.loads(json.dumps(state.to_state()))) for key, state in series.items()}
+        results, series = compute_spc(runs.iloc[start:end], series)
+        parts.append(results)
+    resumed = pd.concat(parts).sort_values(['metric', 'row_id'], kind='stable', ignore_index=True)
+    pd.testing.assert_frame_equal(resumed, full.sort_values(['metric', 'row_id'], kind='stable', ignore_index=True))
+
+
+def test_update_spc_equals_rebuild(tmp_path):
+    runs = synthetic_runs(300)
+    conn = init_db(str(tmp_path / 'runs.db'))
+    try:
+        runs.to_sql('runs', conn, if_exists='append', index=False)
+
+        def stored():
+            spc = pd.read_sql_query('SELECT * FROM spc ORDER BY metric, row_id', conn)
+            state = pd.read_sql_query('SELECT * FROM spc_state ORDER BY instrument, metric', conn)
+            return spc, state
+
+        rebuild_spc(conn, runs)
+        full_spc, full_state = stored()
+
+        rebuild_spc(conn, runs.iloc[:120])
+        for start, end in ((120, 121), (121, 300)):
+            update_spc(conn, runs.iloc[start:end])
+        spc, state = stored()
+        pd.testing.assert_frame_equal(spc, full_spc)
+        pd.testing.assert_frame_equal(state, full_state)
+    finally:
+        conn.close()
+
+
+def judge(values):
+    """Rules flagged for each value after a baseline alternating 11, 9 (mean 10, sd 1.03)"""
+    series = SPCSeries()
+    for i in range(WINDOW):
+        series.update(9.0 if i % 2 else 11.0)
+    return [series.update(value)[-1] for value in values]
+
+
+def test_stable_baseline_flags_nothing():
+    assert judge([11.0, 9.0] * 10) == [''] * 20
+
+
+@pytest.mark.parametrize('values, expected', [
+    # z -3.9 after a run below the mean: beyond 3 SD
+    ([6.0], ['1_3s']),
+    # z 2.5 then 2.2: two in a row beyond 2 SD on the same side
+    ([12.6, 12.6], ['', '2_2s']),
+    # z +2.3 then -2.2: more than 4 SD apart on opposite sides
+    ([12.4, 7.6], ['', 'R_4s']),
+    # z 1.5, 1.4, 1.3, 1.2: four in a row beyond 1 SD
+    ([11.5] * 4, ['', '', '', '4_1s']),
+    # z about 0.4-0.5 ten times: ten in a row on the same side of the mean
+    ([10.5] * 10, [''] * 9 + ['10_x']),
+])
+def test_westgard_rules(values, expected):
+    assert judge(values) == expected
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dna_monitoring_status import (
+    CURVE_SPEC_RULES, DEFAULT_RULES, GREEN, INF, RED, STATUS_LEVELS, YELLOW, band_text, compute_statuses,
+    load_rules,
+    rules_from_specifications, status_counts,
+)
+
+
+# The tab1 expressions the engine replaced, verbatim apart from the variable names
+def old_std01(v):
+    return "🟢" if 40000000 < v < 42000000 else "🟡" if 39000000 < v < 43000000 else "🔴"
+
+
+def old_std07(v):
+    return "🟢" if 300000 < v < 400000 else "🟡" if 200000 < v < 450000 else "🔴"
+
+
+def old_sn(v):
+    return "🟢" if v > 3.0 else "🟡" if v > 2.5 else "🔴"
+
+
+STD01_VALUES = [40e6, 42e6, 39e6, 43e6, 41e6, 39.5e6, 42.5e6, 38e6, 44e6, math.nan]
+STD07_VALUES = [300e3, 400e3, 200e3, 450e3, 350e3, 250e3, 420e3, 100e3, 500e3, math.nan]
+SN_VALUES = [3.0, 2.5, 2.0, 3.01, 2.51, 2.49, 10.0, 0.0, -1.0, math.nan]
+
+
+@pytest.fixture
+def runs():
+    return pd.DataFrame({'std_01_rfu': STD01_VALUES, 'std_07_rfu': STD07_VALUES, 'sn_std7_blank': SN_VALUES})
+
+
+@pytest.mark.parametrize('status, column, old', [
+    ('std_01_status', 'std_01_rfu', old_std01),
+    ('std_07_status', 'std_07_rfu', old_std07),
+    ('sn_status', 'sn_std7_blank', old_sn),
+])
+def test_matches_old_inline_logic(runs, status, column, old):
+    statuses = compute_statuses(runs, DEFAULT_RULES)
+    assert statuses[status].astype(str).tolist() == [old(v) for v in runs[column]]
+
+
+def test_boundaries_and_missing(runs):
+    statuses = compute_statuses(runs, DEFAULT_RULES)
+    # Bands are exclusive: a reading exactly on a green limit is only yellow
+    assert statuses['std_01_status'].tolist()[:4] == [YELLOW, YELLOW, RED, RED]
+    assert statuses['std_07_status'].tolist()[:4] == [YELLOW, YELLOW, RED, RED]
+    assert statuses['sn_status'].tolist()[:3] == [YELLOW, RED, RED]
+    assert (statuses.iloc[-1] == RED).all()
+
+
+def test_text_and_missing_columns():
+    runs = pd.DataFrame({'sn_std7_blank': ['3.5', 'n/a', None]}, index=[10, 11, 12])
+    statuses = compute_statuses(runs, DEFAULT_RULES)
+    assert list(statuses.columns) == ['sn_status']
+    assert list(statuses.index) == [10, 11, 12]
+    assert statuses['sn_status'].tolist() == [GREEN, RED, RED]
+
+
+def test_status_counts_partition_every_run(runs):
+    rng = np.random.default_rng(0)
+    runs = pd.concat([runs, pd.DataFrame({'sn_std7_blank': rng.uniform(0, 6, 500)})], ignore_index=True)
+    runs.loc[rng.choice(len(runs), 50, replace=False), 'sn_std7_blank'] = np.nan
+
+    counts = status_counts(compute_statuses(runs, DEFAULT_RULES)['sn_status'])
+    assert list(counts) == STATUS_LEVELS
+    assert sum(counts.values()) == len(runs)
+    assert counts[GREEN] == sum(old_sn(v) == GREEN for v in runs['sn_std7_blank'])
+    assert counts[YELLOW] == sum(old_sn(v) == YELLOW for v in runs['sn_std7_blank'])
+
+
+def test_status_counts_of_empty_selection():
+    assert status_counts(pd.Series([], dtype=object)) == {GREEN: 0, YELLOW: 0, RED: 0}
+
+
+def test_specification_window_is_closed():
+    specs = pd.DataFrame({'tbl': ['Standard Curve Fitting'],
+                          'parameter': ['Signal to Noise Ratio\n(Standard7 Mean RFU divided by blank Mean RFU)'],
+                          'min_value': [1.6], 'max_value': [8.0], 'criteria': ['Warning']})
+    rules = load_rules(config_path=None, specifications=specs)
+    assert [rule['status'] for rule in rules][-1] == 'sn_sop_status'
+    statuses = compute_statuses(pd.DataFrame({'sn_std7_blank': [1.6, 8.0, 1.5, 8.1]}), rules)
+    assert statuses['sn_sop_status'].tolist() == [GREEN, GREEN, YELLOW, YELLOW]
+    assert rules_from_specifications(None) == []
+
+
+def test_curve_limits_from_stored_specifications():
+    specs = pd.DataFrame({'tbl': ['Standard Curve Fitting'] * 3, 'parameter': ['Slope', 'intercept', 'R2'],
+                          'min_value': [0.9, 13.5, 0.95], 'max_value': [1.2, 15.5, 1.0],
+                          'criteria': ['Warning', 'Warning', 'QC PASS/FAIL']})
+    curve_rules = rules_from_specifications(specs, CURVE_SPEC_RULES)
+    assert {rule['column']: rule['green'] for rule in curve_rules} == {'curve_slope': [0.9, 1.2],
+                                                                      'curve_intercept': [13.5, 15.5]}
+    assert rules_from_specifications(specs.iloc[2:], CURVE_SPEC_RULES) == []
+
+
+def test_band_text():
+    assert band_text([3.0, INF]) == '> 3'
+    assert band_text([3.0, INF], closed=True) == '≥ 3'
+    assert band_text([-INF, 0.1]) == '< 0.1'
+    assert band_text([2.5, INF]) == '> 2.5'
+    assert band_text([40000000, 42000000]) == '40,000,000–42,000,000'
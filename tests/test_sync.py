@@ -0,0 +1,88 @@
+import json
+
+import pandas as pd
+import pytest
+
+from dna_monitoring_curves import update_curve_fits
+from dna_monitoring_db import connect
+from dna_monitoring_spc import backfill_spc
+from dna_monitoring_status import RED
+from dna_monitoring_sync import sync_workbook
+
+from conftest import run_row
+
+
+def no_standards(i):
+    """A run whose Std-01, Std-07 and Blank readings are all blank"""
+    row = run_row(i)
+    row[5:8] = [None, None, None]
+    return row
+
+
+def table(db_path, sql):
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query(sql, conn)
+    finally:
+        conn.close()
+
+
+def rollups(db_path):
+    frame = table(db_path, 'SELECT * FROM rollups ORDER BY grain, instrument, metric, period_start')
+    frame['sketch'] = frame['sketch'].map(json.loads)
+    return frame
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'runs.db')
+
+
+def test_unchanged_sync_does_no_work(workbook, db_path):
+    path = workbook([run_row(0), no_standards(1), run_row(2)], specification=True)
+    assert sync_workbook(path, db_path)['mode'] == 'reload'
+    assert sync_workbook(path, db_path)['mode'] == 'unchanged'
+
+    # Every run has a curve_fits row (the one without standards an empty one)
+    fits = table(db_path, 'SELECT row_id, curve_points FROM curve_fits ORDER BY row_id')
+    assert fits['row_id'].tolist() == [0, 1, 2]
+    assert fits['curve_points'].iloc[1] == 0
+
+    conn = connect(db_path)
+    try:
+        assert update_curve_fits(conn) == 0
+        assert not backfill_spc(conn)
+    finally:
+        conn.close()
+
+
+def test_runs_without_values_are_not_replayed(workbook, db_path):
+    row = no_standards(0)
+    row[8] = None
+    path = workbook([row], specification=True)
+    sync_workbook(path, db_path)
+    conn = connect(db_path)
+    try:
+        assert not backfill_spc(conn)
+    finally:
+        conn.close()
+
+
+def test_appended_run_updates_everything(workbook, db_path):
+    rows = [run_row(i) for i in range(6)]
+    sync_workbook(workbook(rows, specification=True), db_path)
+
+    out_of_spec = run_row(6)
+    out_of_spec[6] = 150000.0
+    result = sync_workbook(workbook(rows + [out_of_spec], specification=True), db_path)
+    assert result == {'mode': 'append', 'rows_added': 1, 'total_runs': 7}
+
+    runs = table(db_path, 'SELECT row_id, std_07_status FROM runs ORDER BY row_id')
+    assert runs['std_07_status'].iloc[-1] == RED
+    assert table(db_path, 'SELECT COUNT(*) AS n FROM curve_fits')['n'].iloc[0] == 7
+    assert 6 in table(db_path, 'SELECT row_id FROM spc')['row_id'].tolist()
+
+    # The appended run was folded into the rollups exactly as a full reload would
+    appended = rollups(db_path)
+    assert sync_workbook(workbook(rows + [out_of_spec], specification=True), db_path, force=True)['mode'] == 'reload'
+    pd.testing.assert_frame_equal(appended, rollups(db_path))
@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+
+from dna_monitoring_db import connect
+from dna_monitoring_status import GREEN, YELLOW
+from dna_monitoring_watch import ToolFileWatcher
+
+from conftest import run_row
+
+
+def std_07_statuses(db_path):
+    conn = connect(db_path)
+    try:
+        return [row[0] for row in conn.execute('SELECT std_07_status FROM runs ORDER BY row_id')]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def watcher(workbook, tmp_path):
+    path = workbook([run_row(i) for i in range(3)], specification=True)
+    watcher = ToolFileWatcher(path, str(tmp_path / 'runs.db'), config_path=str(tmp_path / 'specs.json'))
+    watcher.sync()
+    return watcher
+
+
+def test_config_edit_restatuses_stored_runs(watcher):
+    assert std_07_statuses(watcher.db_path) == [GREEN] * 3
+    assert watcher.poll() is None
+
+    # Std-07 of the runs is 350,000-350,002: now below the green band
+    with open(watcher.config_path, 'w', encoding='utf-8') as f:
+        json.dump([{'status': 'std_07_status', 'green': [360000, 400000], 'yellow': [200000, 450000]}], f)
+    version = watcher.version
+    result = watcher.poll()
+    assert result['mode'] == 'rules'
+    assert watcher.version == version + 1
+    assert std_07_statuses(watcher.db_path) == [YELLOW] * 3
+
+    # Nothing changed since: no further sync
+    assert watcher.poll() is None
+
+
+def test_config_edit_waits_for_a_changing_workbook(watcher, workbook):
+    with open(watcher.config_path, 'w', encoding='utf-8') as f:
+        json.dump([{'status': 'std_07_status', 'green': [360000, 400000], 'yellow': [200000, 450000]}], f)
+    # The workbook is being saved (changed but not yet settled): leave it to the settled sync
+    workbook([run_row(i) for i in range(4)], specification=True)
+    os.utime(watcher.excel_path, ns=(0, 10 ** 9))
+    assert watcher.poll() is None
+    assert std_07_statuses(watcher.db_path) == [GREEN] * 3